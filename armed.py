@@ -0,0 +1,182 @@
+import time
+import datetime
+from urllib.parse import urlparse, quote
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import NoSuchElementException, TimeoutException
+from book_room import (
+    DAYS_AHEAD, get_credentials, create_driver, is_headless_run, open_libcal, go_to_date, grid_shows_date,
+    choose_slot, wait_for_page_ready, to_24h, format_slot_time, report_timings,
+)
+import telemetry
+from stage_timer import StageTimer
+from slot_index import take_snapshot
+from checkpoint import BookingState, run_stages, pick_slot
+from libcal_http import AUTH_PATH
+
+# Start polling this many seconds before the release instant to absorb clock skew
+POLL_LEAD_SECONDS = 2
+
+def next_fire_time(fire_at, timeout, now=None):
+    """Returns the next datetime matching fire_at ("HH:MM"), or today's if it is still within the polling window."""
+    now = now or datetime.datetime.now()
+    hour, minute = (int(part) for part in fire_at.split(":"))
+    fire = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if fire + datetime.timedelta(seconds=timeout) < now:
+        fire += datetime.timedelta(days=1)
+    return fire
+
+def sleep_until(target):
+    """Sleeps until the wall-clock datetime `target`, waking early to re-check so the deadline isn't overshot."""
+    while True:
+        remaining = (target - datetime.datetime.now()).total_seconds()
+        if remaining <= 0:
+            return
+        time.sleep(min(remaining, 30) if remaining > 1 else remaining)
+
+def warm_up_session(driver, wait, username, password, grid_url):
+    """
+    Authenticates ahead of time by opening LibCal's login URL directly, so nothing is put in the cart.
+    The SSO session cookie then carries over to the real booking after release.
+    """
+    print("Warming up SSO session...")
+    grid = urlparse(grid_url)
+    driver.get(f"{grid.scheme}://{grid.netloc}{AUTH_PATH}?returnUrl={quote(grid.path)}")
+    try:
+        wait.until(EC.any_of(
+            EC.presence_of_element_located((By.ID, "userNameInput")),
+            lambda d: urlparse(d.current_url).netloc == grid.netloc and not d.find_elements(By.NAME, "SAMLResponse"),
+        ))
+        if driver.find_elements(By.ID, "userNameInput"):
+            driver.find_element(By.ID, "userNameInput").send_keys(username)
+            driver.find_element(By.ID, "passwordInput").send_keys(password)
+            driver.find_element(By.ID, "submitButton").click()
+        # Done once the login form and the auto-posted SAML form are both gone and we're back on LibCal
+        WebDriverWait(driver, 20, poll_frequency=0.1).until(
+            lambda d: urlparse(d.current_url).netloc == grid.netloc and not d.find_elements(By.ID, "userNameInput")
+            and not d.find_elements(By.NAME, "SAMLResponse"))
+    except TimeoutException:
+        print("WARNING: SSO warm-up did not finish. SSO will happen at booking time.")
+        driver.get(grid_url)
+        wait_for_page_ready(driver)
+        return False
+
+    driver.get(grid_url)
+    wait_for_page_ready(driver)
+    print("SSO session is warm.")
+    return True
+
+def refresh_grid(driver, wait, grid_url, target_date):
+    """Re-fetches the availability grid for target_date as cheaply as the current page allows."""
+    if grid_shows_date(driver, target_date):
+        # Stepping the calendar away and back re-requests availability over XHR without a full page load
+        try:
+            driver.find_element(By.CSS_SELECTOR, "button.fc-prev-button").click()
+            driver.find_element(By.CSS_SELECTOR, "button.fc-next-button").click()
+            wait_for_page_ready(driver, timeout=5)
+            if grid_shows_date(driver, target_date):
+                return
+        except NoSuchElementException:
+            pass
+
+    # Not parked on the target date yet (e.g. it isn't bookable before release): reload and navigate to it
+    driver.get(grid_url)
+    wait_for_page_ready(driver)
+    try:
+        go_to_date(driver, wait, target_date)
+    except TimeoutException:
+        pass
+
+def armed_book(args, fire_time=None, release_date=None, sleep=sleep_until, poll_lead=POLL_LEAD_SECONDS):
+    """
+    Warms up, then books as soon as the slot appears after fire_time (default: the next --fire-at).
+    The scheduler passes its own clock-corrected fire_time, release_date and precise sleep.
+    """
+    print("--- Carleton Library Room Booker (ARMED) ---")
+    print(f"Configuration: Room={args.room}, Time={args.hour}:{args.minute:02d} {args.ampm}, Duration={args.duration} mins")
+
+    if args.dry_run:
+        print("BS: *** DRY RUN MODE ENABLED - NO BOOKING WILL BE MAKING ***")
+
+    fire_time = fire_time or next_fire_time(args.fire_at, args.armed_timeout)
+    target_date = (release_date or fire_time.date()) + datetime.timedelta(days=DAYS_AHEAD)
+    start_time = datetime.datetime.combine(target_date, datetime.time(to_24h(args.hour, args.ampm), args.minute))
+    time_str = format_slot_time(start_time)
+    print(f"Release expected at {fire_time.strftime('%Y-%m-%d %H:%M:%S')}, Target Date: {target_date.strftime('%A, %B %d, %Y')}")
+
+    username, password = get_credentials()
+
+    timer = StageTimer()
+    with timer.stage("startup"):
+        driver = create_driver(args)
+    timer.track_commands(driver.command_counter)
+    wait = WebDriverWait(driver, 10, poll_frequency=0.1)
+
+    try:
+        # Everything that doesn't depend on the release happens up front
+        with timer.stage("navigate"):
+            open_libcal(driver, wait, args)
+            grid_url = driver.current_url
+
+        with timer.stage("warm_up"):
+            warm_up_session(driver, wait, username, password, grid_url)
+            try:
+                go_to_date(driver, wait, target_date)
+            except TimeoutException:
+                pass
+            print("Parked on the grid.")
+
+        with timer.stage("armed_wait"):
+            poll_start = fire_time - datetime.timedelta(seconds=poll_lead)
+            print(f"Armed. Polling starts at {poll_start.strftime('%H:%M:%S.%f')[:-3]}...")
+            sleep(poll_start)
+
+        slot = None
+        polls = 0
+        deadline = fire_time + datetime.timedelta(seconds=args.armed_timeout)
+        with timer.stage("poll"):
+            while datetime.datetime.now() < deadline:
+                polls += 1
+                slot = choose_slot(take_snapshot(driver), args, time_str, verbose=False)
+                if slot:
+                    break
+                time.sleep(args.poll_interval)
+                refresh_grid(driver, wait, grid_url, target_date)
+        released_at = datetime.datetime.now()
+
+        telemetry.emit("slot_available", date=target_date.isoformat(), time=time_str, room=slot.room if slot else None,
+                       polls=polls, fire_at=fire_time.isoformat(),
+                       after_release_s=round((released_at - fire_time).total_seconds(), 3) if slot else None)
+        if not slot:
+            print(f"No slot at {time_str} became available within {args.armed_timeout:.0f}s after release ({polls} polls).")
+            return
+        print(f"Slot found after {polls} polls: {slot.ref}")
+
+        # From here on each step retries in this session instead of giving up (see checkpoint.py)
+        state = BookingState(args, target_date, grid_url, username, password)
+        state.slot = slot
+        with timer.stage("slot_select"):
+            clicked = pick_slot(driver, slot)
+        if clicked:
+            print("Clicked start time slot.")
+        else:
+            print("Slot was taken before it could be clicked. Picking again...")
+        if not run_stages(driver, wait, state, timer, start_at="end_time" if clicked else "slot_select",
+                          max_attempts=args.stage_attempts):
+            return
+
+        print(f"Time to book after slot appeared: {(datetime.datetime.now() - released_at).total_seconds():.2f}s")
+        return state.slot.room
+
+    except Exception as e:
+        print(f"An error occurred: {e}")
+        telemetry.emit("error", error=type(e).__name__, message=str(e), url=driver.current_url)
+        if is_headless_run(args):
+             driver.save_screenshot("error_screenshot.png")
+             print("Saved error_screenshot.png")
+
+    finally:
+        report_timings(timer, args)
+        print("Done.")
+        driver.quit()
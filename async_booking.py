@@ -0,0 +1,342 @@
+"""
+The booking flow written against a small async page interface, so several pages can be driven at once
+and their waits (grid loads, dropdown population, SSO redirects) overlap instead of queueing.
+
+    python book_room.py --backend cdp --room 464,468 --alt-starts 4:00PM
+
+The cdp backend (cdp.py) runs every candidate room/start time in its own isolated browser context of
+a single Chrome. The default selenium backend is the synchronous flow in book_room.py and checkpoint.py.
+
+The two flows are deliberately separate. The selenium one retries each stage in place and cleans up
+LibCal's server-side cart, because its browser session is reused: by batch jobs, the watcher and the pool.
+That is built on Selenium's exceptions and waits. Here every page gets a fresh context that is closed
+after the run, so a failed page is simply dropped. Both flows share their page scripts (dom.py,
+slot_index.py, checkpoint.py), the slot choice and the site cache. A change to the steps on the LibCal
+pages has to be made in both.
+"""
+import asyncio
+import argparse
+import datetime
+import contextlib
+import time
+from urllib.parse import urlparse
+from book_room import (DAYS_AHEAD, OPTIONAL_WAIT, get_credentials, choose_slot, report_timings, to_24h, format_slot_time,
+                       title_shows_date)
+from checkpoint import PAGE_STATE_JS, END_TIMES_SHOWN_JS
+from dom import SELECT_OPTION_JS, CLICK_JS
+from slot_index import SNAPSHOT_JS, CLICK_BY_TITLE_JS, SlotIndex
+from parallel import build_candidates
+from site_cache import load_site, save_site, invalidate_site, start_url
+from stage_timer import StageTimer
+import telemetry
+
+PAGE_READY_JS = "return document.readyState === 'complete' && (!window.jQuery || window.jQuery.active === 0);"
+LINK_HREF_JS = "var a = document.querySelector(arguments[0]); return a ? a.href : null;"
+GRID_TITLE_JS = "var h = document.querySelector('.fc-toolbar h2'); return h ? h.innerText : '';"
+VISIBLE_JS = "var el = document.querySelector(arguments[0]); return !!el && !!(el.offsetWidth || el.offsetHeight);"
+
+# Pages the date picker forward a month and returns the first day cell, to tell when it re-renders
+NEXT_MONTH_JS = """
+var first = document.querySelector('td.day');
+document.querySelector('button.fc-next-button').click();
+window.__firstDayCell = first;
+return true;
+"""
+
+CLICK_DAY_JS = """
+var cells = document.querySelectorAll('td');
+for (var i = 0; i < cells.length; i++) {
+  var el = cells[i];
+  if (el.innerText.trim() === arguments[0] && !el.classList.contains('old') && !el.classList.contains('new')) {
+    el.click();
+    return true;
+  }
+}
+return false;
+"""
+
+FILL_LOGIN_JS = """
+document.getElementById('userNameInput').value = arguments[0];
+document.getElementById('passwordInput').value = arguments[1];
+document.getElementById('submitButton').click();
+return true;
+"""
+
+class WaitTimeout(Exception):
+    """A wait_until condition stayed false for the whole timeout."""
+
+class Page:
+    """
+    What the flow needs from a browser tab. Backends implement goto(), execute() and close();
+    execute() takes a Selenium-style script body (arguments[i], return), so dom.py's snippets work as is.
+    """
+
+    async def goto(self, url):
+        raise NotImplementedError
+
+    async def execute(self, script, *args):
+        raise NotImplementedError
+
+    async def close(self):
+        raise NotImplementedError
+
+    async def wait_until(self, script, *args, timeout=10, poll=0.1):
+        """Polls the script until it returns something truthy, and returns that."""
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                value = await self.execute(script, *args)
+            except Exception:
+                # Mid-navigation there is briefly no document to run in
+                value = None
+            if value:
+                return value
+            if time.monotonic() > deadline:
+                raise WaitTimeout(f"Timed out after {timeout}s waiting for: {script.strip().splitlines()[0][:80]}")
+            await asyncio.sleep(poll)
+
+    async def wait_ready(self, timeout=10):
+        try:
+            await self.wait_until(PAGE_READY_JS, timeout=timeout)
+        except WaitTimeout:
+            print("WARNING: Page did not go idle in time. Continuing anyway...")
+
+    async def current_url(self):
+        return await self.execute("return location.href;")
+
+class AsyncFirstWinner:
+    """parallel.FirstWinner for tasks on one event loop: one page at a time may make the final submit."""
+
+    def __init__(self):
+        self._cond = asyncio.Condition()
+        self.pending = None
+        self.winner = None
+
+    async def claim(self, name):
+        async with self._cond:
+            if self.pending == name:
+                return True
+            await self._cond.wait_for(lambda: self.pending is None or self.winner is not None)
+            if self.winner is not None:
+                return False
+            self.pending = name
+            return True
+
+    async def settle(self, name, success):
+        async with self._cond:
+            if self.pending == name:
+                if success:
+                    self.winner = name
+                self.pending = None
+                self._cond.notify_all()
+
+    def decided(self):
+        return self.winner is not None
+
+# --- The flow, one coroutine per step; each mirrors its book_room.py counterpart ---
+
+async def find_libcal_link(page, args, target_date):
+    """
+    The grid URL from the site cache (for target_date when the grid takes ?date=), or else the
+    "Book a Study Room" link from the study rooms page, without following it. A cached URL is tried first,
+    like book_room.open_cached_grid: one that no longer leads to the grid is dropped from the cache.
+    """
+    site = {} if args.refresh_site else load_site(args.libcal_url)
+    url = start_url(site, target_date)
+    if url:
+        await page.goto(url)
+        try:
+            await page.wait_until(VISIBLE_JS, "button.fc-goToDate-button", timeout=OPTIONAL_WAIT)
+        except WaitTimeout:
+            invalidate_site(args.libcal_url, "no grid at the cached URL")
+            url = None
+    if url and url != site["grid_url"]:
+        # The grid renders its title after the button; give it the same short wait the Selenium path does
+        deadline = time.monotonic() + OPTIONAL_WAIT
+        shows_date = title_shows_date(await page.execute(GRID_TITLE_JS), target_date)
+        while not shows_date and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+            shows_date = title_shows_date(await page.execute(GRID_TITLE_JS), target_date)
+        save_site(args.libcal_url, date_param=shows_date)
+        if not shows_date:
+            # The date picker still works; just stop trying the parameter
+            print("LibCal ignored the date in the URL; using the date picker.")
+            url = site["grid_url"]
+    if url:
+        return url
+    libcal = urlparse(args.libcal_url)
+    await page.goto(args.library_url)
+    href = await page.wait_until(LINK_HREF_JS, f"a[href*='{libcal.netloc}{libcal.path.rstrip('/')}']")
+    save_site(args.libcal_url, grid_url=href)
+    return href
+
+async def open_grid(page, grid_url):
+    await page.goto(grid_url)
+    await page.wait_until(VISIBLE_JS, "button.fc-goToDate-button")
+
+async def go_to_date(page, target_date, today=None):
+    if title_shows_date(await page.execute(GRID_TITLE_JS), target_date):
+        return
+    today = today or datetime.date.today()
+    await page.wait_until(VISIBLE_JS, "button.fc-goToDate-button")
+    await page.execute(CLICK_JS, "button.fc-goToDate-button", None)
+    await page.wait_until(VISIBLE_JS, "td.day")
+    if target_date.month != today.month:
+        await page.execute(NEXT_MONTH_JS)
+        await page.wait_until("return document.querySelector('td.day') !== window.__firstDayCell;")
+    if not await page.execute(CLICK_DAY_JS, str(target_date.day)):
+        raise WaitTimeout(f"Day {target_date.day} not in the date picker.")
+    await page.wait_ready()
+
+async def select_slot(page, args, time_str):
+    try:
+        await page.wait_until(f"return !!document.querySelector(\"a[title*='{time_str}']\");")
+    except WaitTimeout:
+        print(f"WARNING: No slots at {time_str} rendered on the grid.")
+    slot = choose_slot(SlotIndex.from_titles(await page.execute(SNAPSHOT_JS) or []), args, time_str)
+    if slot and not await page.execute(CLICK_BY_TITLE_JS, slot.ref):
+        return None
+    return slot
+
+async def select_end_time(page, end_time_str):
+    try:
+        selected = await page.wait_until(SELECT_OPTION_JS, end_time_str)
+        print(f"Success: Selected '{selected}'")
+    except WaitTimeout:
+        if await page.execute(END_TIMES_SHOWN_JS):
+            print("Keeping LibCal's default end time.")
+        else:
+            print(f"WARNING: Could not find a dropdown option containing '{end_time_str}'.")
+
+async def submit_times_and_login(page, username, password):
+    await page.wait_ready()
+    await page.wait_until(VISIBLE_JS, "#submit_times")
+    await page.execute(CLICK_JS, "#submit_times", None)
+    state = await page.wait_until(f"var s = (function() {{ {PAGE_STATE_JS} }})(); return s === 'login' || s === 'form' ? s : null;",
+                                  timeout=20)
+    if state == "login":
+        await page.execute(FILL_LOGIN_JS, username, password)
+        print("Logged in.")
+        await page.wait_until("return !!document.getElementById('btn-form-submit');", timeout=20)
+
+async def finalize_booking(page, dry_run, before_submit):
+    await page.wait_ready()
+    try:
+        await page.wait_until(CLICK_JS, "button", "Continue", timeout=OPTIONAL_WAIT)
+    except WaitTimeout:
+        pass
+    if not await before_submit():
+        print("Skipping final 'Submit My Booking' click.")
+        return False
+    if dry_run:
+        print("[DRY RUN] Skipping final 'Submit My Booking' click.")
+        return True
+    await page.wait_until(VISIBLE_JS, "#btn-form-submit")
+    await page.execute(CLICK_JS, "#btn-form-submit", None)
+    await page.wait_until("return !document.getElementById('btn-form-submit');", timeout=20)
+    await page.wait_ready()
+    print("Clicked 'Submit My Booking'.")
+    return True
+
+async def book_candidate(name, page, grid_url, args, target_date, username, password, race, timer):
+    """Books one candidate on its own page. Returns a result dict like parallel.run_worker."""
+    result = {"worker": name, "room": args.room, "start": f"{args.hour}:{args.minute:02d}{args.ampm}",
+              "result": "cancelled", "seconds": 0.0}
+    start_time = datetime.datetime.combine(target_date, datetime.time(to_24h(args.hour, args.ampm), args.minute))
+    time_str = format_slot_time(start_time)
+    end_time_str = format_slot_time(start_time + datetime.timedelta(minutes=args.duration))
+
+    claimed = False
+
+    async def before_submit():
+        nonlocal claimed
+        if not await race.claim(name):
+            print(f"[{name}] Another page already booked. Cancelling before final submit.")
+            return False
+        claimed = True
+        return True
+
+    booked = None
+    try:
+        with timer.stage("navigate"):
+            await open_grid(page, await grid_url)
+        with timer.stage("date_select"):
+            await go_to_date(page, target_date)
+        if race.decided():
+            return result
+        with timer.stage("slot_select"):
+            slot = await select_slot(page, args, time_str)
+        if not slot:
+            result["result"] = "no slot"
+            return result
+        with timer.stage("end_time"):
+            await select_end_time(page, end_time_str)
+        with timer.stage("sso"):
+            await submit_times_and_login(page, username, password)
+        with timer.stage("finalize"):
+            if await finalize_booking(page, args.dry_run, before_submit):
+                booked = slot.room
+        result["room"] = slot.room
+        if booked:
+            result["result"] = "won"
+    except Exception as e:
+        print(f"[{name}] An error occurred: {e}")
+        # Failing after the claim means the final submit may have gone through; handing over could book twice
+        result["result"] = "unknown" if claimed and not args.dry_run else f"error: {type(e).__name__}"
+    finally:
+        await race.settle(name, bool(booked) or result["result"] == "unknown")
+        result["seconds"] = timer.total()
+        telemetry.emit("worker_result", backend="cdp", **result)
+    return result
+
+async def book_async(args, open_browser):
+    """Launches one browser and races every candidate on its own page. Returns the booked room, or None."""
+    # Like --parallel, but pages instead of browsers; without it, one page books with the usual fallback
+    candidates = [(args.room, args.hour, args.minute, args.ampm)]
+    if args.parallel or args.alt_starts:
+        candidates = build_candidates(args)[:max(1, args.workers)]
+    target_date = datetime.date.today() + datetime.timedelta(days=DAYS_AHEAD)
+    print(f"--- Carleton Library Room Booker (CDP backend: {len(candidates)} page(s) in one browser) ---")
+    print(f"Target Date: {target_date.strftime('%A, %B %d, %Y')}")
+    if args.dry_run:
+        print("BS: *** DRY RUN MODE ENABLED - NO BOOKING WILL BE MAKING ***")
+    username, password = get_credentials()
+
+    timers = [StageTimer() for _ in candidates]
+    with contextlib.ExitStack() as stack:
+        for timer in timers:
+            stack.enter_context(timer.stage("startup"))
+        browser = await open_browser(args)
+
+    race = AsyncFirstWinner()
+    try:
+        # Finding the LibCal link and opening the other pages overlap; every page then goes straight to the grid
+        pages = await asyncio.gather(*(browser.new_page() for _ in candidates))
+        grid_url = asyncio.ensure_future(find_libcal_link(pages[0], args, target_date))
+        jobs = []
+        for i, (room, hour, minute, ampm) in enumerate(candidates, 1):
+            job = argparse.Namespace(**vars(args))
+            job.room, job.hour, job.minute, job.ampm = room, hour, minute, ampm
+            if len(candidates) > 1:
+                job.fallback = "none"
+            jobs.append(book_candidate(f"p{i} {room}", pages[i - 1], grid_url, job, target_date,
+                                       username, password, race, timers[i - 1]))
+        results = await asyncio.gather(*jobs)
+    finally:
+        await browser.close()
+
+    if len(results) > 1:
+        print("\n--- Page Results ---")
+        print(f"{'Page':<10}  {'Start':<8}  {'Seconds':>7}  Result")
+        for r in results:
+            print(f"{r['worker']:<10}  {r['start']:<8}  {r['seconds']:>7.2f}  {r['result']}")
+    # Timings of the winning page, or of the first one if nothing was booked
+    winner = next((i for i, r in enumerate(results) if r["result"] == "won"), 0)
+    report_timings(timers[winner], args)
+    print("Done.")
+    return results[winner]["room"] if results[winner]["result"] == "won" else None
+
+def run_async(args):
+    """Entry point for --backend cdp."""
+    from cdp import CdpBrowser
+    return asyncio.run(book_async(args, CdpBrowser.launch))
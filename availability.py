@@ -0,0 +1,78 @@
+"""
+Background availability fetching for the config tool: a worker thread that reads LibCal grids over
+HTTP (no login needed) and a TTL cache of the snapshots, so the Tk mainloop never waits on the network.
+"""
+import os
+import time
+import queue
+import threading
+import requests
+from libcal_http import LibCalHttpEngine, BookingError, index_slots, LIBCAL_URL
+
+CACHE_TTL = 60  # seconds a grid snapshot is shown without refetching
+
+class SnapshotCache:
+    """date -> (SlotIndex, fetch latency in seconds, monotonic fetch time), expiring after `ttl`."""
+
+    def __init__(self, ttl=CACHE_TTL):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def put(self, date, index, latency):
+        with self._lock:
+            self._entries[date] = (index, latency, time.monotonic())
+
+    def get(self, date, allow_stale=False):
+        """Returns (index, latency, age in seconds), or None if missing or older than the TTL."""
+        with self._lock:
+            entry = self._entries.get(date)
+        if not entry:
+            return None
+        index, latency, fetched = entry
+        age = time.monotonic() - fetched
+        if age > self.ttl and not allow_stale:
+            return None
+        return index, latency, age
+
+class AvailabilityWorker(threading.Thread):
+    """
+    Fetches grids requested with request(date) one at a time on its own thread, reusing one HTTP session.
+    Results land on `results` as (date, index, latency, error) for the UI thread to pick up.
+    """
+
+    def __init__(self, base_url=None, cache=None):
+        super().__init__(daemon=True)
+        self.engine = LibCalHttpEngine(base_url or os.environ.get("LIBCAL_URL", LIBCAL_URL))
+        self.cache = cache or SnapshotCache()
+        self.requests = queue.Queue()
+        self.results = queue.Queue()
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def request(self, date, force=False):
+        """Queues a fetch of `date` unless a fresh snapshot is cached or one is already queued."""
+        cached = self.cache.get(date)
+        if cached and not force:
+            self.results.put((date, cached[0], cached[1], None))
+            return
+        with self._lock:
+            if date in self._pending:
+                return
+            self._pending.add(date)
+        self.requests.put(date)
+
+    def run(self):
+        while True:
+            date = self.requests.get()
+            start = time.perf_counter()
+            try:
+                index = index_slots(self.engine.fetch_availability(date))
+                latency = time.perf_counter() - start
+                self.cache.put(date, index, latency)
+                self.results.put((date, index, latency, None))
+            except (requests.RequestException, BookingError, ValueError) as e:
+                self.results.put((date, None, time.perf_counter() - start, str(e)))
+            finally:
+                with self._lock:
+                    self._pending.discard(date)
@@ -0,0 +1,154 @@
+import csv
+import json
+import argparse
+import datetime
+from selenium.webdriver.support.ui import WebDriverWait
+from book_room import (
+    DAYS_AHEAD, get_credentials, create_driver, is_headless_run, open_libcal, wait_for_page_ready,
+)
+from checkpoint import BookingState, book_in_session
+import telemetry
+from stage_timer import StageTimer
+
+def parse_job_date(value, today=None):
+    """Accepts YYYY-MM-DD or "+N" (N days from today)."""
+    today = today or datetime.date.today()
+    value = str(value).strip()
+    if not value:
+        return today + datetime.timedelta(days=DAYS_AHEAD)
+    if value.startswith("+"):
+        return today + datetime.timedelta(days=int(value[1:]))
+    return datetime.date.fromisoformat(value)
+
+def parse_job_time(value):
+    """Accepts "3:30PM", "3:30 pm" or 24h "15:30". Returns (hour, minute, ampm) in the CLI's 12h form."""
+    value = str(value).strip().upper().replace(" ", "")
+    ampm = None
+    if value.endswith(("AM", "PM")):
+        value, ampm = value[:-2], value[-2:]
+    hour, minute = (int(part) for part in value.split(":"))
+    if ampm is None:
+        ampm = "PM" if hour >= 12 else "AM"
+        hour = hour % 12 or 12
+    return hour, minute, ampm
+
+def make_job(args, date, room=None, start=None, duration=None):
+    """A copy of the CLI args with one job's date, rooms, start time and duration filled in."""
+    job = argparse.Namespace(**vars(args))
+    job.date = parse_job_date(date)
+    if room:
+        job.room = ",".join(str(r) for r in room) if isinstance(room, list) else str(room)
+    if start:
+        job.hour, job.minute, job.ampm = parse_job_time(start)
+    if duration:
+        job.duration = int(duration)
+    return job
+
+def load_jobs(path, args):
+    """
+    Reads jobs from a JSON list of {"date", "room", "start", "duration"} objects, or a CSV file with
+    those columns. Missing fields fall back to the CLI values.
+    """
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if path.lower().endswith(".json"):
+            rows = json.load(f)
+        else:
+            rows = list(csv.DictReader(f))
+    return [make_job(args, row.get("date", ""), row.get("room"), row.get("start"), row.get("duration")) for row in rows]
+
+def parse_job_spec(spec, args):
+    """CLI form: "DATE [ROOMS] [START] [DURATION]", e.g. "2026-10-25 464,468 3:30PM 120" or "+8"."""
+    parts = spec.split()
+    return make_job(args, *parts[:4])
+
+def format_results(results):
+    header = f"{'#':>2}  {'Date':<10}  {'Start':<8}  {'Rooms':<16}  {'Booked':<7}  {'Seconds':>7}  Result"
+    lines = [header, "-" * len(header)]
+    for i, r in enumerate(results, 1):
+        lines.append(f"{i:>2}  {r['date']:<10}  {r['start']:<8}  {r['rooms']:<16}  {r['booked'] or '-':<7}  "
+                     f"{r['seconds']:>7.2f}  {r['result']}")
+    return "\n".join(lines)
+
+def run_batch(args):
+    jobs = []
+    if args.batch:
+        jobs.extend(load_jobs(args.batch, args))
+    for spec in args.job or []:
+        jobs.append(parse_job_spec(spec, args))
+    if not jobs:
+        print("No jobs to run.")
+        return []
+
+    print(f"--- Carleton Library Room Booker (BATCH: {len(jobs)} jobs) ---")
+    if args.dry_run:
+        print("BS: *** DRY RUN MODE ENABLED - NO BOOKING WILL BE MAKING ***")
+
+    username, password = get_credentials()
+
+    session_timer = StageTimer()
+    with session_timer.stage("startup"):
+        driver = create_driver(args)
+    session_timer.track_commands(driver.command_counter)
+    wait = WebDriverWait(driver, 10, poll_frequency=0.1)
+    results = []
+
+    try:
+        with session_timer.stage("navigate"):
+            open_libcal(driver, wait, args)
+            grid_url = driver.current_url
+
+        for i, job in enumerate(jobs, 1):
+            print(f"\n=== Job {i}/{len(jobs)}: Room={job.room}, {job.date}, {job.hour}:{job.minute:02d} {job.ampm}, {job.duration} mins ===")
+            timer = StageTimer()
+            timer.track_commands(driver.command_counter)
+            booked, outcome = None, "failed"
+            try:
+                state = BookingState(job, job.date, driver.current_url, username, password)
+                # LibCal keeps the cart on the server for this session, so an unbooked job's entry is taken
+                # back out before the next job, which would otherwise submit it along with its own
+                booked = book_in_session(driver, wait, state, timer, max_attempts=job.stage_attempts)
+                if booked:
+                    outcome = "dry-run ok" if args.dry_run else "booked"
+                else:
+                    outcome = "unknown" if state.outcome == "unknown" else "no slot"
+                if not state.cart_clean:
+                    print("WARNING: This job's slot may still be in the cart; the next job's booking form will be checked for it.")
+            except Exception as e:
+                print(f"An error occurred: {e}")
+                telemetry.emit("error", job=i, error=type(e).__name__, message=str(e), url=driver.current_url)
+                outcome = f"error: {type(e).__name__}"
+                if is_headless_run(args):
+                    driver.save_screenshot(f"error_screenshot_job{i}.png")
+                    print(f"Saved error_screenshot_job{i}.png")
+
+            results.append({
+                "date": job.date.isoformat(), "start": f"{job.hour}:{job.minute:02d}{job.ampm}",
+                "rooms": job.room, "duration": job.duration, "booked": booked, "result": outcome,
+                "seconds": timer.total(), "stages": timer.stages,
+            })
+            telemetry.emit("job_result", job=i, **{k: v for k, v in results[-1].items() if k != "stages"})
+
+            # Back to the grid for the next job; the SSO session stays alive in this browser
+            if i < len(jobs):
+                with session_timer.stage("return_to_grid"):
+                    driver.get(grid_url)
+                    wait_for_page_ready(driver)
+
+    except Exception as e:
+        print(f"An error occurred: {e}")
+        telemetry.emit("error", error=type(e).__name__, message=str(e))
+        if is_headless_run(args):
+             driver.save_screenshot("error_screenshot.png")
+             print("Saved error_screenshot.png")
+
+    finally:
+        print("\n--- Batch Results ---")
+        print(format_results(results))
+        print(f"\nSession overhead:\n{session_timer.summary_table()}")
+        if args.timings_json:
+            with open(args.timings_json, "w", encoding="utf-8") as f:
+                json.dump({"session": session_timer.to_dict(), "jobs": results}, f, indent=2)
+            print(f"Wrote timings to {args.timings_json}")
+        print("Done.")
+        driver.quit()
+    return results
@@ -0,0 +1,164 @@
+"""
+Offline end-to-end benchmark: runs the real booking flow headless against mock_libcal.py
+and reports p50/p95 latency, end to end and per stage.
+
+    python benchmark.py --runs 10 --rooms 30 --latency-ms 40
+    python benchmark.py --engine http --runs 50
+    python benchmark.py --compare-backends --runs 5
+"""
+import io
+import os
+import sys
+import json
+import math
+import argparse
+import tempfile
+import contextlib
+from mock_libcal import start_mock_server
+import site_cache
+
+def percentile(values, pct):
+    """Nearest-rank percentile."""
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100.0 * len(ordered)))
+    return ordered[rank - 1]
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description="Offline booking benchmark against a synthetic LibCal site")
+    parser.add_argument("--engine", default="selenium", choices=["selenium", "http"], help="Booking engine to benchmark")
+    parser.add_argument("--runs", default=10, type=int, help="Measured runs")
+    parser.add_argument("--warmup", default=1, type=int, help="Unmeasured runs first (driver cache, OS caches)")
+    parser.add_argument("--rooms", default=12, type=int, help="Rooms on the synthetic grid")
+    parser.add_argument("--slot-minutes", default=30, type=int, help="Grid slot length")
+    parser.add_argument("--open-hour", default=8, type=int)
+    parser.add_argument("--close-hour", default=23, type=int)
+    parser.add_argument("--latency-ms", default=0, type=float, help="Artificial server delay per request")
+    parser.add_argument("--booked-ratio", default=0.2, type=float, help="Fraction of slots that start out booked")
+    parser.add_argument("--json", help="Write all run timings and the summary to this file")
+    parser.add_argument("--compare-backends", action="store_true", help="Run the selenium and cdp browser backends back to back and compare them")
+    parser.add_argument("--verbose", action="store_true", help="Show the booking flow's own output")
+    # Anything else is passed straight to book_room.py's parser (e.g. --room 464,466 --duration 60)
+    return parser.parse_known_args(argv)
+
+def run_once(engine, booking_args, timings_path, verbose):
+    """One booking through the real flow. Returns (success, timings dict)."""
+    from book_room import book_room
+    from libcal_http import http_book_room
+
+    booking_args.timings_json = timings_path
+    out = io.StringIO()
+    with contextlib.redirect_stdout(sys.stdout if verbose else out):
+        if engine == "http":
+            ok = http_book_room(booking_args)
+        elif booking_args.backend == "cdp":
+            from async_booking import run_async
+            ok = run_async(booking_args)
+        else:
+            ok = book_room(booking_args)
+    with open(timings_path, "r", encoding="utf-8") as f:
+        return bool(ok), json.load(f)
+
+def summarize(runs):
+    """Per-stage and end-to-end p50/p95/mean over successful runs."""
+    series, commands = {}, {}
+    for run in runs:
+        for s in run["stages"]:
+            series.setdefault(s["stage"], []).append(s["duration_s"])
+            if "commands" in s:
+                commands.setdefault(s["stage"], []).append(s["commands"])
+        series.setdefault("end_to_end", []).append(run["total_s"])
+        if any("commands" in s for s in run["stages"]):
+            commands.setdefault("end_to_end", []).append(sum(s.get("commands", 0) for s in run["stages"]))
+    summary = {name: {"p50": percentile(v, 50), "p95": percentile(v, 95), "mean": sum(v) / len(v), "n": len(v)}
+               for name, v in series.items()}
+    # WebDriver commands per stage (selenium engine only)
+    for name, v in commands.items():
+        summary[name]["commands"] = percentile(v, 50)
+    return summary
+
+def format_summary(summary):
+    width = max(len("Stage"), max(len(name) for name in summary))
+    cmds = any("commands" in s for s in summary.values())
+    lines = [f"{'Stage':<{width}}  {'p50 (s)':>8}  {'p95 (s)':>8}  {'mean (s)':>8}  {'n':>3}" + ("  Cmds" if cmds else ""),
+             "-" * (width + (42 if cmds else 36))]
+    for name, s in summary.items():
+        count = f"  {s.get('commands', ''):>4}" if cmds else ""
+        lines.append(f"{name:<{width}}  {s['p50']:>8.3f}  {s['p95']:>8.3f}  {s['mean']:>8.3f}  {s['n']:>3}{count}")
+    return "\n".join(lines)
+
+def format_comparison(selenium, cdp):
+    """Side-by-side p50 per stage for the two browser backends."""
+    names = [name for name in selenium if name in cdp]
+    width = max(len("Stage"), max(len(name) for name in names))
+    lines = [f"{'Stage':<{width}}  {'selenium':>8}  {'cdp':>8}  {'speedup':>7}", "-" * (width + 31)]
+    for name in names:
+        a, b = selenium[name]["p50"], cdp[name]["p50"]
+        lines.append(f"{name:<{width}}  {a:>8.3f}  {b:>8.3f}  {a / b if b else float('nan'):>6.2f}x")
+    return "\n".join(lines)
+
+def run_series(bench, booking_args, state):
+    """Warmup plus measured runs of one configuration. Returns (successful run timings, failure count)."""
+    runs, failures = [], 0
+    with tempfile.TemporaryDirectory() as tmp:
+        for i in range(bench.warmup + bench.runs):
+            # Fresh site state each run so the same slot is bookable again
+            state.booked.clear()
+            state.carts.clear()
+            state.authed.clear()
+            ok, timings = run_once(bench.engine, booking_args, os.path.join(tmp, f"run{i}.json"), bench.verbose)
+            if i < bench.warmup:
+                continue
+            timings["success"] = ok
+            if ok:
+                runs.append(timings)
+            else:
+                failures += 1
+            print(f"  run {i - bench.warmup + 1:>3}: {'ok ' if ok else 'FAIL'} {timings['total_s']:.3f}s")
+    return runs, failures
+
+def main(argv=None):
+    bench, passthrough = parse_arguments(argv)
+    rooms = [str(464 + 2 * i) for i in range(bench.rooms)]
+    server, state = start_mock_server(rooms=rooms, slot_minutes=bench.slot_minutes, open_hour=bench.open_hour,
+                                      close_hour=bench.close_hour, booked_ratio=bench.booked_ratio,
+                                      latency=bench.latency_ms / 1000.0)
+    # The mock gets a new port every time; keep its entries out of the real site cache
+    site_cache.SITE_CACHE_FILE = os.path.join(tempfile.mkdtemp(prefix="librarybot-bench-"), "site_cache.json")
+    os.environ["CARLETON_USER"] = state.username
+    os.environ["CARLETON_PASS"] = state.password
+
+    from book_room import parse_arguments as parse_booking_arguments
+    booking_args = parse_booking_arguments(["--headless", "--libcal-url", server.url,
+                                            "--library-url", server.url + "/services/study-rooms"] + passthrough)
+
+    backends = ["selenium", "cdp"] if bench.compare_backends else [booking_args.backend]
+    results = {}
+    for backend in backends:
+        booking_args.backend = backend
+        label = "http engine" if bench.engine == "http" else f"selenium engine ({backend} backend)"
+        print(f"Benchmarking {label} against {server.url}: {bench.rooms} rooms, "
+              f"{bench.slot_minutes}-min slots, {bench.latency_ms:.0f} ms latency, {bench.runs} runs")
+        runs, failures = run_series(bench, booking_args, state)
+        summary = summarize(runs)
+        print(f"\n{len(runs)} successful, {failures} failed")
+        if runs:
+            print(format_summary(summary))
+        results[backend] = {"summary": summary, "runs": runs, "failures": failures}
+
+    server.shutdown()
+    if bench.compare_backends and all(r["runs"] for r in results.values()):
+        print("\n--- Backend comparison (p50) ---")
+        print(format_comparison(results["selenium"]["summary"], results["cdp"]["summary"]))
+    if bench.json:
+        with open(bench.json, "w", encoding="utf-8") as f:
+            if bench.compare_backends:
+                json.dump({"config": vars(bench), "backends": results}, f, indent=2)
+            else:
+                json.dump({"config": vars(bench), **results[backends[0]]}, f, indent=2)
+        print(f"Wrote {bench.json}")
+    return results[backends[-1]]["summary"]
+
+if __name__ == "__main__":
+    main()
@@ -1,290 +1,531 @@
 import os
-import time
+import re
 import datetime
 import getpass
 import base64
 import argparse
-import sys
+from urllib.parse import urlparse
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
-from selenium.webdriver.support.ui import Select
-from selenium.common.exceptions import NoSuchElementException, TimeoutException
+from selenium.common.exceptions import NoSuchElementException, TimeoutException, SessionNotCreatedException
+from stage_timer import StageTimer
+from driver_cache import resolve_driver_path
+from browser_profiles import apply_lean_options, apply_low_memory_options, merge_chrome_args, enable_request_blocking
+from memory_sampler import MemorySampler
+from dom import select_option_containing, click_element, count_commands
+from site_cache import load_site, save_site, invalidate_site, start_url
+import telemetry
+from slot_index import FALLBACK_RULES, parse_room_list
 
-def parse_arguments():
+LIBRARY_URL = "https://library.carleton.ca/services/study-rooms"
+LIBCAL_URL = "https://carletonu.libcal.com"
+
+# Rooms are released this many days ahead
+DAYS_AHEAD = 7
+
+# Short timeout for elements that may legitimately never appear (cookie banner, "Continue").
+OPTIONAL_WAIT = 3
+
+def wait_for_page_ready(driver, timeout=10):
+    """Waits until the DOM is loaded and no jQuery/XHR requests are in flight (LibCal uses jQuery)."""
+    # With the eager strategy (--lean) the DOM is enough; subresources aren't waited for
+    eager = driver.capabilities.get("pageLoadStrategy") == "eager"
+    ready = "document.readyState !== 'loading'" if eager else "document.readyState === 'complete'"
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=0.1).until(lambda d: d.execute_script(
+            f"return {ready} && (!window.jQuery || window.jQuery.active === 0);"
+        ))
+    except TimeoutException:
+        print("WARNING: Page did not go idle in time. Continuing anyway...")
+
+def parse_arguments(argv=None):
     parser = argparse.ArgumentParser(description="Carleton Library Room Booker")
-    
+
     # Defaults can be overridden by Environment Variables
     default_room = os.environ.get("TARGET_ROOM", "464")
     default_hour = os.environ.get("START_HOUR", "3") # 12-hour format
     default_minute = os.environ.get("START_MINUTE", "30")
     default_ampm = os.environ.get("START_AMPM", "PM") # AM or PM
     default_duration = os.environ.get("DURATION_MINUTES", "180")
-    
-    parser.add_argument("--room", default=default_room, help="Target room number (e.g. 464)")
+
+    parser.add_argument("--room", default=default_room, help="Target room number, or several in order of preference (e.g. 464 or 464,468,466)")
     parser.add_argument("--hour", default=default_hour, type=int, help="Start hour (1-12)")
     parser.add_argument("--minute", default=default_minute, type=int, help="Start minute (0-59)")
     parser.add_argument("--ampm", default=default_ampm, choices=["AM", "PM"], help="AM or PM")
     parser.add_argument("--duration", default=default_duration, type=int, help="Duration in minutes (e.g. 30, 60, 180)")
+    parser.add_argument("--fallback", default=os.environ.get("ROOM_FALLBACK", "any"), choices=FALLBACK_RULES, help="If no preferred room is free: any room, same floor first, or none")
+    parser.add_argument("--full-duration", action="store_true", help="Only pick rooms that are free for the whole duration")
     parser.add_argument("--dry-run", action="store_true", help="Perform a dry run without submitting the booking")
     parser.add_argument("--headless", action="store_true", help="Run in headless mode")
+    parser.add_argument("--events-jsonl", default=os.environ.get("BOOKING_EVENTS_JSONL"), help=f"Append structured run events to this file (default {telemetry.EVENTS_FILE})")
+    parser.add_argument("--no-history", action="store_true", help="Don't record this run in the local history")
+    parser.add_argument("--pool-url", default=os.environ.get("BOOKING_POOL_URL", "http://127.0.0.1:8770"), help="Warm browser pool (pool.py) to submit to when it is running")
+    parser.add_argument("--no-pool", action="store_true", help="Always start a browser here, even if a pool is running")
+    parser.add_argument("--stage-attempts", default=None, type=int, help="Tries per booking step before giving up (default: per-step budgets)")
+    parser.add_argument("--record", metavar="BUNDLE", help="Record pages and responses of each stage to a replay bundle (implies --dry-run; see replay.py)")
+    parser.add_argument("--timings-json", default=os.environ.get("TIMINGS_JSON"), help="Write per-stage timings to this JSON file")
+    parser.add_argument("--low-memory", action="store_true", help="One renderer process, no GPU, small caches and a capped JS heap")
+    parser.add_argument("--memory-budget", default=os.environ.get("MEMORY_BUDGET_MB"), type=float, help="MB for Python + Chrome; implies --low-memory, warns and trims the browser when exceeded")
+    parser.add_argument("--lean", action="store_true", help="Eager page loads, block images/fonts/media/trackers and disable unneeded Chrome features")
+    parser.add_argument("--profile-dir", default=os.environ.get("CHROME_PROFILE_DIR"), help="Persistent Chrome user-data-dir so SSO and cookie consent survive between runs")
+    parser.add_argument("--refresh-driver", action="store_true", help="Ignore the cached ChromeDriver path and resolve it again")
+    parser.add_argument("--refresh-site", action="store_true", help="Ignore cached LibCal metadata (grid URL, IDs) and discover it again")
 
-    return parser.parse_args()
+    # Armed mode: warm up before release, then poll the grid and book the moment the slot opens
+    parser.add_argument("--armed", action="store_true", help="Log in and wait on the grid, then book as soon as slots are released")
+    parser.add_argument("--fire-at", default=os.environ.get("FIRE_AT", "00:00"), help="Local release time (HH:MM, 24h) for --armed")
+    parser.add_argument("--poll-interval", default=0.25, type=float, help="Seconds between grid refreshes in --armed mode")
+    parser.add_argument("--armed-timeout", default=120, type=float, help="Seconds to keep polling after --fire-at before giving up")
 
-def book_room(args):
-    print("--- Carleton Library Room Booker ---")
-    print(f"Configuration: Room={args.room}, Time={args.hour}:{args.minute:02d} {args.ampm}, Duration={args.duration} mins")
-    
-    if args.dry_run:
-        print("BS: *** DRY RUN MODE ENABLED - NO BOOKING WILL BE MAKING ***")
-    
-    # 1. Credentials
-    encoded_user = "" 
+    # Parallel mode: one headless browser per candidate room/start time, first to the booking form wins
+    parser.add_argument("--parallel", action="store_true", help="Race one headless browser per candidate room/start time")
+    parser.add_argument("--workers", default=4, type=int, help="Maximum concurrent browsers for --parallel")
+    parser.add_argument("--alt-starts", default="", help="Extra start times for --parallel candidates (e.g. 4:00PM,4:30PM)")
+
+    # Batch mode: several bookings through one logged-in browser session
+    parser.add_argument("--batch", help="CSV or JSON file of jobs (date, room, start, duration) to book in one session")
+    parser.add_argument("--job", action="append", help='Extra job as "DATE [ROOMS] [START] [DURATION]", e.g. "2026-10-25 464,468 3:30PM 120" (repeatable)')
+
+    # Watch mode: keep polling for cancellations on the --job/--batch targets and book them when they free up
+    parser.add_argument("--watch", action="store_true", help="Watch the --job/--batch targets for cancellations and book them when they free up")
+    parser.add_argument("--watch-min-interval", default=15, type=float, help="Poll interval (s) in peak windows or right after a change")
+    parser.add_argument("--watch-max-interval", default=300, type=float, help="Longest poll interval (s) when nothing is changing")
+    parser.add_argument("--watch-hours", default=24, type=float, help="Stop watching after this many hours")
+
+    # Engine: drive Chrome (default) or post to LibCal directly over HTTP
+    parser.add_argument("--engine", default=os.environ.get("BOOKING_ENGINE", "selenium"), choices=["selenium", "http"], help="Booking engine")
+    parser.add_argument("--backend", default=os.environ.get("BROWSER_BACKEND", "selenium"), choices=["selenium", "cdp"], help="Browser driver: selenium, or cdp to drive pages concurrently in one Chrome over the DevTools protocol (asyncio)")
+    parser.add_argument("--libcal-url", default=os.environ.get("LIBCAL_URL", LIBCAL_URL), help="LibCal base URL (e.g. a local mock_libcal.py)")
+    parser.add_argument("--library-url", default=os.environ.get("LIBRARY_URL", LIBRARY_URL), help="Study rooms page that links to LibCal")
+    parser.add_argument("--cookie-jar", default=os.environ.get("COOKIE_JAR"), help="JSON file to load/save SSO cookies for --engine http")
+
+    return parser.parse_args(argv)
+
+def get_credentials():
+    """Reads credentials from the environment, falling back to an interactive prompt."""
+    encoded_user = ""
     encoded_pass = ""
-    
+
     username = os.environ.get('CARLETON_USER')
     password = os.environ.get('CARLETON_PASS')
-    
+
     if not username and encoded_user:
         try:
             username = base64.b64decode(encoded_user).decode()
         except:
             pass
-            
+
     if not password and encoded_pass:
         try:
             password = base64.b64decode(encoded_pass).decode()
         except:
             pass
-    
+
     if not username:
         username = input("Enter your MyCarletonOne Username: ")
     if not password:
         password = getpass.getpass("Enter your Password: ")
-    
-    # 2. Setup Browser
-    options = webdriver.ChromeOptions()
+    return username, password
+
+def is_headless_run(args):
     # Check for CI environment variable to run headless
-    is_ci = os.environ.get('CI') == 'true'
-    if is_ci or args.headless:
+    return os.environ.get('CI') == 'true' or args.headless
+
+def chrome_options(args, profile_dir=None):
+    options = webdriver.ChromeOptions()
+    if is_headless_run(args):
         print("Running in headless mode")
         options.add_argument("--headless")
         options.add_argument("--no-sandbox")
         options.add_argument("--disable-dev-shm-usage")
         options.add_argument("--window-size=1920,1080")
-    
-    driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
-    wait = WebDriverWait(driver, 10)
-    
-    try:
-        # 3. Navigate to Study Rooms page
-        print("Navigating to library website...")
-        driver.get("https://library.carleton.ca/services/study-rooms")
-        
-        # Handle Cookie Consent
-        try:
-            cookie_btn = wait.until(EC.presence_of_element_located((By.XPATH, "//button[contains(text(), 'Ok. Got it.')]")))
-            driver.execute_script("arguments[0].click();", cookie_btn)
-            time.sleep(1)
-        except:
-            pass
-        
-        # Click "Book a Study Room"
-        book_btn = wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "a[href*='carletonu.libcal.com'] button")))
-        driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", book_btn)
-        time.sleep(1)
-        driver.execute_script("arguments[0].click();", book_btn)
-        
-        # Switch to new tab
-        if len(driver.window_handles) > 1:
-            driver.switch_to.window(driver.window_handles[1])
-            
-        # 4. Select Date (One week from now)
-        today = datetime.date.today()
-        # logic: book for 7 days ahead
-        target_date = today + datetime.timedelta(days=7)
-        target_day_str = str(target_date.day)
-        print(f"Target Date: {target_date.strftime('%A, %B %d, %Y')}")
-        
-        # Click "Go To Date"
-        go_to_date_btn = wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, "button.fc-goToDate-button")))
-        go_to_date_btn.click()
-        time.sleep(1) 
-        
-        if target_date.month > today.month:
-             try:
-                 next_month_btn = driver.find_element(By.CSS_SELECTOR, "button.fc-next-button")
-                 next_month_btn.click()
-                 time.sleep(0.5)
-             except:
-                 pass 
-
-        # Click the day
-        driver.execute_script(f"""
-        document.querySelectorAll('td').forEach(el => {{
-            if (el.innerText.trim() === '{target_day_str}' && !el.classList.contains('old') && !el.classList.contains('new')) {{
-                el.click();
-            }}
-        }});
-        """)
-        
-        time.sleep(2) 
-        
-        # 5. Select Start Time
-        print(f"Selecting start time {args.hour}:{args.minute:02d} {args.ampm}...")
-        
-        # Convert 12h to 24h for datetime logic
-        hour_24 = args.hour
-        if args.ampm == "PM" and args.hour != 12:
-            hour_24 += 12
-        elif args.ampm == "AM" and args.hour == 12:
-            hour_24 = 0
-            
-        start_time = datetime.datetime.combine(target_date, datetime.time(hour_24, args.minute))
-        time_str = start_time.strftime("%I:%M%p").lstrip("0").lower() # e.g. "3:30pm"
-        
-        # Construct XPath based on strategy
-        # Strategy: "Any Room" (Try preferred, then fallback)
-        
-        slot = None
-        
-        print(f"Looking for preferred Room {args.room} at {time_str}")
-        xpath_specific = f"//a[contains(@title, '{time_str}') and contains(@title, '{args.room}') and contains(@title, 'Available')]"
-        try:
-            slot = driver.find_element(By.XPATH, xpath_specific)
-            print(f"Found preferred Room {args.room}!")
-        except NoSuchElementException:
-            print(f"Preferred Room {args.room} unavailable. searching for ANY available room at {time_str}...")
-            xpath_any = f"//a[contains(@title, '{time_str}') and contains(@title, 'Available')]"
-            try:
-                # Get all available slots at that time
-                slots = driver.find_elements(By.XPATH, xpath_any)
-                if slots:
-                    slot = slots[0] # Pick the first one
-                    # Extract room number from title for logging if possible
-                    title = slot.get_attribute("title")
-                    print(f"Found alternative slot: {title}")
-                else:
-                    print(f"No rooms available at all at {time_str}.")
-                    return
-            except Exception as e:
-                print(f"Error finding alternative room: {e}")
-                return
-
-        if slot:
-            driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", slot)
-            driver.execute_script("arguments[0].click();", slot)
-            print(f"Clicked start time slot.")
-            time.sleep(2)
-        else:
-            print("Failed to select a slot.")
-            return
-
-        # 6. Select End Time from Dropdown
-        # Calculate expected end time
-        end_time = start_time + datetime.timedelta(minutes=args.duration)
-        end_time_str = end_time.strftime("%I:%M%p").lstrip("0").lower() 
-        
-        print(f"Selecting end time {end_time_str} from dropdown...")
+    if profile_dir:
+        options.add_argument(f"--user-data-dir={os.path.abspath(profile_dir)}")
+    if args.lean:
+        apply_lean_options(options)
+    if args.low_memory or args.memory_budget:
+        apply_low_memory_options(options)
+    options.arguments[:] = merge_chrome_args(options.arguments)
+    if args.record:
+        # Network events for replay.SessionRecorder
+        options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+    return options
+
+def create_driver(args):
+    """Starts Chrome using the cached driver path and, if configured, the persistent profile."""
+    driver_path, cache_hit, saved = resolve_driver_path(refresh=args.refresh_driver)
+    if cache_hit:
+        print(f"Using cached ChromeDriver (saved ~{saved:.2f}s of driver resolution)")
+    profile_dir = args.profile_dir
+
+    while True:
         try:
-            time.sleep(2)
-            all_selects = driver.find_elements(By.TAG_NAME, "select")
-            target_dropdown_found = False
-            
-            for index, select_el in enumerate(all_selects):
-                try:
-                    # Check visibility
-                    if not select_el.is_displayed():
-                        continue
-                        
-                    driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", select_el)
-                    select = Select(select_el)
-                    
-                    found_option = None
-                    for option in select.options:
-                        if end_time_str in option.text.lower():
-                             found_option = option
-                             break
-                    
-                    if found_option:
-                        select.select_by_visible_text(found_option.text)
-                        target_dropdown_found = True
-                        print(f"Success: Selected '{found_option.text}'")
-                        break
-                    
-                except Exception:
-                    continue
-            
-            if not target_dropdown_found:
-                print(f"WARNING: Could not find a dropdown option containing '{end_time_str}'.")
-                
-        except Exception as e:
-            print(f"Error selecting end time: {e}")
-
-        # 7. Submit Times
-        print("Waiting for selection to register...")
-        time.sleep(2) 
-        submit_btn = driver.find_element(By.ID, "submit_times")
-        driver.execute_script("arguments[0].click();", submit_btn)
-        
-        # 8. SSO Login
-        print("Waiting for SSO Login...")
+            driver = webdriver.Chrome(service=Service(driver_path), options=chrome_options(args, profile_dir))
+            count_commands(driver)
+            if args.lean:
+                enable_request_blocking(driver)
+            return driver
+        except SessionNotCreatedException as e:
+            # Chrome updated since the driver was cached: resolve a matching driver and retry
+            if cache_hit:
+                print("Cached ChromeDriver could not start Chrome. Resolving a new one...")
+                driver_path, cache_hit, saved = resolve_driver_path(refresh=True)
+            # Profile locked by another Chrome or corrupted: fall back to a fresh one (and a fresh login)
+            elif profile_dir:
+                print(f"Could not start Chrome with profile {profile_dir}: {e.msg}. Using a fresh profile.")
+                profile_dir = None
+            else:
+                raise
+
+def to_24h(hour, ampm):
+    if ampm == "PM" and hour != 12:
+        return hour + 12
+    if ampm == "AM" and hour == 12:
+        return 0
+    return hour
+
+def format_slot_time(dt):
+    return dt.strftime("%I:%M%p").lstrip("0").lower() # e.g. "3:30pm"
+
+def title_shows_date(title, target_date):
+    """True if a grid title like "Monday, November 30, 2026" is for target_date (and November 3 isn't)."""
+    return re.search(rf"\b{target_date.strftime('%B')} 0?{target_date.day}\b", title or "") is not None
+
+def grid_shows_date(driver, target_date):
+    """Checks the FullCalendar toolbar title to see whether the grid is showing target_date."""
+    title = driver.execute_script(
+        "var h = document.querySelector('.fc-toolbar h2'); return h ? h.innerText : '';"
+    )
+    return title_shows_date(title, target_date)
+
+def open_cached_grid(driver, args, url, target_date=None):
+    """
+    Opens the LibCal grid straight from the site cache. Returns False if the URL no longer leads to the grid,
+    after dropping it from the cache. Also learns whether the grid honours ?date=.
+    """
+    print("Opening LibCal grid from the site cache...")
+    driver.get(url)
+    wait_for_page_ready(driver)
+    short_wait = WebDriverWait(driver, OPTIONAL_WAIT, poll_frequency=0.1)
+    try:
+        short_wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "button.fc-goToDate-button")))
+    except TimeoutException:
+        invalidate_site(args.libcal_url, "no grid at the cached URL")
+        return False
+    if target_date and url != load_site(args.libcal_url).get("grid_url"):
         try:
-            wait.until(EC.presence_of_element_located((By.ID, "userNameInput")))
-            driver.find_element(By.ID, "userNameInput").send_keys(username)
-            driver.find_element(By.ID, "passwordInput").send_keys(password)
-            driver.find_element(By.ID, "submitButton").click()
-            print("Logged in.")
+            short_wait.until(lambda d: grid_shows_date(d, target_date))
+            save_site(args.libcal_url, date_param=True)
         except TimeoutException:
-            print("Login page did not appear (already logged in?). Proceeding...")
-            # If we are already logged in, we might be on the next page already.
+            # The date picker still works; just stop trying the parameter
+            save_site(args.libcal_url, date_param=False)
+            print("LibCal ignored the date in the URL; using the date picker.")
+    return True
 
-        # 9. Continue Booking & Submit
-        print("Finalizing booking...")
-        time.sleep(3)
-        
-        try:
-            continue_btn = wait.until(EC.element_to_be_clickable((By.XPATH, "//button[contains(text(), 'Continue')]")))
-            continue_btn.click()
-            time.sleep(2)
-        except:
-            pass
-            
-        if args.dry_run:
-            print("[DRY RUN] Skipping final 'Submit My Booking' click.")
-            print("[DRY RUN] Process would have completed successfully here.")
-            return
+def open_libcal(driver, wait, args, target_date=None):
+    """
+    Loads the study rooms page, clears the cookie banner and follows "Book a Study Room" to LibCal.
+    With the grid URL in the site cache, opens it (for target_date, if given) directly instead.
+    """
+    site = {} if args.refresh_site else load_site(args.libcal_url)
+    url = start_url(site, target_date)
+    if url and open_cached_grid(driver, args, url, target_date):
+        return
+
+    print("Navigating to library website...")
+    driver.get(args.library_url)
 
+    # A persistent profile has usually accepted cookies already, so don't wait for a banner that won't come
+    cookie_wait = 0 if args.profile_dir else OPTIONAL_WAIT
+
+    # Handle Cookie Consent
+    cookie_xpath = "//button[contains(text(), 'Ok. Got it.')]"
+    try:
+        if cookie_wait:
+            cookie_btn = WebDriverWait(driver, cookie_wait, poll_frequency=0.1).until(
+                EC.presence_of_element_located((By.XPATH, cookie_xpath)))
+        else:
+            cookie_btn = next(iter(driver.find_elements(By.XPATH, cookie_xpath)), None)
+        if cookie_btn:
+            driver.execute_script("arguments[0].click();", cookie_btn)
+            WebDriverWait(driver, OPTIONAL_WAIT, poll_frequency=0.1).until(EC.invisibility_of_element(cookie_btn))
+    except TimeoutException:
+        pass
+
+    # Click "Book a Study Room"
+    libcal = urlparse(args.libcal_url)
+    book_selector = f"a[href*='{libcal.netloc}{libcal.path.rstrip('/')}'] button"
+    wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, book_selector)))
+    handles_before = len(driver.window_handles)
+    click_element(driver, book_selector)
+
+    # Switch to new tab
+    try:
+        wait.until(EC.number_of_windows_to_be(handles_before + 1))
+    except TimeoutException:
+        pass
+    if len(driver.window_handles) > 1:
+        driver.switch_to.window(driver.window_handles[-1])
+        if args.lean:
+            # Request blocking is per tab; cover LibCal's requests from here on too
+            enable_request_blocking(driver)
+    wait_for_page_ready(driver)
+    save_site(args.libcal_url, grid_url=driver.current_url)
+
+def go_to_date(driver, wait, target_date, today=None):
+    """Uses the FullCalendar "Go To Date" picker to show the grid for target_date."""
+    if grid_shows_date(driver, target_date):
+        # Opened for this date already (see open_libcal)
+        return
+    today = today or datetime.date.today()
+    target_day_str = str(target_date.day)
+
+    # Click "Go To Date"
+    go_to_date_btn = wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, "button.fc-goToDate-button")))
+    go_to_date_btn.click()
+    wait.until(EC.visibility_of_element_located((By.CSS_SELECTOR, "td.day")))
+
+    if target_date.month != today.month:
+         try:
+             first_day = driver.find_element(By.CSS_SELECTOR, "td.day")
+             next_month_btn = driver.find_element(By.CSS_SELECTOR, "button.fc-next-button")
+             next_month_btn.click()
+             # The datepicker re-renders its day cells when the month changes
+             wait.until(EC.staleness_of(first_day))
+         except (NoSuchElementException, TimeoutException):
+             pass
+
+    # Click the day
+    driver.execute_script(f"""
+    document.querySelectorAll('td').forEach(el => {{
+        if (el.innerText.trim() === '{target_day_str}' && !el.classList.contains('old') && !el.classList.contains('new')) {{
+            el.click();
+        }}
+    }});
+    """)
+    wait_for_page_ready(driver)
+
+def choose_slot(index, args, time_str, verbose=True):
+    """Picks the best available slot at time_str from a SlotIndex using --room/--fallback/--full-duration."""
+    preferences = parse_room_list(args.room)
+    if verbose:
+        print(f"Looking for preferred Room(s) {', '.join(preferences)} at {time_str} ({len(index)} slots on grid)")
+    slot = index.choose(preferences, time_str, args.duration, args.fallback, args.full_duration)
+    if slot or verbose:
+        telemetry.emit("slot_choice", time=time_str, preferences=preferences, fallback_rule=args.fallback,
+                       room=slot.room if slot else None, fallback_used=bool(slot) and slot.room not in preferences,
+                       grid_slots=len(index))
+    if not verbose:
+        return slot
+    if slot is None:
+        print(f"No suitable rooms available at {time_str}.")
+    elif slot.room in preferences:
+        print(f"Found preferred Room {slot.room}!")
+    else:
+        print(f"Preferred Room(s) unavailable. Found alternative slot: Room {slot.room}")
+    return slot
+
+def select_end_time(driver, wait, end_time_str):
+    """Picks end_time_str in whichever visible dropdown offers it. Returns True on success."""
+    print(f"Selecting end time {end_time_str} from dropdown...")
+    try:
+        # The end-time dropdown is populated after the slot click. Each poll looks for and selects
+        # the option in one in-page script instead of walking every <select> and <option>.
+        selected = wait.until(lambda d: select_option_containing(d, end_time_str))
+        print(f"Success: Selected '{selected}'")
+        return True
+    except TimeoutException:
+        print(f"WARNING: Could not find a dropdown option containing '{end_time_str}'.")
+    except Exception as e:
+        print(f"Error selecting end time: {e}")
+    return False
+
+def submit_times_and_login(driver, wait, username, password):
+    """Clicks "Submit Times" and completes the SSO form if LibCal redirects to it."""
+    # 7. Submit Times
+    print("Waiting for selection to register...")
+    wait_for_page_ready(driver)
+    submit_btn = wait.until(EC.element_to_be_clickable((By.ID, "submit_times")))
+    driver.execute_script("arguments[0].click();", submit_btn)
+
+    # 8. SSO Login
+    print("Waiting for SSO Login...")
+    try:
+        wait.until(EC.staleness_of(submit_btn))
+        # A live SSO session (e.g. from a persistent profile) skips straight to the booking form
+        wait.until(EC.any_of(
+            EC.presence_of_element_located((By.ID, "userNameInput")),
+            EC.presence_of_element_located((By.ID, "btn-form-submit")),
+            EC.presence_of_element_located((By.XPATH, "//button[contains(text(), 'Continue')]")),
+        ))
+    except TimeoutException:
+        pass
+
+    if driver.find_elements(By.ID, "userNameInput"):
+        driver.find_element(By.ID, "userNameInput").send_keys(username)
+        driver.find_element(By.ID, "passwordInput").send_keys(password)
+        driver.find_element(By.ID, "submitButton").click()
+        print("Logged in.")
+    else:
+        print("Login page did not appear (already logged in?). Proceeding...")
+        # If we are already logged in, we might be on the next page already.
+
+def finalize_booking(driver, wait, dry_run, before_submit=None):
+    """
+    Clicks "Continue" and "Submit My Booking". Returns True if the booking went through (or would have).
+    If given, before_submit() is called right before the final click; returning False aborts the booking.
+    """
+    print("Finalizing booking...")
+    wait_for_page_ready(driver)
+
+    try:
+        # Most forms have no "Continue" step, so don't spend the full wait looking for one
+        short_wait = WebDriverWait(driver, OPTIONAL_WAIT, poll_frequency=0.1)
+        continue_btn = short_wait.until(EC.element_to_be_clickable((By.XPATH, "//button[contains(text(), 'Continue')]")))
+        continue_btn.click()
+        wait_for_page_ready(driver)
+    except TimeoutException:
+        pass
+
+    if before_submit and not before_submit():
+        print("Skipping final 'Submit My Booking' click.")
+        return False
+
+    if dry_run:
+        print("[DRY RUN] Skipping final 'Submit My Booking' click.")
+        print("[DRY RUN] Process would have completed successfully here.")
+        return True
+
+    try:
+        final_submit_btn = wait.until(EC.element_to_be_clickable((By.ID, "btn-form-submit")))
+        final_submit_btn.click()
+        print("Clicked 'Submit My Booking'.")
+    except TimeoutException:
         try:
-            final_submit_btn = wait.until(EC.element_to_be_clickable((By.ID, "btn-form-submit")))
+            final_submit_btn = driver.find_element(By.XPATH, "//button[contains(text(), 'Submit My Booking')]")
             final_submit_btn.click()
             print("Clicked 'Submit My Booking'.")
-        except TimeoutException:
-            try:
-                final_submit_btn = driver.find_element(By.XPATH, "//button[contains(text(), 'Submit My Booking')]")
-                final_submit_btn.click()
-                print("Clicked 'Submit My Booking'.")
-            except:
-                print("Could not find 'Submit My Booking' button.")
-                return
-
-        time.sleep(5)
-        print("Booking process completed.")
-            
+        except NoSuchElementException:
+            print("Could not find 'Submit My Booking' button.")
+            return False
+
+    # Wait for the form to be replaced by the confirmation page
+    try:
+        wait.until(EC.staleness_of(final_submit_btn))
+    except TimeoutException:
+        pass
+    wait_for_page_ready(driver)
+    print("Booking process completed.")
+    return True
+
+def report_timings(timer, args):
+    print("\n--- Stage Timings ---")
+    print(timer.summary_table())
+    if args.timings_json:
+        timer.write_json(args.timings_json)
+        print(f"Wrote timings to {args.timings_json}")
+
+def book_slot(driver, wait, args, target_date, username, password, timer, before_submit=None, between_stages=None):
+    """
+    Steps 4-9 for one booking, starting from the LibCal grid. Each step is retried within its budget
+    in this same session (see checkpoint.py). Returns the booked room number, or None if nothing was booked.
+    """
+    from checkpoint import BookingState, run_stages
+    state = BookingState(args, target_date, driver.current_url, username, password, before_submit)
+    return run_stages(driver, wait, state, timer, max_attempts=args.stage_attempts, between_stages=between_stages)
+
+def book_room(args):
+    print("--- Carleton Library Room Booker ---")
+    print(f"Configuration: Room={args.room}, Time={args.hour}:{args.minute:02d} {args.ampm}, Duration={args.duration} mins")
+
+    if args.record:
+        # The bundle must hold the whole path from the library page, so don't start from the site cache
+        args.dry_run = True
+        args.refresh_site = True
+    if args.dry_run:
+        print("BS: *** DRY RUN MODE ENABLED - NO BOOKING WILL BE MAKING ***")
+
+    # 1. Credentials
+    username, password = get_credentials()
+
+    # 2. Setup Browser
+    timer = StageTimer()
+    memory = MemorySampler(budget_mb=args.memory_budget).start()
+    with timer.stage("startup"):
+        driver = create_driver(args)
+    memory.watch_driver(driver)
+    timer.track_commands(driver.command_counter)
+    wait = WebDriverWait(driver, 10, poll_frequency=0.1)
+    recorder = None
+    if args.record:
+        from replay import SessionRecorder
+        recorder = SessionRecorder(args, username, password)
+        recorder.attach(driver, timer)
+
+    try:
+        # logic: book for 7 days ahead
+        target_date = datetime.date.today() + datetime.timedelta(days=DAYS_AHEAD)
+
+        # 3. Navigate to Study Rooms page
+        with timer.stage("navigate"):
+            open_libcal(driver, wait, args, target_date)
+        memory.adapt(driver)
+        return book_slot(driver, wait, args, target_date, username, password, timer,
+                         between_stages=lambda: memory.adapt(driver))
+
     except Exception as e:
         print(f"An error occurred: {e}")
+        telemetry.emit("error", error=type(e).__name__, message=str(e), url=driver.current_url)
         # Take screenshot if headless
-        if is_ci or args.headless:
+        if is_headless_run(args):
              driver.save_screenshot("error_screenshot.png")
              print("Saved error_screenshot.png")
-        
+
     finally:
+        memory.stop()
+        print(memory.summary())
+        telemetry.emit("memory", **memory.to_dict()["peak"], budget_mb=args.memory_budget, over_budget=memory.over_budget)
+        timer.meta["memory"] = memory.to_dict()
+        report_timings(timer, args)
+        if recorder:
+            recorder.save(args.record, timer)
         print("Done.")
         driver.quit()
 
 if __name__ == "__main__":
     args = parse_arguments()
-    book_room(args)
+    if args.engine == "http":
+        from libcal_http import http_book_room as entry_point
+        mode = "http"
+    elif args.backend == "cdp" and not (args.watch or args.batch or args.job or args.armed):
+        from async_booking import run_async as entry_point
+        mode = "cdp"
+    elif args.parallel:
+        from parallel import run_parallel as entry_point
+        mode = "parallel"
+    elif args.watch:
+        from watcher import watch as entry_point
+        mode = "watch"
+    elif args.batch or args.job:
+        from batch import run_batch as entry_point
+        mode = "batch"
+    elif args.armed:
+        from armed import armed_book as entry_point
+        mode = "armed"
+    else:
+        from pool import pool_available, submit_to_pool
+        if not args.no_pool and not args.record and pool_available(args.pool_url):
+            entry_point, mode = submit_to_pool, "pool"
+        else:
+            entry_point, mode = book_room, "single"
+
+    if not args.no_history:
+        telemetry.start_run(mode, args)
+    result = None
+    try:
+        result = entry_point(args)
+    finally:
+        telemetry.end_run(result)
@@ -0,0 +1,175 @@
+"""
+Chrome tuning profiles, and a tool to compare them on the real pages:
+
+    python browser_profiles.py --runs 3
+"""
+import time
+import json
+import argparse
+from selenium import webdriver
+from selenium.webdriver.chrome.service import Service
+
+# Requests the booking flow never needs: images, media, fonts and third-party trackers.
+# Stylesheets stay, since the waits rely on elements being visible.
+BLOCKED_URL_PATTERNS = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.avif", "*.svg", "*.ico",
+    "*.mp4", "*.webm", "*.mp3", "*.ogg",
+    "*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot",
+    "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*", "*facebook.net*",
+    "*hotjar.com*", "*siteimproveanalytics.com*", "*newrelic.com*", "*nr-data.net*", "*fonts.googleapis.com*",
+]
+
+LEAN_CHROME_ARGS = [
+    "--disable-extensions",
+    "--disable-background-networking",
+    "--disable-component-update",
+    "--disable-default-apps",
+    "--disable-sync",
+    "--disable-translate",
+    "--disable-features=Translate,OptimizationHints,MediaRouter,AutofillServerCommunication",
+    "--blink-settings=imagesEnabled=false",
+    "--mute-audio",
+    "--no-first-run",
+]
+
+# For small CI runners: one renderer, no GPU process, small caches and a capped V8 heap
+LOW_MEMORY_CHROME_ARGS = [
+    "--renderer-process-limit=1",
+    "--disable-features=site-per-process,IsolateOrigins,BackForwardCache",
+    "--disable-site-isolation-trials",
+    "--disable-gpu",
+    "--disable-software-rasterizer",
+    "--disable-extensions",
+    "--disable-background-networking",
+    "--disable-background-timer-throttling",
+    "--disable-component-update",
+    "--disk-cache-size=8388608",
+    "--media-cache-size=1048576",
+    "--js-flags=--max-old-space-size=128",
+    "--no-first-run",
+]
+
+def merge_chrome_args(args):
+    """
+    Chrome only keeps the last --disable-features it is given, so the lean and low-memory lists would drop
+    each other's. Joins them into one switch at the end and drops repeated arguments.
+    """
+    merged, features = [], []
+    for arg in args:
+        if arg.startswith("--disable-features="):
+            features += [f for f in arg.split("=", 1)[1].split(",") if f and f not in features]
+        elif arg not in merged:
+            merged.append(arg)
+    if features:
+        merged.append("--disable-features=" + ",".join(features))
+    return merged
+
+def apply_lean_options(options):
+    """Eager page loads (return at DOMContentLoaded) and no unneeded Chrome features."""
+    options.page_load_strategy = "eager"
+    for arg in LEAN_CHROME_ARGS:
+        options.add_argument(arg)
+    options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})
+    return options
+
+def apply_low_memory_options(options):
+    """Fewer and smaller Chrome processes, at some cost in isolation and speed."""
+    for arg in LOW_MEMORY_CHROME_ARGS:
+        options.add_argument(arg)
+    return options
+
+def trim_browser_memory(driver):
+    """Closes every tab but the current one, then asks V8 to collect garbage and drops the HTTP cache."""
+    current = driver.current_window_handle
+    for handle in driver.window_handles:
+        if handle != current:
+            driver.switch_to.window(handle)
+            driver.close()
+    driver.switch_to.window(current)
+    driver.execute_cdp_cmd("HeapProfiler.collectGarbage", {})
+    driver.execute_cdp_cmd("Network.clearBrowserCache", {})
+
+def enable_request_blocking(driver):
+    """
+    Blocks BLOCKED_URL_PATTERNS at the network layer through the DevTools protocol. This only covers the
+    current tab, so call it again after switching to a new one.
+    """
+    driver.execute_cdp_cmd("Network.enable", {})
+    driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_URL_PATTERNS})
+
+def measure_page_load(driver, url):
+    """
+    Loads `url` and returns bytes on the wire (from the performance log) and page-ready times.
+    The driver must have been started with the "performance" logging preference.
+    """
+    driver.get_log("performance")  # drop anything left over from earlier pages
+    start = time.perf_counter()
+    driver.get(url)
+    get_returned = time.perf_counter() - start
+
+    bytes_in, requests, blocked = 0, 0, 0
+    for entry in driver.get_log("performance"):
+        message = json.loads(entry["message"])["message"]
+        if message["method"] == "Network.loadingFinished":
+            bytes_in += message["params"].get("encodedDataLength", 0)
+            requests += 1
+        elif message["method"] == "Network.loadingFailed" and message["params"].get("blockedReason"):
+            blocked += 1
+
+    nav = driver.execute_script(
+        "var n = performance.getEntriesByType('navigation')[0];"
+        "return n ? {dom: n.domContentLoadedEventEnd, load: n.loadEventEnd} : {};"
+    ) or {}
+    return {
+        "bytes": bytes_in,
+        "requests": requests,
+        "blocked": blocked,
+        "get_returned_s": round(get_returned, 3),
+        "dom_ready_s": round((nav.get("dom") or 0) / 1000.0, 3),
+        "load_s": round((nav.get("load") or 0) / 1000.0, 3),
+    }
+
+def start_measured_driver(driver_path, lean):
+    options = webdriver.ChromeOptions()
+    options.add_argument("--headless")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument("--window-size=1920,1080")
+    options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+    if lean:
+        apply_lean_options(options)
+    driver = webdriver.Chrome(service=Service(driver_path), options=options)
+    driver.execute_cdp_cmd("Network.enable", {})
+    # Both profiles start with an empty cache, so bytes are comparable
+    driver.execute_cdp_cmd("Network.setCacheDisabled", {"cacheDisabled": True})
+    if lean:
+        enable_request_blocking(driver)
+    return driver
+
+def compare_profiles(urls, runs=3):
+    """Loads each URL `runs` times with the standard and lean profiles and returns median figures."""
+    from driver_cache import resolve_driver_path
+    driver_path = resolve_driver_path()[0]
+    results = {}
+    for name, lean in (("standard", False), ("lean", True)):
+        driver = start_measured_driver(driver_path, lean)
+        try:
+            for url in urls:
+                samples = [measure_page_load(driver, url) for _ in range(runs)]
+                results[(name, url)] = {key: sorted(s[key] for s in samples)[len(samples) // 2] for key in samples[0]}
+        finally:
+            driver.quit()
+    return results
+
+if __name__ == "__main__":
+    from book_room import LIBRARY_URL, LIBCAL_URL
+    parser = argparse.ArgumentParser(description="Compare bytes and page-ready time of the standard and lean Chrome profiles")
+    parser.add_argument("urls", nargs="*", default=[LIBRARY_URL, LIBCAL_URL])
+    parser.add_argument("--runs", default=3, type=int)
+    args = parser.parse_args()
+
+    results = compare_profiles(args.urls, args.runs)
+    print(f"{'Profile':<9}  {'KB':>8}  {'Reqs':>5}  {'Blocked':>7}  {'get() s':>7}  {'DOM s':>6}  {'Load s':>6}  URL")
+    for (name, url), r in results.items():
+        print(f"{name:<9}  {r['bytes'] / 1024:>8.1f}  {r['requests']:>5}  {r['blocked']:>7}  "
+              f"{r['get_returned_s']:>7.3f}  {r['dom_ready_s']:>6.3f}  {r['load_s']:>6.3f}  {url}")
@@ -0,0 +1,184 @@
+"""
+Asyncio Chrome DevTools Protocol backend for async_booking.py: launches Chrome itself and drives
+its pages over one WebSocket, each page in an isolated browser context (own cookies, cart and SSO).
+Needs the `websockets` package.
+"""
+import os
+import re
+import json
+import shutil
+import asyncio
+import contextlib
+import tempfile
+import itertools
+from async_booking import Page
+from book_room import is_headless_run
+from browser_profiles import LEAN_CHROME_ARGS, LOW_MEMORY_CHROME_ARGS, BLOCKED_URL_PATTERNS, merge_chrome_args
+from driver_cache import CHROME_BINARIES
+
+DEVTOOLS_RE = re.compile(r"DevTools listening on (ws://\S+)")
+LAUNCH_TIMEOUT = 20
+
+class CdpError(Exception):
+    pass
+
+def find_chrome():
+    """Path of the Chrome binary: CHROME_BINARY, else the first of driver_cache.CHROME_BINARIES that exists."""
+    override = os.environ.get("CHROME_BINARY")
+    if override:
+        return override
+    for binary in CHROME_BINARIES:
+        path = shutil.which(binary) or (binary if os.path.isabs(binary) and os.path.exists(binary) else None)
+        if path:
+            return path
+    raise CdpError("Chrome not found; set CHROME_BINARY to its path.")
+
+class CdpConnection:
+    """One WebSocket to the browser. Commands for a page carry its sessionId (flattened sessions)."""
+
+    def __init__(self, ws):
+        self.ws = ws
+        self._ids = itertools.count(1)
+        self._pending = {}
+        self._reader = asyncio.ensure_future(self._read())
+
+    @classmethod
+    async def connect(cls, url):
+        import websockets
+        return cls(await websockets.connect(url, max_size=None, ping_interval=None))
+
+    async def send(self, method, params=None, session_id=None):
+        message_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[message_id] = future
+        message = {"id": message_id, "method": method, "params": params or {}}
+        if session_id:
+            message["sessionId"] = session_id
+        await self.ws.send(json.dumps(message))
+        return await future
+
+    async def _read(self):
+        try:
+            async for raw in self.ws:
+                message = json.loads(raw)
+                future = self._pending.pop(message.get("id"), None)
+                if future is None or future.done():
+                    continue  # an event; the flow polls instead of subscribing
+                if "error" in message:
+                    future.set_exception(CdpError(f"{message['error'].get('message')} ({message['error'].get('code')})"))
+                else:
+                    future.set_result(message.get("result", {}))
+        except Exception:
+            pass
+        finally:
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(CdpError("Browser connection closed."))
+            self._pending.clear()
+
+    async def close(self):
+        await self.ws.close()
+        await self._reader
+
+class CdpPage(Page):
+    def __init__(self, conn, session_id, target_id, context_id):
+        self.conn = conn
+        self.session_id = session_id
+        self.target_id = target_id
+        self.context_id = context_id
+
+    async def send(self, method, params=None):
+        return await self.conn.send(method, params, self.session_id)
+
+    async def goto(self, url):
+        result = await self.send("Page.navigate", {"url": url})
+        if result.get("errorText"):
+            raise CdpError(f"Navigation to {url} failed: {result['errorText']}")
+        await self.wait_ready()
+
+    async def execute(self, script, *args):
+        expression = f"(function() {{ {script} }}).apply(null, {json.dumps(list(args))})"
+        result = await self.send("Runtime.evaluate", {"expression": expression, "returnByValue": True,
+                                                      "awaitPromise": True, "userGesture": True})
+        if "exceptionDetails" in result:
+            details = result["exceptionDetails"]
+            raise CdpError(details.get("exception", {}).get("description") or details.get("text"))
+        return result["result"].get("value")
+
+    async def close(self):
+        await self.conn.send("Target.closeTarget", {"targetId": self.target_id})
+        if self.context_id:
+            await self.conn.send("Target.disposeBrowserContext", {"browserContextId": self.context_id})
+
+class CdpBrowser:
+    """A Chrome started with --remote-debugging-port=0 and a throwaway profile."""
+
+    def __init__(self, args, process, conn, user_data_dir):
+        self.args = args
+        self.process = process
+        self.conn = conn
+        self.user_data_dir = user_data_dir
+
+    @classmethod
+    async def launch(cls, args):
+        user_data_dir = tempfile.mkdtemp(prefix="librarybot-cdp-")
+        command = [find_chrome(), "--remote-debugging-port=0", f"--user-data-dir={user_data_dir}",
+                   "--no-first-run", "--no-default-browser-check", "--window-size=1920,1080"]
+        if is_headless_run(args):
+            command += ["--headless=new", "--no-sandbox", "--disable-dev-shm-usage"]
+        if args.lean:
+            command += LEAN_CHROME_ARGS
+        if args.low_memory or args.memory_budget:
+            command += LOW_MEMORY_CHROME_ARGS
+        process = await asyncio.create_subprocess_exec(*merge_chrome_args(command), "about:blank", stdout=asyncio.subprocess.DEVNULL,
+                                                       stderr=asyncio.subprocess.PIPE)
+        conn = None
+        try:
+            try:
+                url = await asyncio.wait_for(cls._devtools_url(process), LAUNCH_TIMEOUT)
+            except asyncio.TimeoutError:
+                raise CdpError(f"Chrome did not open a DevTools port within {LAUNCH_TIMEOUT}s.") from None
+            conn = await CdpConnection.connect(url)
+        finally:
+            if conn is None:
+                # Chrome may already have exited (e.g. a missing shared library); only kill it if it hasn't
+                if process.returncode is None:
+                    with contextlib.suppress(ProcessLookupError):
+                        process.kill()
+                shutil.rmtree(user_data_dir, ignore_errors=True)
+        # Keep draining Chrome's log so it never blocks on a full pipe
+        asyncio.ensure_future(process.stderr.read())
+        return cls(args, process, conn, user_data_dir)
+
+    @staticmethod
+    async def _devtools_url(process):
+        while True:
+            line = await process.stderr.readline()
+            if not line:
+                raise CdpError("Chrome exited during startup.")
+            match = DEVTOOLS_RE.search(line.decode(errors="replace"))
+            if match:
+                return match.group(1)
+
+    async def new_page(self):
+        """A tab in a fresh browser context, so pages don't share cookies or a LibCal cart."""
+        context_id = (await self.conn.send("Target.createBrowserContext", {"disposeOnDetach": True}))["browserContextId"]
+        target_id = (await self.conn.send("Target.createTarget", {"url": "about:blank", "browserContextId": context_id}))["targetId"]
+        session_id = (await self.conn.send("Target.attachToTarget", {"targetId": target_id, "flatten": True}))["sessionId"]
+        page = CdpPage(self.conn, session_id, target_id, context_id)
+        if self.args.lean:
+            await page.send("Network.enable")
+            await page.send("Network.setBlockedURLs", {"urls": BLOCKED_URL_PATTERNS})
+        return page
+
+    async def close(self):
+        try:
+            await asyncio.wait_for(self.conn.send("Browser.close"), 5)
+        except (CdpError, asyncio.TimeoutError):
+            pass
+        await self.conn.close()
+        try:
+            await asyncio.wait_for(self.process.wait(), 5)
+        except asyncio.TimeoutError:
+            self.process.kill()
+        shutil.rmtree(self.user_data_dir, ignore_errors=True)
@@ -0,0 +1,383 @@
+"""
+Booking as explicit stages with recorded state. A stage that fails is retried in the same browser
+within its own budget, picking up from what the page currently shows, so a transient timeout doesn't
+throw away the SSO session or the slot already in the cart.
+"""
+import json
+import time
+import datetime
+from urllib.parse import urlsplit
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import (
+    TimeoutException, StaleElementReferenceException, ElementClickInterceptedException,
+    ElementNotInteractableException, NoSuchElementException, JavascriptException, WebDriverException,
+)
+from book_room import (
+    go_to_date, choose_slot, select_end_time, submit_times_and_login, finalize_booking,
+    wait_for_page_ready, to_24h, format_slot_time,
+)
+from slot_index import take_snapshot, click_slot_by_title
+from site_cache import load_site, save_site
+from libcal_http import CART_PATH, REMOVE_PATH
+import telemetry
+
+STAGES = ["date_select", "slot_select", "end_time", "sso", "finalize"]
+
+# (attempts, seconds) per stage; a stage stops retrying at whichever runs out first
+STAGE_BUDGETS = {
+    "date_select": (3, 30),
+    "slot_select": (3, 30),
+    "end_time": (3, 20),
+    "sso": (3, 60),
+    "finalize": (2, 40),
+}
+
+# Stages the booking can go on without: LibCal keeps its default end time
+OPTIONAL_STAGES = {"end_time"}
+
+# Failures worth another attempt in the same session. A dead browser (InvalidSessionIdException,
+# NoSuchWindowException) is not one of them.
+RETRYABLE = (
+    TimeoutException, StaleElementReferenceException, ElementClickInterceptedException,
+    ElementNotInteractableException, NoSuchElementException, JavascriptException, WebDriverException,
+)
+
+# Where the current page is in the flow, in one round trip
+PAGE_STATE_JS = """
+if (document.getElementById('userNameInput')) { return 'login'; }
+if (document.getElementById('btn-form-submit')) { return 'form'; }
+if (document.querySelector('a[title]') && document.getElementById('submit_times')) { return 'grid'; }
+return 'other';
+"""
+
+# True once any dropdown lists times, i.e. LibCal has rendered the end-time choices
+END_TIMES_SHOWN_JS = "return Array.from(document.querySelectorAll('select option')).some(o => /\\d:\\d\\d\\s*[ap]m/i.test(o.text));"
+
+# Records the IDs LibCal gives cart entries, from the responses to the page's own cart requests (fetch or
+# jQuery's XHR), so the run knows exactly which entries are its own. Lasts until the page navigates.
+WATCH_CART_JS = """
+var path = arguments[0];
+if (!window.__cartIds) {
+  window.__cartIds = [];
+  var record = function (url, text) {
+    if (String(url).indexOf(path) === -1) { return; }
+    try {
+      (JSON.parse(text).bookings || []).forEach(function (b) {
+        if (b.id && window.__cartIds.indexOf(b.id) === -1) { window.__cartIds.push(b.id); }
+      });
+    } catch (e) {}
+  };
+  var originalFetch = window.fetch;
+  window.fetch = function (input) {
+    return originalFetch.apply(this, arguments).then(function (resp) {
+      resp.clone().text().then(function (text) { record(typeof input === 'string' ? input : input.url, text); });
+      return resp;
+    });
+  };
+  var originalOpen = XMLHttpRequest.prototype.open;
+  XMLHttpRequest.prototype.open = function (method, url) {
+    this.addEventListener('load', function () { record(url, this.responseText); });
+    return originalOpen.apply(this, arguments);
+  };
+}
+return true;
+"""
+
+CART_IDS_JS = "return window.__cartIds || [];"
+
+# The cart entry IDs the booking form is about to submit (JSON), or null if the form doesn't list them
+FORM_BOOKINGS_JS = "var i = document.querySelector(\"input[name='bookings']\"); return i ? i.value : null;"
+
+# Posts a remove for each ID in arguments[1] to arguments[0] from the page, with its LibCal session cookie
+REMOVE_FROM_CART_JS = """
+var done = arguments[arguments.length - 1], path = arguments[0], ids = arguments[1];
+Promise.all(ids.map(function (id) {
+  return fetch(path, {method: 'POST', credentials: 'same-origin',
+                      headers: {'Content-Type': 'application/x-www-form-urlencoded', 'X-Requested-With': 'XMLHttpRequest'},
+                      body: new URLSearchParams({'remove[id]': id})})
+    .then(function (r) { return r.ok; }, function () { return false; });
+})).then(function (oks) { done(oks.every(Boolean)); });
+"""
+
+class StageFailed(Exception):
+    """A stage didn't get where it should have; worth another attempt."""
+
+class BookingAborted(Exception):
+    """A definite outcome that retrying won't change, such as no room being free."""
+
+class OutcomeUnknown(BookingAborted):
+    """The final submit may have gone through. Retrying, or handing the submit to another worker, could book twice."""
+
+class BookingState:
+    """What the run has achieved so far: the last good stage and the facts later stages build on."""
+
+    def __init__(self, args, target_date, grid_url, username, password, before_submit=None):
+        self.args = args
+        self.username = username
+        self.password = password
+        self.before_submit = before_submit
+        self.target_date = target_date
+        self.grid_url = grid_url
+        self.start_time = datetime.datetime.combine(target_date, datetime.time(to_24h(args.hour, args.ampm), args.minute))
+        self.time_str = format_slot_time(self.start_time)
+        self.end_time_str = format_slot_time(self.start_time + datetime.timedelta(minutes=args.duration))
+        site = load_site(args.libcal_url)
+        if site.get("slot_minutes") and args.minute % site["slot_minutes"]:
+            print(f"WARNING: {self.time_str} is not on LibCal's {site['slot_minutes']}-minute grid.")
+        self.slot = None
+        self.completed = []
+        self.declined = False
+        self.resumed = False
+        self.cart_ids = []     # cart entries this run added (see WATCH_CART_JS)
+        self.cart_clean = True
+        # "booked", "dry-run", "unknown" (the final submit may have gone through), "declined", "aborted" or "failed"
+        self.outcome = None
+
+    @property
+    def last_good(self):
+        return self.completed[-1] if self.completed else None
+
+    def mark(self, stage):
+        self.completed.append(stage)
+        telemetry.emit("checkpoint", stage=stage, room=self.slot.room if self.slot else None)
+
+def page_state(driver):
+    return driver.execute_script(PAGE_STATE_JS)
+
+def pick_slot(driver, slot):
+    """Clicks the slot's grid cell, recording the cart entry LibCal creates for it. Returns False if it's gone."""
+    driver.execute_script(WATCH_CART_JS, CART_PATH)
+    return click_slot_by_title(driver, slot.ref)
+
+def note_cart(driver, state):
+    for cart_id in driver.execute_script(CART_IDS_JS) or []:
+        if cart_id not in state.cart_ids:
+            state.cart_ids.append(cart_id)
+
+def release_cart(driver, state):
+    """
+    Takes the entries this run put in LibCal's cart back out. The cart lives on the server, so an entry left
+    there after a dry run or a failure would be submitted with the next booking in the same session.
+    Returns True once none of them is left.
+    """
+    if not state.cart_ids:
+        return True
+    try:
+        # The request has to come from a LibCal page to carry its session cookie
+        if urlsplit(driver.current_url).netloc != urlsplit(state.grid_url).netloc:
+            driver.get(state.grid_url)
+        removed = driver.execute_async_script(REMOVE_FROM_CART_JS, REMOVE_PATH, state.cart_ids)
+    except WebDriverException as e:
+        print(f"WARNING: Could not take the slot back out of the cart: {e.msg}")
+        return False
+    if not removed:
+        print("WARNING: LibCal didn't confirm taking the slot back out of the cart.")
+        return False
+    print(f"Took {len(state.cart_ids)} entry(s) back out of the cart.")
+    state.cart_ids = []
+    return True
+
+def check_form_bookings(driver, state):
+    """
+    Refuses to submit a booking form that lists cart entries this run didn't add (left by an earlier job in
+    this session). They are taken out of the cart and the form reloaded; if that doesn't clear them, aborts.
+    """
+    for attempt in range(2):
+        try:
+            listed = json.loads(driver.execute_script(FORM_BOOKINGS_JS) or "null")
+        except ValueError:
+            listed = None
+        if not listed:
+            return
+        if not state.cart_ids:
+            # This run's own entry is unknown, so only a single one can be told apart from strays
+            if len(listed) == 1:
+                return
+            raise BookingAborted(f"The booking form lists {len(listed)} bookings and this run added one. Not submitting.")
+        strays = [i for i in listed if i not in state.cart_ids]
+        if not strays:
+            return
+        if attempt:
+            raise BookingAborted(f"The booking form still lists {len(strays)} booking(s) this run didn't add. Not submitting.")
+        print(f"The booking form lists {len(strays)} booking(s) this run didn't add. Taking them out of the cart...")
+        driver.execute_async_script(REMOVE_FROM_CART_JS, REMOVE_PATH, strays)
+        driver.refresh()
+        wait_for_page_ready(driver)
+
+def back_to_grid(driver, wait, state):
+    driver.get(state.grid_url)
+    wait_for_page_ready(driver)
+    go_to_date(driver, wait, state.target_date)
+
+# --- Stages. Each one checks the page first, so the same call serves as first attempt and retry. ---
+
+def stage_date_select(driver, wait, state, attempt):
+    print(f"Target Date: {state.target_date.strftime('%A, %B %d, %Y')}")
+    if attempt > 1:
+        driver.get(state.grid_url)
+        wait_for_page_ready(driver)
+    go_to_date(driver, wait, state.target_date)
+
+def stage_slot_select(driver, wait, state, attempt):
+    args = state.args
+    if attempt > 1 or state.resumed or page_state(driver) != "grid":
+        back_to_grid(driver, wait, state)
+    print(f"Selecting start time {args.hour}:{args.minute:02d} {args.ampm}...")
+    # Wait for the grid to render slots for the requested time before searching it
+    try:
+        wait.until(EC.presence_of_element_located((By.XPATH, f"//a[contains(@title, '{state.time_str}')]")))
+    except TimeoutException:
+        print(f"WARNING: No slots at {state.time_str} rendered on the grid.")
+
+    index = take_snapshot(driver)
+    if len(index):
+        save_site(args.libcal_url, slot_minutes=index.granularity())
+    state.slot = choose_slot(index, args, state.time_str)
+    if not state.slot:
+        raise BookingAborted("Failed to select a slot.")
+    if not pick_slot(driver, state.slot):
+        raise StageFailed(f"Slot {state.slot.ref} vanished before it could be clicked.")
+    print("Clicked start time slot.")
+
+def stage_end_time(driver, wait, state, attempt):
+    selected = select_end_time(driver, wait, state.end_time_str)
+    # By now LibCal has answered the cart request the slot click made
+    note_cart(driver, state)
+    if not selected:
+        if driver.execute_script(END_TIMES_SHOWN_JS):
+            # The dropdown is there but doesn't go that far; retrying won't change that
+            print("Keeping LibCal's default end time.")
+            return
+        raise StageFailed(f"End time {state.end_time_str} not selected.")
+
+def stage_sso(driver, wait, state, attempt):
+    current = page_state(driver)
+    if current == "form":
+        print("Already on the booking form.")
+        return
+    if current == "grid":
+        note_cart(driver, state)
+    if current == "grid" or attempt == 1:
+        submit_times_and_login(driver, wait, state.username, state.password)
+    elif current == "login":
+        # The login page is up but the first attempt didn't get through it
+        fill_login_form(driver, state.username, state.password)
+    # Done once the booking form is showing, straight away or after the SAML redirects
+    try:
+        wait.until(lambda d: page_state(d) == "form")
+    except TimeoutException:
+        raise StageFailed(f"Booking form not reached (page: {page_state(driver)}).")
+
+def fill_login_form(driver, username, password):
+    user = driver.find_element(By.ID, "userNameInput")
+    user.clear()
+    user.send_keys(username)
+    pw = driver.find_element(By.ID, "passwordInput")
+    pw.clear()
+    pw.send_keys(password)
+    driver.find_element(By.ID, "submitButton").click()
+    print("Logged in.")
+
+def stage_finalize(driver, wait, state, attempt):
+    if attempt > 1 and page_state(driver) != "form":
+        # The final click may already have gone through; clicking again could double-book
+        raise OutcomeUnknown("Booking form is gone after a failed finalize attempt, so the booking may have gone through. "
+                             "Check your email for a confirmation.")
+    check_form_bookings(driver, state)
+
+    def before_submit():
+        if state.before_submit and not state.before_submit():
+            state.declined = True
+            return False
+        return True
+
+    if not finalize_booking(driver, wait, state.args.dry_run, before_submit):
+        if state.declined:
+            raise BookingAborted("Final submit declined.")
+        raise StageFailed("'Submit My Booking' not clicked.")
+
+STAGE_FUNCTIONS = {
+    "date_select": stage_date_select,
+    "slot_select": stage_slot_select,
+    "end_time": stage_end_time,
+    "sso": stage_sso,
+    "finalize": stage_finalize,
+}
+
+def resume_point(driver, stage, state):
+    """Earlier stage to redo once `stage` is out of budget, or None to give up."""
+    if stage == "sso" and page_state(driver) == "grid":
+        # Submitting the times didn't get through. LibCal still holds the slot in its cart on the server, so
+        # take it out before picking again, or both would be submitted.
+        if release_cart(driver, state):
+            return "slot_select"
+    return None
+
+def run_stages(driver, wait, state, timer, start_at="date_select", max_attempts=None, max_rewinds=1, between_stages=None):
+    """
+    Runs STAGES from start_at, retrying each within its budget and going back to an earlier stage
+    at most max_rewinds times. between_stages(), if given, runs after each stage. Returns the booked room, or None.
+    """
+    i = STAGES.index(start_at)
+    rewinds = 0
+    while i < len(STAGES):
+        name = STAGES[i]
+        attempts, seconds = STAGE_BUDGETS[name]
+        if max_attempts:
+            attempts = max_attempts
+        started = time.monotonic()
+        attempt = 0
+        error = None
+        while attempt < attempts and (attempt == 0 or time.monotonic() - started < seconds):
+            attempt += 1
+            try:
+                with timer.stage(name):
+                    STAGE_FUNCTIONS[name](driver, wait, state, attempt)
+                error = None
+                break
+            except OutcomeUnknown as e:
+                print(e)
+                state.outcome = "unknown"
+                return None
+            except BookingAborted as e:
+                print(e)
+                state.outcome = "declined" if state.declined else "aborted"
+                return None
+            except (StageFailed,) + RETRYABLE as e:
+                error = e
+                message = getattr(e, "msg", None) or str(e) or type(e).__name__
+                print(f"Stage '{name}' attempt {attempt}/{attempts} failed: {message.strip()}")
+                telemetry.emit("stage_retry", stage=name, attempt=attempt, error=type(e).__name__, message=message.strip())
+
+        if error is None:
+            state.mark(name)
+            i += 1
+            if between_stages:
+                between_stages()
+        elif name in OPTIONAL_STAGES:
+            print(f"Continuing without '{name}'.")
+            i += 1
+        else:
+            back = resume_point(driver, name, state) if rewinds < max_rewinds else None
+            if back is None:
+                print(f"Stage '{name}' failed after {attempt} attempts; last good stage: {state.last_good or 'none'}.")
+                state.outcome = "failed"
+                return None
+            print(f"Resuming from '{back}'.")
+            rewinds += 1
+            state.resumed = True
+            i = STAGES.index(back)
+    state.outcome = "dry-run" if state.args.dry_run else "booked"
+    return state.slot.room if state.slot else None
+
+def book_in_session(driver, wait, state, timer, **kwargs):
+    """
+    run_stages, then takes the run's entries back out of the cart unless they were booked, so the next booking
+    in this browser session submits only its own. state.cart_clean says whether that worked.
+    """
+    try:
+        return run_stages(driver, wait, state, timer, **kwargs)
+    finally:
+        if state.outcome != "booked":
+            state.cart_clean = release_cart(driver, state)
@@ -0,0 +1,68 @@
+"""
+Page helpers that each cost a single WebDriver round trip, and a counter for WebDriver commands.
+"""
+from collections import Counter
+
+# Finds the first visible <select> with an option containing arguments[0] (case-insensitive),
+# selects it and fires the events LibCal listens for. Returns the option text, or null.
+SELECT_OPTION_JS = """
+var wanted = arguments[0].toLowerCase();
+var selects = document.querySelectorAll('select');
+for (var s = 0; s < selects.length; s++) {
+  var el = selects[s];
+  if (!(el.offsetWidth || el.offsetHeight || el.getClientRects().length)) { continue; }
+  for (var i = 0; i < el.options.length; i++) {
+    if (el.options[i].text.toLowerCase().indexOf(wanted) !== -1) {
+      el.scrollIntoView({block: 'center'});
+      el.selectedIndex = i;
+      el.dispatchEvent(new Event('input', {bubbles: true}));
+      el.dispatchEvent(new Event('change', {bubbles: true}));
+      return el.options[i].text;
+    }
+  }
+}
+return null;
+"""
+
+# Clicks the first element matching the CSS selector arguments[0] whose text contains arguments[1]
+# (any text if null). Returns true if something was clicked.
+CLICK_JS = """
+var els = document.querySelectorAll(arguments[0]);
+for (var i = 0; i < els.length; i++) {
+  if (arguments[1] === null || els[i].textContent.indexOf(arguments[1]) !== -1) {
+    els[i].scrollIntoView({block: 'center'});
+    els[i].click();
+    return true;
+  }
+}
+return false;
+"""
+
+def select_option_containing(driver, text):
+    """Selects the option containing `text` in the first visible dropdown offering it. Returns its text or None."""
+    return driver.execute_script(SELECT_OPTION_JS, text)
+
+def click_element(driver, css_selector, text=None):
+    """Scrolls to and clicks the first element matching css_selector (and containing text) in one call."""
+    return bool(driver.execute_script(CLICK_JS, css_selector, text))
+
+class CommandCounter:
+    """Counts every WebDriver command a driver sends, in total and per command name."""
+
+    def __init__(self):
+        self.total = 0
+        self.by_command = Counter()
+
+def count_commands(driver):
+    """Wraps driver.execute, the funnel every WebDriver command goes through, to count commands."""
+    counter = CommandCounter()
+    original = driver.execute
+
+    def execute(driver_command, params=None):
+        counter.total += 1
+        counter.by_command[driver_command] += 1
+        return original(driver_command, params)
+
+    driver.execute = execute
+    driver.command_counter = counter
+    return counter
@@ -0,0 +1,71 @@
+import os
+import re
+import json
+import time
+import subprocess
+from webdriver_manager.chrome import ChromeDriverManager
+
+CACHE_DIR = os.environ.get("LIBRARYBOT_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "librarybot"))
+DRIVER_CACHE_FILE = os.path.join(CACHE_DIR, "driver_cache.json")
+
+# Binaries to ask for a version, in order; the first one that answers wins
+CHROME_BINARIES = [
+    "google-chrome", "google-chrome-stable", "chromium", "chromium-browser", "chrome",
+    "/Applications/Google Chrome.app/Contents/MacOS/Google Chrome",
+]
+
+def detect_chrome_version():
+    """Returns the installed Chrome version (e.g. "131.0.6778.85"), or None if it can't be determined."""
+    override = os.environ.get("CHROME_VERSION")
+    if override:
+        return override
+    for binary in CHROME_BINARIES:
+        try:
+            out = subprocess.run([binary, "--version"], capture_output=True, text=True, timeout=5).stdout
+        except (OSError, subprocess.SubprocessError):
+            continue
+        match = re.search(r"(\d+\.\d+\.\d+\.\d+)", out)
+        if match:
+            return match.group(1)
+    if os.name == "nt":
+        try:
+            import winreg
+            with winreg.OpenKey(winreg.HKEY_CURRENT_USER, r"Software\Google\Chrome\BLBeacon") as key:
+                return winreg.QueryValueEx(key, "version")[0]
+        except OSError:
+            pass
+    return None
+
+def _load_cache():
+    try:
+        with open(DRIVER_CACHE_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_cache(cache):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with open(DRIVER_CACHE_FILE, "w", encoding="utf-8") as f:
+        json.dump(cache, f, indent=2)
+
+def resolve_driver_path(refresh=False):
+    """
+    Returns (driver_path, cache_hit, seconds_saved). A cached path is reused when it was resolved for the
+    same Chrome version and the file still exists; otherwise ChromeDriverManager resolves and it is cached.
+    """
+    version = detect_chrome_version()
+    key = version or "unknown"
+    cache = _load_cache()
+    entry = cache.get(key)
+
+    start = time.perf_counter()
+    # Without a known Chrome version there's nothing to key on, so always resolve
+    if not refresh and version and entry and os.path.exists(entry["driver_path"]):
+        elapsed = time.perf_counter() - start
+        return entry["driver_path"], True, max(entry.get("resolve_seconds", 0) - elapsed, 0)
+
+    path = ChromeDriverManager().install()
+    elapsed = time.perf_counter() - start
+    cache[key] = {"driver_path": path, "resolve_seconds": round(elapsed, 3), "resolved_at": time.time()}
+    _save_cache(cache)
+    return path, False, 0.0
@@ -8,7 +8,7 @@ class BookingGUI:
     def __init__(self, root):
         self.root = root
         self.root.title("Library Bot Config Editor")
-        self.root.geometry("500x600")
+        self.root.geometry("720x900")
         
         # Style
         style = ttk.Style()
@@ -29,6 +29,10 @@ class BookingGUI:
         sch_frame.pack(fill="x", padx=10, pady=5)
         
         ttk.Label(sch_frame, text="Run Time (EST):").grid(row=0, column=0, sticky="w")
+
+        # --- Live Availability Frame ---
+        avail_frame = ttk.LabelFrame(root, text="Live Availability (click a free slot to use it)", padding=10)
+        avail_frame.pack(fill="both", expand=True, padx=10, pady=5)
         
         # Initialize variables
         self.room_var = tk.StringVar(value="464")
@@ -71,6 +75,9 @@ class BookingGUI:
         ttk.Combobox(sch_frame, values=["AM", "PM"], textvariable=self.sch_ampm_var, width=4, state="readonly").grid(row=0, column=4, sticky="w", padx=2)
         ttk.Label(sch_frame, text="(Daily)").grid(row=0, column=5, sticky="w", padx=5)
 
+        # Availability UI
+        self.build_availability_panel(avail_frame)
+
 
         # --- Credentials Frame ---
         cred_frame = ttk.LabelFrame(root, text="GitHub Secrets (Credentials)", padding=10)
@@ -91,6 +98,136 @@ class BookingGUI:
         
         ttk.Label(btn_frame, text="After updating, remember to 'git commit' and 'git push'!", foreground="red").pack()
 
+    def build_availability_panel(self, frame):
+        """Room x time grid for a chosen date, fetched off the UI thread and refreshed in place."""
+        try:
+            import datetime
+            from availability import AvailabilityWorker, CACHE_TTL
+            from book_room import DAYS_AHEAD
+        except ImportError as e:
+            ttk.Label(frame, text=f"Live availability needs the packages in requirements.txt ({e}).", foreground="gray").pack(anchor="w")
+            self.avail_worker = None
+            return
+
+        self.avail_ttl = CACHE_TTL
+        self.avail_worker = AvailabilityWorker()
+        self.avail_worker.start()
+        self.avail_shown = None  # (date, SlotIndex) currently drawn
+        self.avail_times = []
+
+        top = ttk.Frame(frame)
+        top.pack(fill="x")
+        ttk.Label(top, text="Date:").pack(side="left")
+        today = datetime.date.today()
+        dates = [(today + datetime.timedelta(days=i)).isoformat() for i in range(DAYS_AHEAD + 1)]
+        self.avail_date_var = tk.StringVar(value=dates[-1])
+        date_box = ttk.Combobox(top, values=dates, textvariable=self.avail_date_var, width=11, state="readonly")
+        date_box.pack(side="left", padx=5)
+        date_box.bind("<<ComboboxSelected>>", lambda e: self.request_availability())
+        ttk.Button(top, text="Refresh", command=lambda: self.request_availability(force=True)).pack(side="left")
+        self.avail_status_var = tk.StringVar(value="Loading...")
+        ttk.Label(top, textvariable=self.avail_status_var, foreground="gray").pack(side="left", padx=10)
+
+        grid = ttk.Frame(frame)
+        grid.pack(fill="both", expand=True, pady=5)
+        self.avail_tree = ttk.Treeview(grid, show="tree headings", height=10, selectmode="none")
+        xscroll = ttk.Scrollbar(grid, orient="horizontal", command=self.avail_tree.xview)
+        yscroll = ttk.Scrollbar(grid, orient="vertical", command=self.avail_tree.yview)
+        self.avail_tree.configure(xscrollcommand=xscroll.set, yscrollcommand=yscroll.set)
+        self.avail_tree.grid(row=0, column=0, sticky="nsew")
+        yscroll.grid(row=0, column=1, sticky="ns")
+        xscroll.grid(row=1, column=0, sticky="ew")
+        grid.rowconfigure(0, weight=1)
+        grid.columnconfigure(0, weight=1)
+        self.avail_tree.bind("<ButtonRelease-1>", self.on_availability_click)
+
+        self.request_availability()
+        self.root.after(100, self.poll_availability)
+        self.root.after(self.avail_ttl * 1000, self.auto_refresh_availability)
+
+    def request_availability(self, force=False):
+        import datetime
+        date = datetime.date.fromisoformat(self.avail_date_var.get())
+        self.avail_status_var.set(f"Fetching {date.strftime('%a %b %d')}...")
+        self.avail_worker.request(date, force=force)
+
+    def auto_refresh_availability(self):
+        self.request_availability(force=True)
+        self.root.after(self.avail_ttl * 1000, self.auto_refresh_availability)
+
+    def poll_availability(self):
+        """Drains fetch results on the UI thread (Tk widgets must not be touched from the worker)."""
+        import queue
+        import datetime
+        try:
+            while True:
+                date, index, latency, error = self.avail_worker.results.get_nowait()
+                if date != datetime.date.fromisoformat(self.avail_date_var.get()):
+                    continue  # the user has picked another date since
+                if error:
+                    self.avail_status_var.set(f"Fetch failed after {latency * 1000:.0f} ms: {error}")
+                else:
+                    self.show_availability(date, index, latency)
+        except queue.Empty:
+            pass
+        self.root.after(100, self.poll_availability)
+
+    def show_availability(self, date, index, latency):
+        """Draws the grid, or only updates the cells that changed if the same date is already shown."""
+        tree = self.avail_tree
+        times = sorted({(slot.minutes, slot.time_str) for slot in index.slots.values()})
+        times = [t for _, t in times]
+        previous = self.avail_shown[1] if self.avail_shown and self.avail_shown[0] == date else None
+
+        if previous is None or times != self.avail_times or index.rooms != previous.rooms:
+            tree.delete(*tree.get_children())
+            tree["columns"] = times
+            tree.heading("#0", text="Room")
+            tree.column("#0", width=70, stretch=False)
+            for t in times:
+                tree.heading(t, text=t)
+                tree.column(t, width=55, anchor="center", stretch=False)
+            for room in index.rooms:
+                tree.insert("", "end", iid=room, text=room,
+                            values=[self.cell_text(index.get(room, t)) for t in times])
+            changes = ""
+        else:
+            freed, taken = index.diff(previous)
+            for slot in freed + taken:
+                tree.set(slot.room, slot.time_str, self.cell_text(slot))
+            changes = f", {len(freed)} freed, {len(taken)} taken" if freed or taken else ", no changes"
+
+        self.avail_times = times
+        self.avail_shown = (date, index)
+        free = sum(1 for slot in index.slots.values() if slot.available)
+        self.avail_status_var.set(f"{free} free of {len(index)} · fetched in {latency * 1000:.0f} ms{changes}")
+
+    @staticmethod
+    def cell_text(slot):
+        if slot is None:
+            return ""
+        return "✓" if slot.available else "·"
+
+    def on_availability_click(self, event):
+        """Fills the preference fields from a clicked free (room, time) cell."""
+        if not self.avail_shown:
+            return
+        room = self.avail_tree.identify_row(event.y)
+        column = self.avail_tree.identify_column(event.x)
+        if not room or column == "#0":
+            return
+        time_str = self.avail_times[int(column[1:]) - 1]
+        slot = self.avail_shown[1].get(room, time_str)
+        if not slot or not slot.available:
+            self.avail_status_var.set(f"Room {room} at {time_str} is taken.")
+            return
+        hour, minute = time_str[:-2].split(":")
+        self.room_var.set(room)
+        self.hour_var.set(str(int(hour)))
+        self.min_var.set(minute)
+        self.ampm_var.set(time_str[-2:].upper())
+        self.avail_status_var.set(f"Selected Room {room} at {time_str}.")
+
     def update_yaml_config(self):
         """Updates the default values and schedule in the GitHub Actions YAML file."""
         import ruamel.yaml
@@ -0,0 +1,354 @@
+import os
+import re
+import json
+import datetime
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import telemetry
+from stage_timer import StageTimer
+from slot_index import Slot, SlotIndex
+from site_cache import load_site, save_site, invalidate_site
+
+LIBCAL_URL = "https://carletonu.libcal.com"
+
+# LibCal endpoints, relative to the LibCal base URL
+SPACES_PATH = "/spaces"
+GRID_PATH = "/spaces/availability/grid"
+CART_PATH = "/spaces/availability/booking/add"
+REMOVE_PATH = "/spaces/availability/booking/remove"
+TIMES_PATH = "/ajax/space/times"
+AUTH_PATH = "/spaces/auth"
+BOOK_PATH = "/ajax/space/book"
+
+SLOT_TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+class BookingError(Exception):
+    pass
+
+class _FormParser(HTMLParser):
+    """Collects every <form> on a page with its action, method and input values."""
+
+    def __init__(self):
+        super().__init__()
+        self.forms = []
+        self._form = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "form":
+            self._form = {"action": attrs.get("action", ""), "method": attrs.get("method", "get").lower(),
+                          "id": attrs.get("id"), "fields": {}, "ids": {}}
+            self.forms.append(self._form)
+        elif tag == "input" and self._form is not None and attrs.get("name"):
+            self._form["fields"][attrs["name"]] = attrs.get("value", "")
+            if attrs.get("id"):
+                self._form["ids"][attrs["id"]] = attrs["name"]
+
+    def handle_endtag(self, tag):
+        if tag == "form":
+            self._form = None
+
+def parse_forms(html):
+    parser = _FormParser()
+    parser.feed(html)
+    return parser.forms
+
+def parse_resources(html):
+    """Extracts {room_number: eid} from the `resources.push({...})` blocks LibCal embeds in the spaces page."""
+    rooms = {}
+    for block in re.findall(r"resources\.push\(\{(.*?)\}\);", html, re.S):
+        eid = re.search(r"eid:\s*(\d+)", block)
+        title = re.search(r"title:\s*\"([^\"]*)\"", block)
+        if not eid or not title:
+            continue
+        number = re.search(r"\d{3,}", title.group(1))
+        rooms[number.group(0) if number else title.group(1)] = int(eid.group(1))
+    return rooms
+
+class LibCalHttpEngine:
+    """Talks to the LibCal availability and booking endpoints directly over one pooled HTTP session."""
+
+    def __init__(self, base_url=LIBCAL_URL, cookie_path=None, pool_size=4, timeout=10):
+        self.base_url = base_url.rstrip("/")
+        self.cookie_path = cookie_path
+        self.timeout = timeout
+        self.lid = None
+        self.gid = None
+        self.rooms = {}
+        self.ids_cached = False
+
+        self.session = requests.Session()
+        # Only idempotent requests are retried: a cart add or the final confirm may have gone through
+        # even when the response is a 5xx or never arrives, and retrying it could book twice
+        retries = Retry(total=2, backoff_factor=0.1, status_forcelist=[502, 503, 504])
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retries)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        # The availability grid is a POST but only reads, so it is retried too
+        self.session.mount(self.url(GRID_PATH), HTTPAdapter(pool_connections=1, pool_maxsize=pool_size,
+                                                            max_retries=retries.new(allowed_methods=None)))
+        self.session.headers["User-Agent"] = "Mozilla/5.0 (LibraryBot)"
+        if cookie_path:
+            self.load_cookies(cookie_path)
+
+    def url(self, path):
+        return urljoin(self.base_url + "/", path.lstrip("/"))
+
+    def load_cookies(self, path):
+        """Loads cookies saved by save_cookies() or Selenium's driver.get_cookies()."""
+        if not os.path.exists(path):
+            return 0
+        with open(path, "r", encoding="utf-8") as f:
+            cookies = json.load(f)
+        for c in cookies:
+            self.session.cookies.set(c["name"], c["value"], domain=c.get("domain", ""), path=c.get("path", "/"))
+        return len(cookies)
+
+    def save_cookies(self, path=None):
+        path = path or self.cookie_path
+        if not path:
+            return
+        cookies = [{"name": c.name, "value": c.value, "domain": c.domain, "path": c.path}
+                   for c in self.session.cookies]
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(cookies, f)
+
+    def _post(self, path, data):
+        resp = self.session.post(self.url(path), data=data, timeout=self.timeout,
+                                 headers={"X-Requested-With": "XMLHttpRequest", "Referer": self.url(SPACES_PATH)})
+        resp.raise_for_status()
+        return resp
+
+    def discover_spaces(self, refresh=False):
+        """
+        Reads the location/group IDs and the room-number-to-space-ID map from the spaces page,
+        or from the site cache unless refresh is set or the IDs are overridden in the environment.
+        """
+        site = {} if refresh or os.environ.get("LIBCAL_LID") else load_site(self.base_url)
+        if site.get("lid") and site.get("rooms"):
+            self.lid, self.gid, self.rooms = site["lid"], site["gid"], site["rooms"]
+            self.ids_cached = True
+            return self.rooms
+        resp = self.session.get(self.url(SPACES_PATH), timeout=self.timeout)
+        resp.raise_for_status()
+        lid = os.environ.get("LIBCAL_LID") or re.search(r"\blid\s*[:=]\s*\"?(\d+)", resp.text)
+        gid = os.environ.get("LIBCAL_GID") or re.search(r"\bgid\s*[:=]\s*\"?(\d+)", resp.text)
+        if lid is None:
+            raise BookingError("Could not find the LibCal location ID on the spaces page.")
+        self.lid = lid if isinstance(lid, str) else lid.group(1)
+        self.gid = (gid if isinstance(gid, str) else gid.group(1)) if gid else "0"
+        self.rooms = parse_resources(resp.text)
+        self.ids_cached = False
+        save_site(self.base_url, lid=self.lid, gid=self.gid, rooms=self.rooms)
+        return self.rooms
+
+    def rediscover(self, reason):
+        invalidate_site(self.base_url, reason, "lid", "gid", "rooms")
+        return self.discover_spaces(refresh=True)
+
+    def room_for_eid(self, eid):
+        for room, room_eid in self.rooms.items():
+            if room_eid == eid:
+                return room
+        return str(eid)
+
+    def fetch_availability(self, date):
+        """Returns every slot on `date` as dicts with eid, room, start, end, checksum and available."""
+        if self.lid is None:
+            self.discover_spaces()
+        next_day = date + datetime.timedelta(days=1)
+        grid = {"eid": -1, "seat": 0, "seatId": 0, "zone": 0,
+                "start": date.isoformat(), "end": next_day.isoformat(), "pageIndex": 0, "pageSize": 18}
+        try:
+            raw = self._post(GRID_PATH, dict(grid, lid=self.lid, gid=self.gid)).json().get("slots", [])
+        except (requests.HTTPError, ValueError):
+            if not self.ids_cached:
+                raise
+            self.rediscover("grid request failed with the cached IDs")
+            raw = self._post(GRID_PATH, dict(grid, lid=self.lid, gid=self.gid)).json().get("slots", [])
+        if self.ids_cached and self.rooms and any(s["itemId"] not in self.rooms.values() for s in raw):
+            # A space the cached room map doesn't know: rooms were added or renumbered
+            self.rediscover("unknown space on the grid")
+        slots = []
+        for s in raw:
+            slots.append({
+                "eid": s["itemId"],
+                "room": self.room_for_eid(s["itemId"]),
+                "start": datetime.datetime.strptime(s["start"], SLOT_TIME_FORMAT),
+                "end": datetime.datetime.strptime(s["end"], SLOT_TIME_FORMAT),
+                "checksum": s.get("checksum"),
+                # Booked and closed slots carry a className; open ones don't
+                "available": not s.get("className"),
+            })
+        if slots:
+            save_site(self.base_url, slot_minutes=int((slots[0]["end"] - slots[0]["start"]).total_seconds() // 60))
+        return slots
+
+    def add_to_cart(self, slot):
+        """Puts `slot` in the LibCal cart. Returns the booking with its selectable end times."""
+        start = slot["start"].strftime(SLOT_TIME_FORMAT)
+        resp = self._post(CART_PATH, {
+            "add[eid]": slot["eid"], "add[gid]": self.gid, "add[lid]": self.lid,
+            "add[start]": start, "add[checksum]": slot["checksum"],
+            "lid": self.lid, "gid": self.gid, "start": slot["start"].date().isoformat(),
+            "end": (slot["start"].date() + datetime.timedelta(days=1)).isoformat(),
+        })
+        bookings = resp.json().get("bookings") or []
+        if not bookings:
+            raise BookingError(f"LibCal refused to add {start} in room {slot['room']} to the cart.")
+        return bookings[0]
+
+    def set_end_time(self, booking, end_time):
+        """Extends the cart booking to end_time. Returns False if LibCal doesn't offer that end time."""
+        wanted = end_time.strftime(SLOT_TIME_FORMAT)
+        options = booking.get("options", [])
+        if wanted not in options:
+            return False
+        checksum = booking["optionChecksums"][options.index(wanted)]
+        resp = self._post(CART_PATH, {
+            "update[id]": booking["id"], "update[checksum]": checksum, "update[end]": wanted,
+            "lid": self.lid, "gid": self.gid,
+        })
+        booking.update((resp.json().get("bookings") or [booking])[0])
+        return True
+
+    def remove_from_cart(self, booking_id):
+        """Takes a booking back out of the cart, so a later run in this session doesn't book it too."""
+        self._post(REMOVE_PATH, {"remove[id]": booking_id, "lid": self.lid, "gid": self.gid})
+
+    def submit_times(self, bookings, username, password):
+        """Submits the cart and completes SSO if LibCal asks for it. Returns the booking form."""
+        data = {"patron": "", "patronHash": "", "returnUrl": SPACES_PATH}
+        for i, b in enumerate(bookings):
+            for key in ("id", "eid", "start", "end", "checksum"):
+                data[f"bookings[{i}][{key}]"] = b[key]
+        resp = self._post(TIMES_PATH, data)
+        redirect = resp.json().get("redirect")
+        if not redirect:
+            raise BookingError("LibCal did not return a booking form for the selected times.")
+
+        page = self.session.get(urljoin(resp.url, redirect), timeout=self.timeout)
+        page = self._complete_sso(page, username, password)
+        for form in parse_forms(page.text):
+            if "session" in form["fields"]:
+                return form
+        raise BookingError("Booking form not found after SSO.")
+
+    def _complete_sso(self, resp, username, password):
+        """Fills the ADFS login form and follows the auto-posted SAML forms back to LibCal."""
+        submitted = False
+        for _ in range(5):
+            forms = parse_forms(resp.text)
+            login = next((f for f in forms if "userNameInput" in f["ids"]), None)
+            if login:
+                # ADFS shows the form again when the credentials are wrong; posting them again risks a lockout
+                if submitted:
+                    raise BookingError("login rejected")
+                fields = dict(login["fields"])
+                fields[login["ids"]["userNameInput"]] = username
+                fields[login["ids"]["passwordInput"]] = password
+                submitted = True
+            else:
+                login = next((f for f in forms if "SAMLResponse" in f["fields"]), None)
+                if not login:
+                    if submitted:
+                        print("Logged in.")
+                    return resp
+                fields = login["fields"]
+            resp = self.session.post(urljoin(resp.url, login["action"]), data=fields, timeout=self.timeout)
+            resp.raise_for_status()
+        raise BookingError("SSO did not finish after 5 redirects.")
+
+    def confirm(self, form, bookings):
+        """
+        Posts the final booking form for `bookings` only. Anything else the form carries was left in the
+        cart by an earlier run in this session; it is removed first. Returns LibCal's booking ID.
+        """
+        ours = [b["id"] for b in bookings]
+        listed = json.loads(form["fields"].get("bookings") or "[]")
+        if any(i not in listed for i in ours):
+            raise BookingError("The booking form doesn't list the slot this run put in the cart.")
+        for stray in [i for i in listed if i not in ours]:
+            print(f"Removing {stray} from the cart; an earlier run left it there.")
+            self.remove_from_cart(stray)
+        resp = self._post(BOOK_PATH, dict(form["fields"], bookings=json.dumps(ours)))
+        result = resp.json()
+        if result.get("error"):
+            raise BookingError(result["error"])
+        return result.get("bookId")
+
+def index_slots(slots):
+    """Builds a SlotIndex over API slots; each Slot's ref is the API slot dict."""
+    from book_room import format_slot_time
+    return SlotIndex(Slot(s["room"], format_slot_time(s["start"]), s["available"], ref=s) for s in slots)
+
+def http_book_room(args):
+    """Same flow as book_room(), over plain HTTP instead of a browser."""
+    from book_room import DAYS_AHEAD, get_credentials, to_24h, report_timings, format_slot_time, choose_slot
+
+    print("--- Carleton Library Room Booker (HTTP engine) ---")
+    print(f"Configuration: Room={args.room}, Time={args.hour}:{args.minute:02d} {args.ampm}, Duration={args.duration} mins")
+    if args.dry_run:
+        print("BS: *** DRY RUN MODE ENABLED - NO BOOKING WILL BE MAKING ***")
+
+    username, password = get_credentials()
+    engine = LibCalHttpEngine(args.libcal_url, cookie_path=args.cookie_jar)
+    timer = StageTimer()
+
+    target_date = datetime.date.today() + datetime.timedelta(days=DAYS_AHEAD)
+    start_time = datetime.datetime.combine(target_date, datetime.time(to_24h(args.hour, args.ampm), args.minute))
+    end_time = start_time + datetime.timedelta(minutes=args.duration)
+    print(f"Target Date: {target_date.strftime('%A, %B %d, %Y')}")
+
+    booking = None
+    confirmed = False
+    try:
+        with timer.stage("navigate"):
+            engine.discover_spaces(refresh=args.refresh_site)
+
+        with timer.stage("date_select"):
+            slots = engine.fetch_availability(target_date)
+
+        with timer.stage("slot_select"):
+            slot = choose_slot(index_slots(slots), args, format_slot_time(start_time))
+            if not slot:
+                return None
+            booking = engine.add_to_cart(slot.ref)
+
+        with timer.stage("end_time"):
+            if engine.set_end_time(booking, end_time):
+                print(f"Success: Selected end time {end_time.strftime('%I:%M %p')}")
+            else:
+                print(f"WARNING: End time {end_time.strftime('%I:%M %p')} not offered; keeping {booking['end']}.")
+
+        with timer.stage("sso"):
+            form = engine.submit_times([booking], username, password)
+
+        with timer.stage("finalize"):
+            if args.dry_run:
+                print("[DRY RUN] Skipping final 'Submit My Booking' request.")
+                return slot.room
+            book_id = engine.confirm(form, [booking])
+            confirmed = True
+            print(f"Booking process completed. Confirmation: {book_id}")
+        return slot.room
+
+    except (requests.RequestException, BookingError, ValueError) as e:
+        print(f"An error occurred: {e}")
+        telemetry.emit("error", error=type(e).__name__, message=str(e))
+        return None
+
+    finally:
+        # A dry run or an abort leaves the slot in the cart; with --cookie-jar the next run would book it too
+        if booking and not confirmed:
+            try:
+                engine.remove_from_cart(booking["id"])
+            except requests.RequestException as e:
+                print(f"WARNING: Could not take the slot back out of the cart: {e}")
+        # Keep the SSO cookies for the next run
+        engine.save_cookies()
+        report_timings(timer, args)
+        print("Done.")
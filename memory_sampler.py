@@ -0,0 +1,153 @@
+"""
+Background RSS sampling of this Python process and the whole ChromeDriver/Chrome process tree.
+Uses psutil when it is installed, otherwise /proc (Linux, which is what the CI runners are).
+"""
+import os
+import time
+import threading
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+def _proc_rss_mb(pid):
+    with open(f"/proc/{pid}/status", "r", encoding="utf-8") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024.0
+    return 0.0
+
+def _proc_children():
+    """pid -> list of child pids, from /proc/*/stat."""
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "r", encoding="utf-8") as f:
+                # The command name can contain spaces; fields resume after the closing paren
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    return children
+
+def process_tree_rss(root_pid):
+    """(total RSS in MB, process count) of root_pid and all its descendants."""
+    if psutil is not None:
+        try:
+            root = psutil.Process(root_pid)
+            procs = [root] + root.children(recursive=True)
+        except psutil.Error:
+            return 0.0, 0
+        total = 0.0
+        for p in procs:
+            try:
+                total += p.memory_info().rss / 2 ** 20
+            except psutil.Error:
+                pass
+        return total, len(procs)
+
+    children = _proc_children()
+    total, count, stack = 0.0, 0, [root_pid]
+    while stack:
+        pid = stack.pop()
+        try:
+            total += _proc_rss_mb(pid)
+            count += 1
+        except OSError:
+            continue
+        stack.extend(children.get(pid, []))
+    return total, count
+
+def can_sample():
+    return psutil is not None or os.path.exists("/proc/self/status")
+
+class MemorySampler:
+    """
+    Samples every `interval` seconds on a daemon thread until stop(). The browser's processes are
+    found from the ChromeDriver service PID, set with watch_driver() once the driver exists.
+    If `budget_mb` is given, `over_budget` is set the first time Python + browser exceeds it.
+    """
+
+    def __init__(self, interval=0.5, budget_mb=None):
+        self.interval = interval
+        self.budget_mb = budget_mb
+        self.driver_pid = None
+        self.timeline = []  # (seconds since start, python MB, browser MB, browser processes)
+        self.peak = {"python_mb": 0.0, "browser_mb": 0.0, "total_mb": 0.0, "browser_processes": 0}
+        self.over_budget = False
+        self.trimmed = False
+        self._t0 = time.perf_counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def watch_driver(self, driver):
+        process = getattr(getattr(driver, "service", None), "process", None)
+        self.driver_pid = process.pid if process else None
+
+    def start(self):
+        if can_sample():
+            self._thread.start()
+        else:
+            print("Memory sampling needs psutil on this platform (pip install psutil).")
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout=2)
+        if can_sample():
+            self.sample()
+
+    def sample(self):
+        python_mb, _ = process_tree_rss(os.getpid()) if psutil else (_proc_rss_mb("self"), 1)
+        browser_mb, processes = process_tree_rss(self.driver_pid) if self.driver_pid else (0.0, 0)
+        if psutil:
+            # The browser tree hangs off this process; don't count it twice
+            python_mb -= browser_mb
+        total = python_mb + browser_mb
+        self.timeline.append((round(time.perf_counter() - self._t0, 2), round(python_mb, 1), round(browser_mb, 1), processes))
+        self.peak["python_mb"] = max(self.peak["python_mb"], python_mb)
+        self.peak["browser_mb"] = max(self.peak["browser_mb"], browser_mb)
+        self.peak["total_mb"] = max(self.peak["total_mb"], total)
+        self.peak["browser_processes"] = max(self.peak["browser_processes"], processes)
+        if self.budget_mb and total > self.budget_mb and not self.over_budget:
+            self.over_budget = True
+            print(f"WARNING: Memory {total:.0f} MB is over the {self.budget_mb:.0f} MB budget "
+                  f"(Python {python_mb:.0f} MB, browser {browser_mb:.0f} MB in {processes} processes).")
+
+    def adapt(self, driver):
+        """Once over budget, trims the browser (once). Call between steps, from the thread driving the browser."""
+        if not self.over_budget or self.trimmed:
+            return
+        from browser_profiles import trim_browser_memory
+        self.trimmed = True
+        before = self.timeline[-1][2] if self.timeline else 0.0
+        trim_browser_memory(driver)
+        print(f"Trimmed browser memory (closed extra tabs, collected garbage, cleared cache; browser was {before:.0f} MB).")
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.sample()
+            except Exception:
+                # A process exiting mid-read is expected while Chrome shuts down
+                pass
+
+    def summary(self):
+        p = self.peak
+        line = (f"Peak memory: {p['total_mb']:.0f} MB (Python {p['python_mb']:.0f} MB, "
+                f"browser {p['browser_mb']:.0f} MB in up to {p['browser_processes']} processes)")
+        if self.budget_mb:
+            line += f", budget {self.budget_mb:.0f} MB{' EXCEEDED' if self.over_budget else ''}"
+        return line
+
+    def to_dict(self):
+        return {
+            "peak": {k: round(v, 1) for k, v in self.peak.items()},
+            "budget_mb": self.budget_mb,
+            "over_budget": self.over_budget,
+            "timeline": self.timeline,
+        }
@@ -0,0 +1,489 @@
+"""
+Local stand-in for LibCal and the Carleton SSO, for offline testing of the booking engines.
+
+    python mock_libcal.py --port 8765 --latency-ms 50
+    python book_room.py --engine http --libcal-url http://127.0.0.1:8765
+    python book_room.py --libcal-url http://127.0.0.1:8765 --library-url http://127.0.0.1:8765/services/study-rooms
+"""
+import html
+import json
+import time
+import uuid
+import hashlib
+import datetime
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs, urlencode
+
+SLOT_TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+DEFAULT_ROOMS = ["464", "466", "468", "470", "472", "474"]
+
+# --- Browser-facing replica pages (what book_room.py drives through Selenium) ---
+
+LIBRARY_PAGE = """<html><head><title>Study Rooms | MacOdrum Library</title></head><body>
+<div id="cookie-banner">We use cookies. <button type="button" onclick="this.parentNode.style.display='none'">Ok. Got it.</button></div>
+<h1>Study Rooms</h1>
+<a href="__LIBCAL__/reserve" target="_blank"><button type="button">Book a Study Room</button></a>
+</body></html>"""
+
+GRID_PAGE = """<html><head><title>Study Rooms - LibCal</title>
+<style>#grid a { display: inline-block; width: 12px; height: 12px; margin: 1px; background: #8c8; }
+#grid a.s-lc-eq-checkout { background: #ccc; } .room { white-space: nowrap; }</style></head><body>
+<div class="fc-toolbar">
+  <button type="button" class="fc-prev-button">&lt;</button>
+  <button type="button" class="fc-next-button">&gt;</button>
+  <button type="button" class="fc-goToDate-button">Go To Date</button>
+  <h2></h2>
+</div>
+<div id="datepicker" style="display:none"><div id="dp-month"></div><table><tbody id="dp-body"></tbody></table></div>
+<select id="s-lc-language" style="display:none"><option>English</option></select>
+<div id="grid"></div>
+<div id="cart" style="display:none">
+  <select id="bookingend"></select>
+  <button type="button" id="submit_times">Submit Times</button>
+</div>
+<script>
+var LID = __LID__, GID = __GID__, ROOMS = __ROOMS__;
+var DAYS = ["Sunday", "Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday"];
+var MONTHS = ["January", "February", "March", "April", "May", "June", "July", "August", "September",
+              "October", "November", "December"];
+// Stand-in for jQuery's in-flight request counter, which book_room.wait_for_page_ready() watches
+window.jQuery = {active: 0};
+// ?date=YYYY-MM-DD opens the grid on that day, as site_cache.py expects
+var dateParam = new URLSearchParams(location.search).get("date");
+var gridDate = dateParam ? parse(dateParam + " 00:00") : new Date(); gridDate.setHours(0, 0, 0, 0);
+var pickerMonth = null, booking = null;
+
+function iso(d) { return d.getFullYear() + "-" + String(d.getMonth() + 1).padStart(2, "0") + "-" + String(d.getDate()).padStart(2, "0"); }
+function parse(s) { var p = s.split(/[- :]/); return new Date(+p[0], +p[1] - 1, +p[2], +p[3], +p[4]); }
+function fmtTime(d) { var h = d.getHours(); return ((h % 12) || 12) + ":" + String(d.getMinutes()).padStart(2, "0") + (h >= 12 ? "pm" : "am"); }
+function fmtDate(d) { return DAYS[d.getDay()] + ", " + MONTHS[d.getMonth()] + " " + d.getDate() + ", " + d.getFullYear(); }
+function post(path, data, done) {
+  jQuery.active++;
+  return fetch(path, {method: "POST", headers: {"Content-Type": "application/x-www-form-urlencoded"},
+                      body: new URLSearchParams(data)})
+    .then(function (r) { return r.json(); }).then(done)
+    .finally(function () { jQuery.active--; });
+}
+
+function loadGrid() {
+  document.querySelector(".fc-toolbar h2").innerText = fmtDate(gridDate);
+  var next = new Date(gridDate); next.setDate(next.getDate() + 1);
+  post("/spaces/availability/grid", {lid: LID, gid: GID, eid: -1, start: iso(gridDate), end: iso(next)}, function (res) {
+    var rows = {};
+    res.slots.forEach(function (s) {
+      var start = parse(s.start), room = ROOMS[s.itemId];
+      var a = document.createElement("a");
+      a.href = "#";
+      a.title = fmtTime(start) + " " + fmtDate(start) + " - " + room + " (Capacity 6) - " + (s.className ? "Unavailable/Padding" : "Available");
+      if (s.className) { a.className = s.className; } else { a.onclick = function (e) { e.preventDefault(); addToCart(s); }; }
+      (rows[room] = rows[room] || []).push(a);
+    });
+    var grid = document.getElementById("grid");
+    grid.innerHTML = "";
+    Object.keys(rows).forEach(function (room) {
+      var div = document.createElement("div");
+      div.className = "room";
+      div.appendChild(document.createTextNode(room + " "));
+      rows[room].forEach(function (a) { div.appendChild(a); });
+      grid.appendChild(div);
+    });
+  });
+}
+
+function addToCart(s) {
+  post("/spaces/availability/booking/add", {"add[eid]": s.itemId, "add[gid]": GID, "add[lid]": LID,
+       "add[start]": s.start, "add[checksum]": s.checksum, lid: LID, gid: GID}, function (res) {
+    booking = res.bookings[0];
+    if (!booking) { return; }
+    var select = document.getElementById("bookingend");
+    select.innerHTML = "";
+    booking.options.forEach(function (o) {
+      var end = parse(o), opt = document.createElement("option");
+      opt.value = o;
+      opt.text = fmtTime(end) + " " + fmtDate(end);
+      select.appendChild(opt);
+    });
+    document.getElementById("cart").style.display = "block";
+  });
+}
+
+document.getElementById("bookingend").onchange = function () {
+  var i = this.selectedIndex;
+  post("/spaces/availability/booking/add", {"update[id]": booking.id, "update[checksum]": booking.optionChecksums[i],
+       "update[end]": booking.options[i], lid: LID, gid: GID}, function (res) { booking = res.bookings[0] || booking; });
+};
+
+document.getElementById("submit_times").onclick = function () {
+  post("/ajax/space/times", {"bookings[0][id]": booking.id, "bookings[0][eid]": booking.eid,
+       "bookings[0][start]": booking.start, "bookings[0][end]": booking.end,
+       "bookings[0][checksum]": booking.checksum}, function (res) { window.location = res.redirect; });
+};
+
+function renderPicker() {
+  var first = new Date(pickerMonth.getFullYear(), pickerMonth.getMonth(), 1);
+  var cell = new Date(first); cell.setDate(1 - first.getDay());
+  document.getElementById("dp-month").innerText = MONTHS[first.getMonth()] + " " + first.getFullYear();
+  var body = document.getElementById("dp-body");
+  body.innerHTML = "";
+  for (var w = 0; w < 6; w++) {
+    var tr = document.createElement("tr");
+    for (var d = 0; d < 7; d++) {
+      let td = document.createElement("td"), day = new Date(cell);
+      td.className = "day" + (cell < first ? " old" : cell.getMonth() !== first.getMonth() ? " new" : "");
+      td.innerText = cell.getDate();
+      td.onclick = function () {
+        gridDate = day;
+        document.getElementById("datepicker").style.display = "none";
+        pickerMonth = null;
+        loadGrid();
+      };
+      tr.appendChild(td);
+      cell.setDate(cell.getDate() + 1);
+    }
+    body.appendChild(tr);
+  }
+}
+
+document.querySelector(".fc-goToDate-button").onclick = function () {
+  pickerMonth = new Date(gridDate.getFullYear(), gridDate.getMonth(), 1);
+  renderPicker();
+  document.getElementById("datepicker").style.display = "block";
+};
+function step(delta) {
+  // With the date picker open the arrows page months, otherwise they move the grid a day
+  if (pickerMonth) { pickerMonth.setMonth(pickerMonth.getMonth() + delta); renderPicker(); return; }
+  gridDate.setDate(gridDate.getDate() + delta);
+  loadGrid();
+}
+document.querySelector(".fc-prev-button").onclick = function () { step(-1); };
+document.querySelector(".fc-next-button").onclick = function () { step(1); };
+loadGrid();
+</script></body></html>"""
+
+class MockLibCal:
+    """In-memory availability, carts, SSO sessions and bookings."""
+
+    def __init__(self, rooms=None, open_hour=8, close_hour=23, slot_minutes=30, max_minutes=180,
+                 booked_ratio=0.3, latency=0.0, username="student", password="password", clock_skew=0.0):
+        self.rooms = {room: 1000 + i for i, room in enumerate(rooms or DEFAULT_ROOMS)}
+        self.open_hour = open_hour
+        self.close_hour = close_hour
+        self.slot_minutes = slot_minutes
+        self.max_minutes = max_minutes
+        self.booked_ratio = booked_ratio
+        self.latency = latency
+        self.clock_skew = clock_skew  # seconds the /time endpoint runs ahead of this machine
+        self.username = username
+        self.password = password
+        self.lid = 2468
+        self.gid = 4321
+        self.booked = set()   # (eid, start string)
+        self.carts = {}       # client id -> {booking id: booking}
+        self.authed = set()   # client ids that completed SSO
+        self.confirmed = []
+        self.lock = threading.Lock()
+
+    def checksum(self, *parts):
+        return hashlib.md5("|".join(str(p) for p in parts).encode()).hexdigest()[:12]
+
+    def is_booked(self, eid, start):
+        key = start.strftime(SLOT_TIME_FORMAT)
+        if (eid, key) in self.booked:
+            return True
+        # Deterministic pseudo-random background bookings
+        return int(self.checksum("bg", eid, key), 16) % 1000 < self.booked_ratio * 1000
+
+    def day_slots(self, date):
+        step = datetime.timedelta(minutes=self.slot_minutes)
+        slots = []
+        for room, eid in self.rooms.items():
+            t = datetime.datetime.combine(date, datetime.time(self.open_hour))
+            close = datetime.datetime.combine(date, datetime.time(self.close_hour))
+            while t < close:
+                slots.append((room, eid, t, t + step, self.is_booked(eid, t)))
+                t += step
+        return slots
+
+    def end_options(self, eid, start):
+        """End times a booking starting at `start` can extend to without crossing a booked slot."""
+        step = datetime.timedelta(minutes=self.slot_minutes)
+        close = datetime.datetime.combine(start.date(), datetime.time(self.close_hour))
+        options = []
+        t = start
+        while t < close and (t - start).total_seconds() < self.max_minutes * 60 and not self.is_booked(eid, t):
+            t += step
+            options.append(t)
+        return options
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        # --- plumbing ---
+        def client_id(self):
+            for part in self.headers.get("Cookie", "").split(";"):
+                name, _, value = part.strip().partition("=")
+                if name == "lc_sid":
+                    return value
+            return None
+
+        def form(self):
+            return {k: v[0] for k, v in parse_qs(self.body, keep_blank_values=True).items()}
+
+        def send(self, body, status=200, content_type="text/html", headers=None):
+            data = body.encode() if isinstance(body, str) else body
+            self.send_response(status)
+            self.send_header("Content-Type", content_type + "; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            if not self.client_id():
+                self.send_header("Set-Cookie", f"lc_sid={uuid.uuid4().hex}; Path=/")
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def send_json(self, obj, status=200):
+            self.send(json.dumps(obj), status, "application/json")
+
+        def redirect(self, location, headers=None):
+            self.send("", 302, headers=dict(headers or {}, Location=location))
+
+        def route(self, method):
+            if state.latency:
+                time.sleep(state.latency)
+            # Always drain the body so keep-alive connections stay in sync
+            length = int(self.headers.get("Content-Length") or 0)
+            self.body = self.rfile.read(length).decode() if length else ""
+            path = urlparse(self.path).path
+            handler = ROUTES.get((method, path))
+            if handler is None:
+                self.send("Not found", 404)
+                return
+            handler(self)
+
+        def do_GET(self):
+            self.route("GET")
+
+        def do_POST(self):
+            self.route("POST")
+
+        # --- LibCal ---
+        def spaces_page(self):
+            resources = "\n".join(
+                f'resources.push({{ id: "eid_{eid}", eid: {eid}, title: "{room} (Capacity 6)" }});'
+                for room, eid in state.rooms.items())
+            self.send(f"<html><body><script>\nvar lid = {state.lid};\nvar gid = {state.gid};\n"
+                      f"var resources = [];\n{resources}\n</script></body></html>")
+
+        def grid(self):
+            date = datetime.date.fromisoformat(self.form()["start"])
+            slots = []
+            for room, eid, start, end, booked in state.day_slots(date):
+                s = {"itemId": eid, "start": start.strftime(SLOT_TIME_FORMAT), "end": end.strftime(SLOT_TIME_FORMAT),
+                     "checksum": state.checksum(eid, start)}
+                if booked:
+                    s["className"] = "s-lc-eq-checkout"
+                slots.append(s)
+            self.send_json({"slots": slots})
+
+        def cart(self):
+            data = self.form()
+            cart = state.carts.setdefault(self.client_id(), {})
+            with state.lock:
+                if "add[eid]" in data:
+                    eid = int(data["add[eid]"])
+                    start = datetime.datetime.strptime(data["add[start]"], SLOT_TIME_FORMAT)
+                    if data["add[checksum]"] != state.checksum(eid, start) or state.is_booked(eid, start):
+                        self.send_json({"bookings": [], "error": "Slot is no longer available."})
+                        return
+                    ends = state.end_options(eid, start)
+                    booking = {"id": uuid.uuid4().hex[:8], "eid": eid, "start": data["add[start]"],
+                               "end": ends[0].strftime(SLOT_TIME_FORMAT),
+                               "options": [e.strftime(SLOT_TIME_FORMAT) for e in ends]}
+                else:
+                    booking = cart.get(data.get("update[id]"))
+                    if not booking or data.get("update[end]") not in booking["options"]:
+                        self.send_json({"bookings": [], "error": "Invalid end time."})
+                        return
+                    booking["end"] = data["update[end]"]
+                booking["optionChecksums"] = [state.checksum(booking["eid"], o) for o in booking["options"]]
+                booking["checksum"] = state.checksum(booking["eid"], booking["start"], booking["end"])
+                cart[booking["id"]] = booking
+            self.send_json({"bookings": [booking]})
+
+        def cart_remove(self):
+            with state.lock:
+                state.carts.get(self.client_id(), {}).pop(self.form().get("remove[id]"), None)
+            self.send_json({"bookings": []})
+
+        def times(self):
+            if self.client_id() in state.authed:
+                self.send_json({"redirect": "/spaces/booking/form"})
+            else:
+                self.send_json({"redirect": "/spaces/auth?returnUrl=/spaces/booking/form"})
+
+        def auth(self):
+            return_url = parse_qs(urlparse(self.path).query).get("returnUrl", ["/spaces/booking/form"])[0]
+            self.redirect(f"/adfs/ls/?{urlencode({'returnUrl': return_url})}")
+
+        def auth_callback(self):
+            data = self.form()
+            if data.get("SAMLResponse") != state.checksum("saml", state.username):
+                self.send("Bad SAML response", 403)
+                return
+            state.authed.add(self.client_id())
+            self.redirect(data.get("RelayState") or "/spaces/booking/form")
+
+        def booking_form(self):
+            if self.client_id() not in state.authed:
+                self.redirect("/spaces/auth?returnUrl=/spaces/booking/form")
+                return
+            cart = state.carts.get(self.client_id(), {})
+            self.send(f"""<html><body>
+<form id="s-lc-eq-form" action="/ajax/space/book" method="post">
+  <input type="hidden" name="session" value="{uuid.uuid4().hex[:10]}">
+  <input type="hidden" name="bookings" value='{json.dumps(list(cart))}'>
+  <button type="button" id="s-lc-eq-continue"
+          onclick="document.getElementById('details').style.display='block'; this.style.display='none';">Continue</button>
+  <div id="details" style="display:none">
+    <input type="text" id="fname" name="fname" value="Test">
+    <input type="text" id="lname" name="lname" value="Student">
+    <input type="text" id="email" name="email" value="{state.username}@cmail.carleton.ca">
+    <button type="button" id="btn-form-submit" onclick="submitBooking()">Submit My Booking</button>
+  </div>
+</form>
+<script>
+function submitBooking() {{
+  fetch("/ajax/space/book", {{method: "POST", body: new URLSearchParams(new FormData(document.getElementById("s-lc-eq-form")))}})
+    .then(function (r) {{ return r.json(); }})
+    .then(function (res) {{
+      document.body.innerHTML = res.bookId ? "<h1>Booking confirmed</h1><p id='s-lc-confirm'>" + res.bookId + "</p>"
+                                           : "<h1>Booking failed</h1><p class='error'>" + res.error + "</p>";
+    }});
+}}
+</script></body></html>""")
+
+        def book(self):
+            data = self.form()
+            client = self.client_id()
+            if client not in state.authed:
+                self.send_json({"error": "Not logged in."}, 403)
+                return
+            cart = state.carts.get(client, {})
+            with state.lock:
+                ids = json.loads(data.get("bookings") or "[]")
+                bookings = [cart[i] for i in ids if i in cart]
+                if not bookings:
+                    self.send_json({"error": "Cart is empty."})
+                    return
+                for b in bookings:
+                    start = datetime.datetime.strptime(b["start"], SLOT_TIME_FORMAT)
+                    end = datetime.datetime.strptime(b["end"], SLOT_TIME_FORMAT)
+                    t = start
+                    while t < end:
+                        if state.is_booked(b["eid"], t):
+                            self.send_json({"error": "Sorry, this slot was just booked by someone else."})
+                            return
+                        t += datetime.timedelta(minutes=state.slot_minutes)
+                for b in bookings:
+                    start = datetime.datetime.strptime(b["start"], SLOT_TIME_FORMAT)
+                    end = datetime.datetime.strptime(b["end"], SLOT_TIME_FORMAT)
+                    t = start
+                    while t < end:
+                        state.booked.add((b["eid"], t.strftime(SLOT_TIME_FORMAT)))
+                        t += datetime.timedelta(minutes=state.slot_minutes)
+                    del cart[b["id"]]
+                book_id = "cs_" + uuid.uuid4().hex[:8]
+                state.confirmed.append({"bookId": book_id, "bookings": bookings})
+            self.send_json({"bookId": book_id})
+
+        def library_page(self):
+            host = self.headers.get("Host", "127.0.0.1")
+            self.send(LIBRARY_PAGE.replace("__LIBCAL__", f"http://{host}"))
+
+        def grid_page(self):
+            rooms = {eid: room for room, eid in state.rooms.items()}
+            self.send(GRID_PAGE.replace("__LID__", str(state.lid)).replace("__GID__", str(state.gid))
+                      .replace("__ROOMS__", json.dumps(rooms)))
+
+        # --- Time source for scheduler.py, optionally skewed ---
+        def server_time(self):
+            self.send_json({"epoch": time.time() + state.clock_skew})
+
+        # --- SSO (ADFS-style) ---
+        def sso_form(self, error=""):
+            self.send(f"""<html><body>
+<form id="loginForm" action="{html.escape(self.path)}" method="post">
+  <span id="errorText">{error}</span>
+  <input id="userNameInput" name="UserName" type="email" value="">
+  <input id="passwordInput" name="Password" type="password" value="">
+  <input type="hidden" name="AuthMethod" value="FormsAuthentication">
+  <span id="submitButton" role="button" onclick="document.forms[0].submit()">Sign in</span>
+</form></body></html>""")
+
+        def sso_login(self):
+            data = self.form()
+            if data.get("UserName") != state.username or data.get("Password") != state.password:
+                self.sso_form("Incorrect user ID or password.")
+                return
+            # Auto-posting SAML form, as ADFS does, back to wherever /spaces/auth was asked to return to
+            return_url = parse_qs(urlparse(self.path).query).get("returnUrl", ["/spaces/booking/form"])[0]
+            self.send(f"""<html><body onload="document.forms[0].submit()">
+<form method="post" action="/spaces/auth/callback">
+  <input type="hidden" name="SAMLResponse" value="{state.checksum('saml', state.username)}">
+  <input type="hidden" name="RelayState" value="{html.escape(return_url)}">
+</form></body></html>""")
+
+    ROUTES = {
+        ("GET", "/services/study-rooms"): Handler.library_page,
+        ("GET", "/reserve"): Handler.grid_page,
+        ("GET", "/spaces"): Handler.spaces_page,
+        ("POST", "/spaces/availability/grid"): Handler.grid,
+        ("POST", "/spaces/availability/booking/add"): Handler.cart,
+        ("POST", "/spaces/availability/booking/remove"): Handler.cart_remove,
+        ("POST", "/ajax/space/times"): Handler.times,
+        ("GET", "/spaces/auth"): Handler.auth,
+        ("POST", "/spaces/auth/callback"): Handler.auth_callback,
+        ("GET", "/spaces/booking/form"): Handler.booking_form,
+        ("POST", "/ajax/space/book"): Handler.book,
+        ("GET", "/time"): Handler.server_time,
+        ("GET", "/adfs/ls/"): Handler.sso_form,
+        ("POST", "/adfs/ls/"): Handler.sso_login,
+    }
+    return Handler
+
+def start_mock_server(host="127.0.0.1", port=0, **kwargs):
+    """Starts the mock in a background thread. Returns (server, state); the URL is server.url."""
+    state = MockLibCal(**kwargs)
+    server = ThreadingHTTPServer((host, port), make_handler(state))
+    server.daemon_threads = True
+    server.url = f"http://{host}:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mock LibCal + SSO server for offline testing")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", default=8765, type=int)
+    parser.add_argument("--latency-ms", default=0, type=float, help="Artificial delay added to every request")
+    parser.add_argument("--booked-ratio", default=0.3, type=float, help="Fraction of slots that start out booked")
+    parser.add_argument("--rooms", default=",".join(DEFAULT_ROOMS), help="Comma-separated room numbers")
+    parser.add_argument("--username", default="student")
+    parser.add_argument("--password", default="password")
+    parser.add_argument("--clock-skew", default=0.0, type=float, help="Seconds /time runs ahead of the local clock")
+    args = parser.parse_args()
+
+    server, state = start_mock_server(args.host, args.port, latency=args.latency_ms / 1000.0,
+                                      booked_ratio=args.booked_ratio, rooms=args.rooms.split(","),
+                                      username=args.username, password=args.password, clock_skew=args.clock_skew)
+    print(f"Mock LibCal listening on {server.url} (user '{args.username}' / '{args.password}')")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
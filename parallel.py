@@ -0,0 +1,138 @@
+import argparse
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from selenium.webdriver.support.ui import WebDriverWait
+from book_room import (
+    DAYS_AHEAD, get_credentials, create_driver, open_libcal,
+)
+from driver_cache import resolve_driver_path
+from batch import parse_job_time
+from checkpoint import BookingState, run_stages
+from slot_index import parse_room_list
+import telemetry
+from stage_timer import StageTimer
+
+class FirstWinner:
+    """
+    Lets exactly one worker make the final submit. A worker claims the right just before submitting;
+    others block until it settles, and either give up (it won) or take over (it failed).
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self.pending = None
+        self.winner = None
+
+    def claim(self, name):
+        """Re-entrant: a retried finalize claims again while this worker still holds the claim."""
+        with self._cond:
+            if self.pending == name:
+                return True
+            while self.pending is not None and self.winner is None:
+                self._cond.wait()
+            if self.winner is not None:
+                return False
+            self.pending = name
+            return True
+
+    def settle(self, name, success):
+        with self._cond:
+            if self.pending == name:
+                if success:
+                    self.winner = name
+                self.pending = None
+                self._cond.notify_all()
+
+    def decided(self):
+        return self.winner is not None
+
+def build_candidates(args):
+    """One (room, hour, minute, ampm) per preferred room and start time, primary start time first."""
+    starts = [(args.hour, args.minute, args.ampm)]
+    starts += [parse_job_time(s) for s in args.alt_starts.split(",") if s.strip()]
+    return [(room, *start) for start in starts for room in parse_room_list(args.room)]
+
+def run_worker(name, args, target_date, username, password, race):
+    """Books one candidate in its own headless browser. Returns a result dict."""
+    timer = StageTimer()
+    result = {"worker": name, "room": args.room, "start": f"{args.hour}:{args.minute:02d}{args.ampm}",
+              "result": "cancelled", "seconds": 0.0}
+    if race.decided():
+        return result
+
+    def before_submit():
+        if not race.claim(name):
+            print(f"[{name}] Another worker already booked. Cancelling before final submit.")
+            return False
+        return True
+
+    driver = None
+    booked = None
+    state = None
+    try:
+        with timer.stage("startup"):
+            driver = create_driver(args)
+        timer.track_commands(driver.command_counter)
+        wait = WebDriverWait(driver, 10, poll_frequency=0.1)
+        with timer.stage("navigate"):
+            open_libcal(driver, wait, args)
+        state = BookingState(args, target_date, driver.current_url, username, password, before_submit)
+        booked = run_stages(driver, wait, state, timer, max_attempts=args.stage_attempts)
+        if booked:
+            result["room"] = booked
+            result["result"] = "won"
+        elif state.outcome == "unknown":
+            result["result"] = "unknown"
+        elif not race.decided():
+            result["result"] = "no slot"
+    except Exception as e:
+        print(f"[{name}] An error occurred: {e}")
+        result["result"] = f"error: {type(e).__name__}"
+    finally:
+        # Releases the claim if this worker held it, so a runner-up can submit instead. A submit that may
+        # have gone through counts as won: handing over could book twice.
+        race.settle(name, bool(booked) or (state is not None and state.outcome == "unknown"))
+        result["seconds"] = timer.total()
+        telemetry.emit("worker_result", **result)
+        if driver:
+            driver.quit()
+    return result
+
+def run_parallel(args):
+    candidates = build_candidates(args)
+    workers = max(1, min(args.workers, len(candidates)))
+    target_date = datetime.date.today() + datetime.timedelta(days=DAYS_AHEAD)
+
+    print(f"--- Carleton Library Room Booker (PARALLEL: {len(candidates)} candidates, {workers} workers) ---")
+    print(f"Target Date: {target_date.strftime('%A, %B %d, %Y')}")
+    if args.dry_run:
+        print("BS: *** DRY RUN MODE ENABLED - NO BOOKING WILL BE MAKING ***")
+
+    username, password = get_credentials()
+    # Resolve the driver once up front so workers all hit the cache instead of racing to write it
+    resolve_driver_path(refresh=args.refresh_driver)
+
+    race = FirstWinner()
+    futures = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for i, (room, hour, minute, ampm) in enumerate(candidates, 1):
+            job = argparse.Namespace(**vars(args))
+            job.room, job.hour, job.minute, job.ampm = room, hour, minute, ampm
+            # Each worker sticks to its own candidate; the race is the fallback
+            job.fallback = "none"
+            job.headless = True
+            job.refresh_driver = False
+            # Chrome can't share a user-data-dir between processes
+            if args.profile_dir:
+                job.profile_dir = f"{args.profile_dir}-w{i}"
+            futures.append(pool.submit(run_worker, f"w{i} {room}", job, target_date, username, password, race))
+        results = [f.result() for f in futures]
+
+    print("\n--- Parallel Results ---")
+    print(f"{'Worker':<10}  {'Start':<8}  {'Seconds':>7}  Result")
+    for r in results:
+        print(f"{r['worker']:<10}  {r['start']:<8}  {r['seconds']:>7.2f}  {r['result']}")
+    print(f"Winner: {race.winner or 'none'}")
+    print("Done.")
+    return next((r["room"] for r in results if r["result"] == "won"), None)
@@ -0,0 +1,240 @@
+"""
+Multi-week booking planner: turns a weekly goal into the best set of bookings the current availability
+allows, and writes it as a job list for batch mode.
+
+    python planner.py --days mon-fri --window 1:00PM-6:00PM --hours 3 --room 464,466,468 --out plan.json
+    python book_room.py --batch plan.json
+
+Each day is planned on its own, since LibCal's limits are per day: a weighted interval scheduling DP over
+the day's slots picks non-overlapping bookings that get as close to the goal as possible, then favour
+preferred rooms, then fewer and longer bookings, within the daily limits on minutes and bookings.
+"""
+import os
+import csv
+import json
+import time
+import argparse
+import datetime
+from slot_index import Slot, SlotIndex, parse_room_list
+from batch import parse_job_time
+from libcal_http import LIBCAL_URL
+
+DAY_NAMES = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+
+# Objective weights: minutes booked dominate, then room preference (per slot), then fewer bookings
+MINUTE_WEIGHT = 1000
+BOOKING_PENALTY = 50
+
+def parse_days(spec):
+    """"mon-fri", "weekdays", "mon,wed,fri" or "all" -> set of weekday numbers (Monday is 0)."""
+    spec = spec.strip().lower()
+    if spec in ("all", "daily"):
+        return set(range(7))
+    if spec == "weekdays":
+        return set(range(5))
+    if spec == "weekends":
+        return {5, 6}
+    days = set()
+    for part in spec.split(","):
+        first, _, last = part.strip().partition("-")
+        start, end = DAY_NAMES.index(first[:3]), DAY_NAMES.index((last or first)[:3])
+        days.update(range(start, end + 1) if start <= end else list(range(start, 7)) + list(range(end + 1)))
+    return days
+
+def parse_window(spec):
+    """"1:00PM-6:00PM" -> (780, 1080), minutes after midnight."""
+    start, end = spec.split("-")
+    return tuple(h % 12 * 60 + (720 if ampm == "PM" else 0) + m
+                 for h, m, ampm in (parse_job_time(start), parse_job_time(end)))
+
+def format_start(minutes):
+    hour, minute = divmod(minutes, 60)
+    return f"{hour % 12 or 12}:{minute:02d}{'PM' if hour >= 12 else 'AM'}"
+
+class Goal:
+    """What to aim for on each planned day, and the limits LibCal enforces."""
+
+    def __init__(self, days, window, minutes, rooms, fallback="any", min_minutes=60, max_minutes=180,
+                 daily_limit=180, daily_bookings=2):
+        self.days = days
+        self.window = window
+        self.minutes = minutes
+        self.rooms = rooms
+        self.fallback = fallback
+        self.min_minutes = min_minutes
+        self.max_minutes = max_minutes
+        self.daily_limit = daily_limit
+        self.daily_bookings = daily_bookings
+
+    def room_scores(self, index):
+        """Per-slot bonus for each room that may be used: 100 for the first preference, 10 less for each next one."""
+        scores = {room: max(100 - 10 * rank, 10) for rank, room in enumerate(self.rooms)}
+        if self.fallback != "none":
+            for room in index.rooms:
+                scores.setdefault(room, 0)
+        return scores
+
+def best_blocks(index, goal, lo, step, slots):
+    """
+    best[t][n]: (weight, room) of the best room free for n slots from slot t of the window starting at lo,
+    or None. Only the best room per (start, length) can be part of an optimal plan, so the DP never sees rooms.
+    """
+    min_n = max(1, -(-goal.min_minutes // step))
+    max_n = goal.max_minutes // step
+    best = [[None] * (max_n + 1) for _ in range(slots)]
+    for room, score in goal.room_scores(index).items():
+        run = 0
+        for t in range(slots - 1, -1, -1):
+            slot = index.slots.get((room, lo + t * step))
+            run = run + 1 if slot is not None and slot.available else 0
+            for n in range(min_n, min(run, max_n) + 1):
+                weight = n * step * MINUTE_WEIGHT + n * score - BOOKING_PENALTY
+                if best[t][n] is None or weight > best[t][n][0]:
+                    best[t][n] = (weight, room)
+    return best
+
+def plan_day(index, goal, earliest=0):
+    """The day's bookings as (room, start minutes, minutes), ordered by start, none before `earliest`."""
+    if not len(index):
+        return []
+    step = index.granularity()
+    lo, hi = goal.window
+    lo += max(0, -(-(earliest - lo) // step)) * step
+    slots = max(0, (hi - lo) // step)
+    cap = min(goal.minutes, goal.daily_limit) // step
+    bookings = goal.daily_bookings
+    best = best_blocks(index, goal, lo, step, slots)
+
+    # value[t][k][m]: best weight from slot t on with k bookings and m slots already used
+    value = [[[0] * (cap + 1) for _ in range(bookings + 1)] for _ in range(slots + 1)]
+    choice = [[[0] * (cap + 1) for _ in range(bookings + 1)] for _ in range(slots + 1)]
+    for t in range(slots - 1, -1, -1):
+        blocks = [(n, block) for n, block in enumerate(best[t]) if block]
+        here, later = value[t], value[t + 1]
+        for k in range(bookings + 1):
+            for m in range(cap + 1):
+                top, pick = later[k][m], 0
+                if k < bookings:
+                    for n, (weight, _) in blocks:
+                        if m + n > cap:
+                            break
+                        candidate = weight + value[t + n][k + 1][m + n]
+                        if candidate > top:
+                            top, pick = candidate, n
+                here[k][m], choice[t][k][m] = top, pick
+
+    plan, t, k, m = [], 0, 0, 0
+    while t < slots:
+        n = choice[t][k][m]
+        if n:
+            plan.append((best[t][n][1], lo + t * step, n * step))
+            t, k, m = t + n, k + 1, m + n
+        else:
+            t += 1
+    return plan
+
+def plan_bookings(snapshots, goal, now=None):
+    """{date: SlotIndex} -> batch jobs ({"date", "room", "start", "duration"}) for the goal's days after `now`."""
+    now = now or datetime.datetime.now()
+    jobs = []
+    for date in sorted(snapshots):
+        if date.weekday() not in goal.days or date < now.date():
+            continue
+        earliest = now.hour * 60 + now.minute + 1 if date == now.date() else 0
+        for room, start, minutes in plan_day(snapshots[date], goal, earliest):
+            jobs.append({"date": date.isoformat(), "room": room, "start": format_start(start), "duration": minutes})
+    return jobs
+
+def fetch_snapshots(libcal_url, dates):
+    """Availability for each date over HTTP (no login needed). Dates LibCal can't show are skipped."""
+    import requests
+    from libcal_http import LibCalHttpEngine, BookingError, index_slots
+    engine = LibCalHttpEngine(libcal_url)
+    snapshots = {}
+    for date in dates:
+        try:
+            snapshots[date] = index_slots(engine.fetch_availability(date))
+        except (requests.RequestException, BookingError, ValueError) as e:
+            print(f"WARNING: No availability for {date}: {e}")
+    return snapshots
+
+def save_snapshots(path, snapshots):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({date.isoformat(): [[s.room, s.time_str, s.available] for s in index.slots.values()]
+                   for date, index in snapshots.items()}, f)
+
+def load_snapshots(path):
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return {datetime.date.fromisoformat(date): SlotIndex(Slot(*row) for row in rows) for date, rows in data.items()}
+
+def write_jobs(path, jobs):
+    """JSON, or CSV if the path ends in .csv; both are what batch.load_jobs reads."""
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        if path.lower().endswith(".csv"):
+            writer = csv.DictWriter(f, fieldnames=["date", "room", "start", "duration"])
+            writer.writeheader()
+            writer.writerows(jobs)
+        else:
+            json.dump(jobs, f, indent=2)
+
+def format_plan(jobs, goal):
+    header = f"{'Date':<10}  {'Day':<3}  {'Start':<7}  {'Room':<6}  {'Mins':>4}"
+    lines = [header, "-" * len(header)]
+    per_day = {}
+    for job in jobs:
+        day = datetime.date.fromisoformat(job["date"])
+        lines.append(f"{job['date']:<10}  {DAY_NAMES[day.weekday()].title():<3}  {job['start']:<7}  {job['room']:<6}  {job['duration']:>4}")
+        per_day[job["date"]] = per_day.get(job["date"], 0) + job["duration"]
+    short = [d for d, minutes in per_day.items() if minutes < goal.minutes]
+    lines.append("-" * len(header))
+    lines.append(f"{len(jobs)} bookings, {sum(per_day.values()) / 60:.1f} h over {len(per_day)} days"
+                 + (f"; under the goal on {', '.join(short)}" if short else ""))
+    return "\n".join(lines)
+
+def main(argv=None):
+    from book_room import DAYS_AHEAD
+    parser = argparse.ArgumentParser(description="Plan bookings for a weekly goal and write a batch job list")
+    parser.add_argument("--days", default="mon-fri", help="Days to book: mon-fri, weekdays, mon,wed,fri, all")
+    parser.add_argument("--window", default="1:00PM-6:00PM", help="Time window bookings must fall in")
+    parser.add_argument("--hours", default=3, type=float, help="Hours wanted on each of those days")
+    parser.add_argument("--room", default=os.environ.get("TARGET_ROOM", "464"), help="Preferred rooms in order (e.g. 464,466,468)")
+    parser.add_argument("--fallback", default="any", choices=["any", "none"], help="Use other rooms when the preferred ones can't cover the goal")
+    parser.add_argument("--min-duration", default=60, type=int, help="Shortest booking worth making (minutes)")
+    parser.add_argument("--max-duration", default=180, type=int, help="Longest booking LibCal allows (minutes)")
+    parser.add_argument("--daily-limit", default=180, type=int, help="Most minutes LibCal lets you book per day")
+    parser.add_argument("--daily-bookings", default=2, type=int, help="Most bookings per day")
+    parser.add_argument("--horizon", default=DAYS_AHEAD, type=int, help="Days ahead to plan (LibCal releases 7 days ahead)")
+    parser.add_argument("--libcal-url", default=os.environ.get("LIBCAL_URL", LIBCAL_URL))
+    parser.add_argument("--snapshots", help="Plan from availability saved with --save-snapshots instead of fetching it")
+    parser.add_argument("--save-snapshots", help="Save the fetched availability to this JSON file")
+    parser.add_argument("--out", default="plan.json", help="Job list for book_room.py --batch (.json or .csv)")
+    args = parser.parse_args(argv)
+    if min(args.hours * 60, args.daily_limit) < args.min_duration:
+        parser.error(f"--hours and --daily-limit must allow at least one --min-duration ({args.min_duration} minute) booking")
+
+    goal = Goal(parse_days(args.days), parse_window(args.window), int(args.hours * 60), parse_room_list(args.room),
+                args.fallback, args.min_duration, args.max_duration, args.daily_limit, args.daily_bookings)
+    if args.snapshots:
+        snapshots = load_snapshots(args.snapshots)
+    else:
+        today = datetime.date.today()
+        dates = [today + datetime.timedelta(days=i) for i in range(args.horizon + 1)]
+        dates = [d for d in dates if d.weekday() in goal.days]
+        print(f"Fetching availability for {len(dates)} days from {args.libcal_url}...")
+        snapshots = fetch_snapshots(args.libcal_url, dates)
+        if args.save_snapshots:
+            save_snapshots(args.save_snapshots, snapshots)
+
+    start = time.perf_counter()
+    jobs = plan_bookings(snapshots, goal)
+    elapsed = time.perf_counter() - start
+    slots = sum(len(index) for index in snapshots.values())
+    print(f"Planned {len(snapshots)} days ({slots} slots) in {elapsed * 1000:.0f} ms\n")
+    print(format_plan(jobs, goal))
+    write_jobs(args.out, jobs)
+    print(f"\nWrote {len(jobs)} jobs to {args.out}. Book them with: python book_room.py --batch {args.out}")
+    return jobs
+
+if __name__ == "__main__":
+    main()
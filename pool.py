@@ -0,0 +1,378 @@
+"""
+Warm browser pool: keeps N headless browsers launched, logged in and parked on the LibCal grid,
+and books jobs sent to a local HTTP API, so a booking skips Chrome startup and SSO entirely.
+
+    python pool.py --size 2 --lean                 # start the pool (credentials from the environment)
+    python book_room.py --room 464 --hour 3        # submits to the pool automatically when it's running
+    curl localhost:8770/health
+"""
+import os
+import json
+import time
+import queue
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import requests
+
+POOL_URL = os.environ.get("BOOKING_POOL_URL", "http://127.0.0.1:8770")
+
+# Job fields the pool accepts; everything else about the browser is fixed when the pool starts
+JOB_FIELDS = {"room", "hour", "minute", "ampm", "duration", "fallback", "full_duration", "dry_run", "date",
+              "stage_attempts"}
+
+# Whole-number job fields and their (min, max); None means no bound
+INT_FIELDS = {"hour": (1, 12), "minute": (0, 59), "duration": (1, None), "stage_attempts": (1, None)}
+
+# Recycle reason for a browser whose LibCal cart may still hold a job's slot
+CART_PROBLEM = "cart cleanup failed"
+
+def parse_job_fields(fields):
+    """
+    The job fields of a /book request, converted to what book_room.py's parser would give. Others are
+    dropped. Raises ValueError naming the first bad field.
+    """
+    from batch import parse_job_date
+    from slot_index import FALLBACK_RULES
+    job = {}
+    for key, value in fields.items():
+        if key not in JOB_FIELDS:
+            continue
+        if key == "stage_attempts" and value is None:
+            job[key] = None
+        elif key in INT_FIELDS:
+            try:
+                number = int(str(value).strip())
+            except ValueError:
+                raise ValueError(f"{key} must be a whole number, not {value!r}")
+            low, high = INT_FIELDS[key]
+            if number < low or (high is not None and number > high):
+                raise ValueError(f"{key} must be between {low} and {high}" if high is not None else f"{key} must be at least {low}")
+            job[key] = number
+        elif key == "ampm":
+            if str(value).upper() not in ("AM", "PM"):
+                raise ValueError(f"ampm must be AM or PM, not {value!r}")
+            job[key] = str(value).upper()
+        elif key == "fallback":
+            if value not in FALLBACK_RULES:
+                raise ValueError(f"fallback must be one of {', '.join(FALLBACK_RULES)}")
+            job[key] = value
+        elif key in ("full_duration", "dry_run"):
+            if not isinstance(value, bool):
+                raise ValueError(f"{key} must be true or false")
+            job[key] = value
+        elif key == "room":
+            job[key] = ",".join(str(r) for r in value) if isinstance(value, list) else str(value)
+            if not job[key].strip():
+                raise ValueError("room must not be empty")
+        elif key == "date":
+            try:
+                parse_job_date(value or "")
+            except ValueError:
+                raise ValueError(f"date must be YYYY-MM-DD or +N, not {value!r}")
+            job[key] = value
+    return job
+
+def pool_available(url=POOL_URL, timeout=0.3):
+    """True if a pool is answering at `url`."""
+    try:
+        return requests.get(url + "/health", timeout=timeout).ok
+    except requests.RequestException:
+        return False
+
+def submit_to_pool(args):
+    """Client mode: sends this booking to the running pool and prints its result. Returns the booked room."""
+    from stage_timer import StageTimer
+    from book_room import report_timings
+    print(f"--- Carleton Library Room Booker (POOL at {args.pool_url}) ---")
+    print(f"Configuration: Room={args.room}, Time={args.hour}:{args.minute:02d} {args.ampm}, Duration={args.duration} mins")
+    job = {key: value for key, value in vars(args).items() if key in JOB_FIELDS}
+    timer = StageTimer()
+    start = time.perf_counter()
+    try:
+        resp = requests.post(args.pool_url + "/book", json=job, timeout=600)
+        result = resp.json()
+    except (requests.RequestException, ValueError) as e:
+        print(f"An error occurred: {e}")
+        return None
+    print(f"Pool browser {result.get('browser')}: {result.get('result')} in {time.perf_counter() - start:.2f}s")
+    if result.get("error"):
+        print(f"An error occurred: {result['error']}")
+    timer.stages = result.get("stages", [])
+    report_timings(timer, args)
+    print("Done.")
+    return result.get("room")
+
+class PooledBrowser:
+    def __init__(self, number):
+        self.number = number
+        self.driver = None
+        self.wait = None
+        self.grid_url = None
+        self.started = 0.0
+        self.jobs = 0
+        self.base_rss_mb = 0.0
+
+class BrowserPool:
+    """
+    `size` warm browsers. A browser is recycled (quit and relaunched, which logs in again) when it stops
+    answering, its JS heap passes max_heap_mb, its processes have grown by more than max_growth_mb of
+    RSS since launch, it has run max_jobs bookings, or it is older than max_age, after which the SSO
+    session may have expired.
+    """
+
+    def __init__(self, args, size, username, password, max_heap_mb=400, max_jobs=25, max_age=4 * 3600,
+                 max_growth_mb=300):
+        self.args = args
+        self.size = size
+        self.username = username
+        self.password = password
+        self.max_heap_mb = max_heap_mb
+        self.max_growth_mb = max_growth_mb
+        self.max_jobs = max_jobs
+        self.max_age = max_age
+        self.idle = queue.Queue()
+        self.browsers = [PooledBrowser(i + 1) for i in range(size)]
+        self.stats = {"jobs": 0, "booked": 0, "recycled": 0}
+        self._lock = threading.Lock()
+
+    def launch(self, browser):
+        from selenium.webdriver.support.ui import WebDriverWait
+        from book_room import create_driver, open_libcal
+        from armed import warm_up_session
+        start = time.perf_counter()
+        browser.driver = create_driver(self.args)
+        browser.wait = WebDriverWait(browser.driver, 10, poll_frequency=0.1)
+        open_libcal(browser.driver, browser.wait, self.args)
+        browser.grid_url = browser.driver.current_url
+        warm_up_session(browser.driver, browser.wait, self.username, self.password, browser.grid_url)
+        browser.started = time.monotonic()
+        browser.jobs = 0
+        browser.base_rss_mb = self.rss_mb(browser)
+        print(f"[pool] Browser {browser.number} ready in {time.perf_counter() - start:.1f}s")
+
+    def start(self):
+        for browser in self.browsers:
+            self.launch(browser)
+            self.idle.put(browser)
+        threading.Thread(target=self.maintain, daemon=True).start()
+
+    def heap_mb(self, browser):
+        used = browser.driver.execute_script("return performance.memory ? performance.memory.usedJSHeapSize : 0;")
+        return (used or 0) / 2 ** 20
+
+    def rss_mb(self, browser):
+        """RSS of the browser's whole ChromeDriver/Chrome process tree, or 0 where it can't be sampled."""
+        from memory_sampler import can_sample, process_tree_rss
+        process = getattr(browser.driver.service, "process", None)
+        if not process or not can_sample():
+            return 0.0
+        return process_tree_rss(process.pid)[0]
+
+    def health_problem(self, browser):
+        """Why `browser` should be recycled, or None if it's fine."""
+        from selenium.common.exceptions import WebDriverException
+        if browser.jobs >= self.max_jobs:
+            return f"{browser.jobs} jobs"
+        if time.monotonic() - browser.started > self.max_age:
+            return "session age"
+        try:
+            heap = self.heap_mb(browser)
+        except WebDriverException as e:
+            return f"not responding ({e.msg})"
+        if heap > self.max_heap_mb:
+            return f"JS heap {heap:.0f} MB"
+        # The JS heap misses renderer caches, GPU and network process growth; the process tree's RSS doesn't
+        rss = self.rss_mb(browser)
+        if browser.base_rss_mb and rss - browser.base_rss_mb > self.max_growth_mb:
+            return f"RSS grew {rss - browser.base_rss_mb:.0f} MB to {rss:.0f} MB"
+        return None
+
+    def recycle(self, browser, reason, clear_cookies=False):
+        from selenium.common.exceptions import WebDriverException
+        print(f"[pool] Recycling browser {browser.number}: {reason}")
+        try:
+            if clear_cookies:
+                # The LibCal session (and so its cart) would otherwise survive in a persistent --profile-dir
+                browser.driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+            browser.driver.quit()
+        except WebDriverException:
+            pass
+        with self._lock:
+            self.stats["recycled"] += 1
+        self.launch(browser)
+
+    def checkin(self, browser, problem=None):
+        """Returns a browser to the pool. `problem` forces a recycle; otherwise its health decides."""
+        dirty_cart = problem == CART_PROBLEM
+        problem = problem or self.health_problem(browser)
+        if problem:
+            try:
+                self.recycle(browser, problem, clear_cookies=dirty_cart)
+            except Exception as e:
+                # Keep the slot; the maintenance loop tries again
+                print(f"[pool] Relaunch of browser {browser.number} failed: {e}")
+                browser.driver = None
+        self.idle.put(browser)
+
+    def maintain(self, interval=60):
+        """Health-checks idle browsers in the background so a job never gets a dead one."""
+        while True:
+            time.sleep(interval)
+            for _ in range(self.idle.qsize()):
+                try:
+                    browser = self.idle.get_nowait()
+                except queue.Empty:
+                    break
+                if browser.driver is None:
+                    try:
+                        self.launch(browser)
+                    except Exception as e:
+                        print(f"[pool] Relaunch of browser {browser.number} failed: {e}")
+                    self.idle.put(browser)
+                else:
+                    self.checkin(browser)
+
+    def book(self, fields, timeout=120):
+        """Runs one booking on a warm browser. `fields` come from parse_job_fields. Returns a JSON-able result dict."""
+        from book_room import wait_for_page_ready
+        from batch import parse_job_date
+        from checkpoint import BookingState, book_in_session
+        from stage_timer import StageTimer
+
+        job = argparse.Namespace(**vars(self.args))
+        for key, value in fields.items():
+            if key in JOB_FIELDS and key != "date":
+                setattr(job, key, value)
+        target_date = parse_job_date(fields.get("date") or "")
+
+        try:
+            browser = self.idle.get(timeout=timeout)
+        except queue.Empty:
+            return {"result": "busy", "error": f"No browser free within {timeout}s", "room": None}
+        if browser.driver is None:
+            try:
+                self.launch(browser)
+            except Exception as e:
+                self.idle.put(browser)
+                return {"result": "error", "error": f"Browser {browser.number} could not be relaunched: {e}", "room": None}
+        timer = StageTimer()
+        timer.track_commands(browser.driver.command_counter)
+        result = {"browser": browser.number, "date": target_date.isoformat(), "room": None, "result": "no slot"}
+        state = None
+        try:
+            with timer.stage("navigate"):
+                browser.driver.get(browser.grid_url)
+                wait_for_page_ready(browser.driver)
+            state = BookingState(job, target_date, browser.driver.current_url, self.username, self.password)
+            # Takes this job's entry back out of LibCal's cart unless it was booked, so the next job on this
+            # browser doesn't submit it along with its own
+            result["room"] = book_in_session(browser.driver, browser.wait, state, timer, max_attempts=job.stage_attempts)
+            if result["room"]:
+                result["result"] = "dry-run ok" if job.dry_run else "booked"
+            elif state.outcome == "unknown":
+                result["result"] = "unknown"
+        except Exception as e:
+            result["result"] = "error"
+            result["error"] = f"{type(e).__name__}: {e}"
+        finally:
+            browser.jobs += 1
+            with self._lock:
+                self.stats["jobs"] += 1
+                self.stats["booked"] += bool(result["room"])
+            result["seconds"] = timer.total()
+            result["stages"] = timer.stages
+            # A cart that couldn't be emptied would leak into the next job, so start that browser afresh
+            problem = CART_PROBLEM if state is not None and not state.cart_clean else None
+            threading.Thread(target=self.checkin, args=(browser, problem), daemon=True).start()
+        return result
+
+    def status(self):
+        now = time.monotonic()
+        return {
+            "size": self.size,
+            "idle": self.idle.qsize(),
+            **self.stats,
+            "browsers": [{"number": b.number, "jobs": b.jobs, "age_s": round(now - b.started) if b.started else None,
+                          "alive": b.driver is not None} for b in self.browsers],
+        }
+
+def make_handler(pool):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, fmt, *args):
+            pass
+
+        def send_json(self, obj, status=200):
+            body = json.dumps(obj, default=str).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/health":
+                self.send_json(pool.status())
+            else:
+                self.send_json({"error": "not found"}, 404)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            try:
+                fields = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError:
+                self.send_json({"error": "body must be JSON"}, 400)
+                return
+            if not isinstance(fields, dict):
+                self.send_json({"error": "body must be a JSON object"}, 400)
+                return
+            if self.path != "/book":
+                self.send_json({"error": "not found"}, 404)
+                return
+            try:
+                fields = parse_job_fields(fields)
+            except ValueError as e:
+                self.send_json({"error": str(e)}, 400)
+                return
+            print(f"[pool] Job: {fields}")
+            result = pool.book(fields)
+            print(f"[pool] Result: {result['result']} ({result.get('room') or '-'}) in {result.get('seconds', 0):.2f}s")
+            self.send_json(result, 503 if result["result"] == "busy" else 200)
+
+    return Handler
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Warm browser pool for the room booker")
+    parser.add_argument("--size", default=2, type=int, help="Browsers to keep warm")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", default=8770, type=int)
+    parser.add_argument("--max-heap-mb", default=400, type=float, help="Recycle a browser whose JS heap grows past this")
+    parser.add_argument("--max-rss-growth-mb", default=300, type=float, help="Recycle a browser whose processes' RSS has grown this much since launch")
+    parser.add_argument("--max-jobs", default=25, type=int, help="Recycle a browser after this many bookings")
+    parser.add_argument("--max-age", default=4 * 3600, type=float, help="Recycle (and log in again) after this many seconds")
+    # Anything else is passed to book_room.py's parser for the browsers (e.g. --lean); headless is implied
+    pool_args, passthrough = parser.parse_known_args(argv)
+
+    from book_room import parse_arguments, get_credentials
+    args = parse_arguments(["--headless"] + passthrough)
+    username, password = get_credentials()
+
+    pool = BrowserPool(args, pool_args.size, username, password,
+                       pool_args.max_heap_mb, pool_args.max_jobs, pool_args.max_age, pool_args.max_rss_growth_mb)
+    print(f"--- Browser pool: starting {pool_args.size} browsers ---")
+    pool.start()
+    server = ThreadingHTTPServer((pool_args.host, pool_args.port), make_handler(pool))
+    server.daemon_threads = True
+    print(f"Pool listening on http://{pool_args.host}:{pool_args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Stopping pool...")
+    finally:
+        server.server_close()
+        for browser in pool.browsers:
+            if browser.driver:
+                browser.driver.quit()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,312 @@
+"""
+Record a real dry-run booking session and replay it offline.
+
+    python book_room.py --dry-run --headless --record session.replay.json.gz   # record (implies --dry-run)
+    python replay.py session.replay.json.gz --run                              # replay and check it
+    python replay.py session.replay.json.gz --port 8790                        # just serve it
+
+A bundle is one gzip'd JSON file: the network exchanges (documents, XHR/fetch, scripts and
+stylesheets) and a DOM snapshot at the end of every stage, with credentials and SSO tokens scrubbed.
+The replay server serves every recorded host under /_h/<host>/ and rewrites links to match.
+"""
+import re
+import sys
+import json
+import gzip
+import base64
+import argparse
+import datetime
+import threading
+from urllib.parse import urlsplit
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BUNDLE_VERSION = 1
+RECORDED_TYPES = {"Document", "XHR", "Fetch", "Script", "Stylesheet"}
+SCRUBBED = "SCRUBBED"
+REPLAY_USER = "replay-user"
+REPLAY_PASS = "replay-pass"
+
+# Hidden fields that carry SSO assertions or session secrets
+SECRET_FIELD_RE = re.compile(r'(name="(?:SAMLResponse|SAMLRequest|RelayState|wresult|wctx|__RequestVerificationToken)"\s+value=")[^"]*(")', re.I)
+SECRET_PARAM_RE = re.compile(r"((?:^|&)(?:SAMLResponse|SAMLRequest|RelayState|wresult|wctx|UserName|Password|__RequestVerificationToken)=)[^&]*", re.I)
+
+def scrub(text, secrets):
+    """Removes the credentials and SSO tokens from a body, URL or form post."""
+    if not text:
+        return text
+    for secret in secrets:
+        if secret:
+            text = text.replace(secret, SCRUBBED)
+    text = SECRET_FIELD_RE.sub(rf"\g<1>{SCRUBBED}\g<2>", text)
+    return SECRET_PARAM_RE.sub(rf"\g<1>{SCRUBBED}", text)
+
+def load_bundle(path):
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        bundle = json.load(f)
+    if bundle.get("version") != BUNDLE_VERSION:
+        raise ValueError(f"{path} is bundle version {bundle.get('version')}, expected {BUNDLE_VERSION}")
+    return bundle
+
+class SessionRecorder:
+    """
+    Collects network exchanges from Chrome's performance log and a DOM snapshot whenever a StageTimer
+    stage ends. The driver must be created with performance logging on (chrome_options does this for --record).
+    """
+
+    def __init__(self, args, username, password):
+        self.args = args
+        self.secrets = [s for s in (password, username) if s]
+        self.driver = None
+        self.exchanges = []
+        self.dom = []
+        self._pending = {}
+
+    def attach(self, driver, timer):
+        self.driver = driver
+        # Large buffers so bodies are still there when the stage ends
+        driver.execute_cdp_cmd("Network.enable", {"maxTotalBufferSize": 200 * 2 ** 20, "maxResourceBufferSize": 20 * 2 ** 20})
+        timer.listeners.append(self.capture_stage)
+
+    def capture_stage(self, record):
+        try:
+            self.drain_log(record["stage"])
+            self.dom.append({"stage": record["stage"], "url": scrub(self.driver.current_url, self.secrets),
+                             "html": scrub(self.driver.page_source, self.secrets)})
+            record["dom"] = len(self.dom) - 1
+        except Exception as e:
+            print(f"WARNING: Could not record stage '{record['stage']}': {e}")
+
+    def add_exchange(self, request, status, headers, body, base64_encoded, stage):
+        headers = {k.lower(): v for k, v in (headers or {}).items()}
+        self.exchanges.append({
+            "stage": stage,
+            "method": request["method"],
+            "url": scrub(request["url"], self.secrets),
+            "post_data": scrub(request.get("post_data"), self.secrets),
+            "status": status,
+            "content_type": headers.get("content-type", ""),
+            "location": scrub(headers.get("location"), self.secrets),
+            "body": body if base64_encoded else scrub(body, self.secrets),
+            "base64": base64_encoded,
+        })
+
+    def drain_log(self, stage):
+        for entry in self.driver.get_log("performance"):
+            message = json.loads(entry["message"])["message"]
+            method, params = message["method"], message.get("params", {})
+            if method == "Network.requestWillBeSent":
+                request = params["request"]
+                previous = self._pending.get(params["requestId"])
+                redirect = params.get("redirectResponse")
+                if previous and redirect:
+                    self.add_exchange(previous, redirect["status"], redirect.get("headers"), "", False, stage)
+                if request["url"].startswith("http") and params.get("type", "Document") in RECORDED_TYPES:
+                    self._pending[params["requestId"]] = {"method": request["method"], "url": request["url"],
+                                                          "post_data": request.get("postData")}
+            elif method == "Network.responseReceived" and params["requestId"] in self._pending:
+                response = params["response"]
+                self._pending[params["requestId"]].update(status=response["status"], headers=response.get("headers"))
+            elif method == "Network.loadingFinished" and params["requestId"] in self._pending:
+                request = self._pending.pop(params["requestId"])
+                try:
+                    result = self.driver.execute_cdp_cmd("Network.getResponseBody", {"requestId": params["requestId"]})
+                    body, encoded = result.get("body", ""), result.get("base64Encoded", False)
+                except Exception:
+                    body, encoded = None, False  # evicted, e.g. a page that redirected straight away
+                self.add_exchange(request, request.get("status", 200), request.get("headers"), body, encoded, stage)
+
+    def save(self, path, timer):
+        bundle = {
+            "version": BUNDLE_VERSION,
+            "recorded_at": datetime.datetime.now().isoformat(timespec="seconds"),
+            "library_url": self.args.library_url,
+            "libcal_url": self.args.libcal_url,
+            "booking": {key: getattr(self.args, key) for key in ("room", "hour", "minute", "ampm", "duration", "fallback")},
+            "stages": timer.stages,
+            "dom": self.dom,
+            "exchanges": self.exchanges,
+        }
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            json.dump(bundle, f, separators=(",", ":"))
+        missing = sum(1 for e in self.exchanges if e["body"] is None)
+        print(f"Recorded {len(self.exchanges)} responses ({missing} without a body) and {len(self.dom)} DOM snapshots to {path}")
+
+class ReplayServer:
+    """
+    Serves a bundle's responses. Requests match on host, method and path; among several candidates the
+    one with the same query and body wins, otherwise they are served in recorded order (then the last
+    one again), so dates and checksums that differ between runs still line up.
+    """
+
+    def __init__(self, bundle, host="127.0.0.1", port=0):
+        self.bundle = bundle
+        self.by_key = {}
+        self.hosts = set()
+        for e in bundle["exchanges"]:
+            parts = urlsplit(e["url"])
+            self.hosts.add((parts.scheme, parts.netloc))
+            self.by_key.setdefault((parts.netloc, e["method"], parts.path), []).append(e)
+        self.served = {}
+        self.misses = []
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self.make_handler())
+        self.server.daemon_threads = True
+        self.base = f"http://{host}:{self.server.server_address[1]}"
+
+    def local_url(self, url):
+        parts = urlsplit(url)
+        return f"{self.base}/_h/{parts.netloc}{parts.path or '/'}" + (f"?{parts.query}" if parts.query else "")
+
+    def rewrite(self, text):
+        for scheme, netloc in self.hosts:
+            local = f"{self.base}/_h/{netloc}"
+            text = text.replace(f"{scheme}://{netloc}", local)
+            text = text.replace(f"{scheme}:\\/\\/{netloc}", local.replace("/", "\\/"))
+            text = text.replace(f"//{netloc}", local[len("http:"):])
+        return text
+
+    def match(self, netloc, method, path, query, body):
+        candidates = self.by_key.get((netloc, method, path))
+        if not candidates:
+            return None
+        with self._lock:
+            exact = [e for e in candidates if urlsplit(e["url"]).query == query and (e["post_data"] or "") == body]
+            if len(exact) == 1:
+                return exact[0]
+            used = self.served.get((netloc, method, path), 0)
+            self.served[(netloc, method, path)] = used + 1
+        return candidates[min(used, len(candidates) - 1)]
+
+    def make_handler(self):
+        replay = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, fmt, *args):
+                pass
+
+            def route(self, method):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length).decode("utf-8", "replace") if length else ""
+                parts = urlsplit(self.path)
+                if parts.path.startswith("/_h/"):
+                    netloc, _, rest = parts.path[len("/_h/"):].partition("/")
+                    path = "/" + rest
+                else:
+                    # Root-relative request from a replayed page: same host as the page that made it
+                    referer = urlsplit(self.headers.get("Referer", "")).path
+                    netloc = referer[len("/_h/"):].split("/", 1)[0] if referer.startswith("/_h/") else ""
+                    path = parts.path
+                    if not netloc:
+                        netloc = next((h for h, m, p in replay.by_key if m == method and p == path), "")
+                exchange = replay.match(netloc, method, path, parts.query, body)
+                if exchange is None or exchange["body"] is None and not exchange["location"]:
+                    replay.misses.append(f"{method} {netloc}{path}")
+                    self.send_bytes(404, "text/plain", b"not recorded")
+                    return
+                payload = base64.b64decode(exchange["body"]) if exchange["base64"] else \
+                    replay.rewrite(exchange["body"] or "").encode("utf-8")
+                location = replay.rewrite(exchange["location"]) if exchange["location"] else None
+                self.send_bytes(exchange["status"], exchange["content_type"] or "text/html", payload, location)
+
+            def send_bytes(self, status, content_type, payload, location=None):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(payload)))
+                self.send_header("Cache-Control", "no-store")
+                if location:
+                    self.send_header("Location", location)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                self.route("GET")
+
+            def do_POST(self):
+                self.route("POST")
+
+        return Handler
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+
+def run_replay(bundle, replay, passthrough):
+    """Runs the dry-run flow against the replay server. Returns (booked room, replay timings)."""
+    import os
+    import tempfile
+    import site_cache
+    from book_room import parse_arguments, book_room
+    os.environ.setdefault("CARLETON_USER", REPLAY_USER)
+    os.environ.setdefault("CARLETON_PASS", REPLAY_PASS)
+    b = bundle["booking"]
+    args = parse_arguments([
+        "--headless", "--dry-run", "--no-history", "--no-pool",
+        "--library-url", replay.local_url(bundle["library_url"]), "--libcal-url", replay.local_url(bundle["libcal_url"]),
+        "--room", b["room"], "--hour", str(b["hour"]), "--minute", str(b["minute"]), "--ampm", b["ampm"],
+        "--duration", str(b["duration"]), "--fallback", b["fallback"],
+    ] + passthrough)
+    with tempfile.TemporaryDirectory() as tmp:
+        # Replays start from the library page like the recording did, not from the site cache
+        site_cache.SITE_CACHE_FILE = os.path.join(tmp, "site_cache.json")
+        args.timings_json = os.path.join(tmp, "replay.json")
+        room = book_room(args)
+        with open(args.timings_json, "r", encoding="utf-8") as f:
+            return room, json.load(f)
+
+def compare_stages(recorded, replayed):
+    """Per stage: recorded vs replayed duration and status. Returns (table, ok)."""
+    def last_by_stage(stages):
+        return {s["stage"]: s for s in stages}
+    rec, rep = last_by_stage(recorded), last_by_stage(replayed)
+    width = max(len("Stage"), max((len(name) for name in rec), default=0))
+    lines = [f"{'Stage':<{width}}  {'Recorded':>8}  {'Replay':>8}  Result", "-" * (width + 30)]
+    ok = True
+    for name, r in rec.items():
+        if r["status"] != "ok" or name == "startup":
+            continue
+        p = rep.get(name)
+        good = p is not None and p["status"] == "ok"
+        ok &= good
+        replay_s = f"{p['duration_s']:>8.3f}" if p else f"{'-':>8}"
+        lines.append(f"{name:<{width}}  {r['duration_s']:>8.3f}  {replay_s}  {'ok' if good else 'FAILED'}")
+    return "\n".join(lines), ok
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve a recorded booking session offline, and optionally replay it")
+    parser.add_argument("bundle", help="Bundle written by book_room.py --record")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", default=0, type=int)
+    parser.add_argument("--run", action="store_true", help="Run the dry-run flow against the replay and compare stages")
+    # Anything else is passed to book_room.py for --run (e.g. --lean)
+    args, passthrough = parser.parse_known_args(argv)
+
+    bundle = load_bundle(args.bundle)
+    replay = ReplayServer(bundle, args.host, args.port).start()
+    print(f"Replaying {args.bundle} (recorded {bundle['recorded_at']}, {len(bundle['exchanges'])} responses) on {replay.base}")
+    print(f"Library page: {replay.local_url(bundle['library_url'])}")
+
+    if not args.run:
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            replay.stop()
+        return 0
+
+    room, timings = run_replay(bundle, replay, passthrough)
+    replay.stop()
+    table, ok = compare_stages(bundle["stages"], timings["stages"])
+    print("\n--- Replay vs Recording ---")
+    print(table)
+    if replay.misses:
+        print(f"\n{len(replay.misses)} request(s) not in the recording, e.g. {', '.join(replay.misses[:5])}")
+    ok = ok and bool(room)
+    print(f"\nReplay {'PASSED' if ok else 'FAILED'}")
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,213 @@
+"""
+Local scheduler daemon: a precise replacement for the GitHub Actions cron. It books with the
+preferences saved by gui.py, at the release time in Ottawa time (EST or EDT), corrected for this
+machine's clock offset:
+
+    python scheduler.py                         # every day, with the GUI's preferences
+    python scheduler.py --once --fire-at 00:00 --time-source ntp://pool.ntp.org
+    python scheduler.py --once --time-source http://127.0.0.1:8765/time   # mock_libcal.py
+"""
+import os
+import time
+import socket
+import struct
+import datetime
+import argparse
+import email.utils
+from zoneinfo import ZoneInfo
+import requests
+import telemetry
+
+LIBRARY_TZ = ZoneInfo("America/Toronto")
+YAML_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".github", "workflows", "schedule_booking.yml")
+
+# Seconds between the NTP era (1900) and the Unix epoch
+NTP_EPOCH_DELTA = 2208988800
+# Wake this long before the fire instant and spin for the rest, since sleep() can overshoot by a few ms
+SPIN_SECONDS = 0.02
+
+def load_preferences(yaml_path=YAML_PATH):
+    """
+    Reads what BookingGUI saves: the workflow input defaults, and the cron line converted back to
+    the Eastern wall time the GUI showed (it writes cron as that time + 5h). Returns a dict.
+    """
+    import ruamel.yaml
+    with open(yaml_path, "r", encoding="utf-8") as f:
+        data = ruamel.yaml.YAML().load(f)
+    inputs = data.get("on", {}).get("workflow_dispatch", {}).get("inputs", {})
+    prefs = {key: str(inputs[key]["default"]) for key in
+             ("target_room", "start_hour", "start_minute", "start_ampm", "duration_minutes")
+             if key in inputs and "default" in inputs[key]}
+    schedules = data.get("on", {}).get("schedule", [])
+    if schedules and "cron" in schedules[0]:
+        minute, hour = (int(part) for part in schedules[0]["cron"].split()[:2])
+        prefs["fire_at"] = f"{(hour - 5) % 24:02d}:{minute:02d}"
+    return prefs
+
+def next_release(fire_at, now=None):
+    """The next instant the wall clock in Ottawa reads fire_at ("HH:MM"), as an aware datetime."""
+    now = now or datetime.datetime.now(LIBRARY_TZ)
+    hour, minute = (int(part) for part in fire_at.split(":"))
+    day = now.date()
+    while True:
+        # Built from the local date and time, so the UTC offset (EST -5 / EDT -4) is that day's
+        fire = datetime.datetime(day.year, day.month, day.day, hour, minute, tzinfo=LIBRARY_TZ)
+        if fire > now:
+            return fire
+        day += datetime.timedelta(days=1)
+
+def query_time_source(source, timeout=2.0):
+    """One reading of the reference clock. Returns (reference epoch, local send time, local receive time)."""
+    if source.startswith("ntp://"):
+        host, _, port = source[len("ntp://"):].partition(":")
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.settimeout(timeout)
+            sent = time.time()
+            sock.sendto(b"\x1b" + 47 * b"\0", (host, int(port or 123)))
+            packet = sock.recv(48)
+            received = time.time()
+        seconds, fraction = struct.unpack("!II", packet[40:48])  # transmit timestamp
+        return seconds - NTP_EPOCH_DELTA + fraction / 2 ** 32, sent, received
+
+    sent = time.time()
+    response = requests.get(source, timeout=timeout)
+    received = time.time()
+    try:
+        return float(response.json()["epoch"]), sent, received
+    except (ValueError, KeyError, TypeError):
+        # Any web server's Date header works too, at one-second resolution
+        return email.utils.parsedate_to_datetime(response.headers["Date"]).timestamp(), sent, received
+
+def measure_clock_offset(source, samples=5):
+    """
+    Seconds to add to time.time() to get the reference time, taken from the sample with the shortest
+    round trip (its midpoint is the best estimate of when the reference clock was read).
+    Returns (offset, round trip), or (0.0, None) if the source can't be reached.
+    """
+    best = None
+    for _ in range(samples):
+        try:
+            reference, sent, received = query_time_source(source)
+        except (OSError, requests.RequestException, KeyError, ValueError) as e:
+            print(f"WARNING: Time source {source} failed: {e}")
+            continue
+        rtt = received - sent
+        if best is None or rtt < best[1]:
+            best = (reference - (sent + received) / 2, rtt)
+    return best or (0.0, None)
+
+class PreciseClock:
+    """
+    Reference time from the monotonic clock: one (wall, monotonic) anchor taken at sync time, so
+    system clock steps during the wait don't move the deadline.
+    """
+
+    def __init__(self, source=None, samples=5):
+        self.source = source
+        self.samples = samples
+        self.offset = 0.0
+        self.rtt = None
+        self.sync()
+
+    def sync(self):
+        if self.source:
+            self.offset, self.rtt = measure_clock_offset(self.source, self.samples)
+        self._anchor_wall = time.time() + self.offset
+        self._anchor_mono = time.monotonic()
+        return self.offset
+
+    def now(self):
+        """Reference epoch seconds."""
+        return self._anchor_wall + (time.monotonic() - self._anchor_mono)
+
+    def sleep_until_epoch(self, target):
+        """Sleeps until reference time `target`, spinning for the last SPIN_SECONDS. Returns the miss in seconds."""
+        deadline = time.monotonic() + (target - self.now())
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= SPIN_SECONDS:
+                break
+            # Long waits wake every 30s so a suspended laptop doesn't sleep through the deadline
+            time.sleep(min(remaining - SPIN_SECONDS, 30))
+        while time.monotonic() < deadline:
+            pass
+        return time.monotonic() - deadline
+
+    def sleep_until(self, local_dt):
+        """Same as armed.sleep_until for a naive local datetime, but on the corrected monotonic clock."""
+        self.sleep_until_epoch(local_dt.timestamp() + self.offset)
+
+    def local_datetime(self, epoch):
+        """The naive local datetime at which this machine's clock will read reference time `epoch`."""
+        return datetime.datetime.fromtimestamp(epoch - self.offset)
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description="Local scheduler for the room booker, with clock-offset correction")
+    parser.add_argument("--config", default=YAML_PATH, help="Workflow YAML that gui.py saves preferences to")
+    parser.add_argument("--fire-at", help="Release time in Ottawa (HH:MM, 24h). Default: the GUI's schedule")
+    parser.add_argument("--time-source", default=os.environ.get("TIME_SOURCE", "ntp://pool.ntp.org"),
+                        help="Reference clock: ntp://host[:port], or an http(s) URL (JSON {'epoch': ...} or its Date header)")
+    parser.add_argument("--sync-samples", default=5, type=int, help="Time source queries per sync; the fastest round trip wins")
+    parser.add_argument("--warmup-lead", default=120, type=float, help="Seconds before release to start the browser and log in")
+    parser.add_argument("--poll-lead", default=0.25, type=float, help="Seconds before release to start polling the grid")
+    parser.add_argument("--once", action="store_true", help="Book at the next release and exit")
+    # Anything else is passed straight to book_room.py's parser (e.g. --headless --fallback same-floor)
+    return parser.parse_known_args(argv)
+
+def booking_args(prefs, passthrough):
+    from book_room import parse_arguments as parse_booking_arguments
+    args = parse_booking_arguments(passthrough)
+    # Command-line options win over the GUI's preferences
+    given = " ".join(passthrough)
+    for option, key, convert in (("--room", "target_room", str), ("--hour", "start_hour", int),
+                                 ("--minute", "start_minute", int), ("--ampm", "start_ampm", str),
+                                 ("--duration", "duration_minutes", int)):
+        if key in prefs and option not in given:
+            setattr(args, option[2:], convert(prefs[key]))
+    return args
+
+def run_scheduled(args, clock, release, warmup_lead, poll_lead):
+    """Waits (precisely) until warm-up time, then runs the armed flow against the corrected release instant."""
+    from armed import armed_book
+    release_epoch = release.timestamp()
+    print(f"Next release: {release.strftime('%Y-%m-%d %H:%M %Z')}. Warm-up at "
+          f"{clock.local_datetime(release_epoch - warmup_lead).strftime('%H:%M:%S')} local.")
+    clock.sleep_until_epoch(release_epoch - warmup_lead)
+
+    # Re-sync right before warm-up so drift over a long wait doesn't count
+    offset = clock.sync()
+    print(f"Clock offset vs {clock.source}: {offset * 1000:+.1f} ms"
+          + (f" (round trip {clock.rtt * 1000:.1f} ms)" if clock.rtt is not None else ""))
+    telemetry.emit("clock_sync", source=clock.source, offset_s=round(offset, 4),
+                   rtt_s=round(clock.rtt, 4) if clock.rtt is not None else None, release=release.isoformat())
+    return armed_book(args, fire_time=clock.local_datetime(release_epoch), release_date=release.date(),
+                      sleep=clock.sleep_until, poll_lead=poll_lead)
+
+def main(argv=None):
+    sched, passthrough = parse_arguments(argv)
+    prefs = load_preferences(sched.config) if os.path.exists(sched.config) else {}
+    fire_at = sched.fire_at or prefs.get("fire_at", "00:00")
+    args = booking_args(prefs, passthrough)
+
+    print("--- Carleton Library Room Booker (SCHEDULER) ---")
+    print(f"Release time {fire_at} Ottawa time; booking Room={args.room}, {args.hour}:{args.minute:02d} {args.ampm}, {args.duration} mins")
+    clock = PreciseClock(sched.time_source, sched.sync_samples)
+    print(f"Clock offset vs {sched.time_source}: {clock.offset * 1000:+.1f} ms")
+
+    while True:
+        release = next_release(fire_at, datetime.datetime.fromtimestamp(clock.now() + sched.warmup_lead, LIBRARY_TZ))
+        if not args.no_history:
+            telemetry.start_run("scheduled", args)
+        result = None
+        try:
+            result = run_scheduled(args, clock, release, sched.warmup_lead, sched.poll_lead)
+        except KeyboardInterrupt:
+            print("Stopped.")
+            return
+        finally:
+            telemetry.end_run(result)
+        if sched.once:
+            return result
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+On-disk cache of what runs learn about the LibCal site: the grid URL the library page links to, whether
+that grid takes a ?date= parameter, location/group IDs, room numbers to space IDs and the slot length.
+With it, a run opens the grid for its date directly instead of going through the library page, the new
+tab and the date picker. Entries expire after SITE_CACHE_TTL, and anything the site contradicts is
+dropped so the next run rediscovers it.
+"""
+import os
+import json
+import time
+from urllib.parse import urlsplit, urlunsplit, urlencode, parse_qsl
+
+CACHE_DIR = os.environ.get("LIBRARYBOT_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "librarybot"))
+SITE_CACHE_FILE = os.path.join(CACHE_DIR, "site_cache.json")
+SITE_CACHE_TTL = float(os.environ.get("SITE_CACHE_TTL", 7 * 24 * 3600))
+
+DATE_PARAM = "date"
+
+def _load_cache():
+    try:
+        with open(SITE_CACHE_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_cache(cache):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with open(SITE_CACHE_FILE, "w", encoding="utf-8") as f:
+        json.dump(cache, f, indent=2)
+
+def _key(libcal_url):
+    return libcal_url.rstrip("/")
+
+def load_site(libcal_url, ttl=SITE_CACHE_TTL):
+    """Cached metadata for this LibCal site, or {} if there is none or it is older than ttl."""
+    entry = _load_cache().get(_key(libcal_url))
+    if not entry or time.time() - entry.get("saved_at", 0) > ttl:
+        return {}
+    return entry
+
+def save_site(libcal_url, **fields):
+    """Merges fields into the site's entry. The TTL runs from the first save, so stale facts can't linger."""
+    cache = _load_cache()
+    entry = cache.get(_key(libcal_url))
+    if not entry or time.time() - entry.get("saved_at", 0) > SITE_CACHE_TTL:
+        entry = {"saved_at": time.time()}
+    changed = {k: v for k, v in fields.items() if entry.get(k) != v}
+    if changed:
+        entry.update(changed)
+        cache[_key(libcal_url)] = entry
+        _save_cache(cache)
+    return entry
+
+def invalidate_site(libcal_url, reason, *fields):
+    """Drops the given fields (all of the site's metadata if none) because the site no longer matches them."""
+    cache = _load_cache()
+    entry = cache.get(_key(libcal_url))
+    if not entry:
+        return
+    print(f"Site cache out of date ({reason}); rediscovering.")
+    if fields:
+        for field in fields:
+            entry.pop(field, None)
+    else:
+        del cache[_key(libcal_url)]
+    _save_cache(cache)
+
+def date_url(grid_url, date):
+    """grid_url showing `date` (YYYY-MM-DD in ?date=), keeping any other query parameters."""
+    parts = urlsplit(grid_url)
+    query = [(k, v) for k, v in parse_qsl(parts.query) if k != DATE_PARAM] + [(DATE_PARAM, date.isoformat())]
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(query), ""))
+
+def start_url(site, target_date=None):
+    """Where a run can start: the grid for target_date if the site takes dates in the URL, else the grid, else None."""
+    grid_url = site.get("grid_url")
+    if grid_url and target_date and site.get("date_param") is not False:
+        return date_url(grid_url, target_date)
+    return grid_url
@@ -0,0 +1,156 @@
+import re
+
+# One round trip: every slot link's title on the LibCal grid
+SNAPSHOT_JS = "return Array.from(document.querySelectorAll('a[title]'), a => a.title);"
+
+CLICK_BY_TITLE_JS = """
+var a = Array.from(document.querySelectorAll('a[title]')).find(el => el.title === arguments[0]);
+if (!a) { return false; }
+a.scrollIntoView({block: 'center'});
+a.click();
+return true;
+"""
+
+TIME_RE = re.compile(r"\b(\d{1,2}:\d{2})\s*([ap]m)\b", re.I)
+ROOM_RE = re.compile(r"\b(\d{3,4}[A-Za-z]?)\b")
+YEAR_RE = re.compile(r"^(19|20)\d\d$")
+
+FALLBACK_RULES = ["any", "same-floor", "none"]
+
+def time_to_minutes(time_str):
+    """"3:30pm" -> 930."""
+    hour, minute = time_str[:-2].split(":")
+    hour = int(hour) % 12 + (12 if time_str.endswith("pm") else 0)
+    return hour * 60 + int(minute)
+
+def room_floor(room):
+    digits = re.match(r"\d+", str(room))
+    return int(digits.group(0)) // 100 if digits else None
+
+def parse_title(title):
+    """
+    Parses a LibCal slot title such as "3:30pm Sunday, October 25, 2026 - 464 (Capacity 6) - Available"
+    into (room, time_str, available). Returns None for titles that aren't slots.
+    """
+    time_match = TIME_RE.search(title)
+    if not time_match:
+        return None
+    time_str = (time_match.group(1) + time_match.group(2)).lower()
+
+    parts = [p.strip() for p in title.split(" - ")]
+    if len(parts) >= 3:
+        rooms = ROOM_RE.findall(" - ".join(parts[1:-1]))
+    else:
+        # The rest of the title still holds the date, so a year is no room number here
+        rooms = [c for c in ROOM_RE.findall(title[time_match.end():]) if not YEAR_RE.match(c)]
+    if not rooms:
+        return None
+    # Same test the XPath used: 'Available' is case-sensitive so "Unavailable" doesn't match
+    return rooms[0], time_str, "Available" in title
+
+class Slot:
+    def __init__(self, room, time_str, available, ref=None):
+        self.room = room
+        self.time_str = time_str
+        self.minutes = time_to_minutes(time_str)
+        self.available = available
+        # Whatever the engine needs to act on the slot: a title for Selenium, an API dict for HTTP
+        self.ref = ref
+
+    def __repr__(self):
+        return f"Slot({self.room}, {self.time_str}, {'Available' if self.available else 'Taken'})"
+
+class SlotIndex:
+    """All slots of one day's grid, keyed by (room, start time) for O(1) lookups."""
+
+    def __init__(self, slots=()):
+        self.slots = {}
+        self.rooms = []
+        self._room_set = set()
+        self._granularity = None
+        for slot in slots:
+            self.add(slot)
+
+    @classmethod
+    def from_titles(cls, titles):
+        index = cls()
+        for title in titles:
+            parsed = parse_title(title)
+            if parsed:
+                index.add(Slot(*parsed, ref=title))
+        return index
+
+    def add(self, slot):
+        if slot.room not in self._room_set:
+            self._room_set.add(slot.room)
+            self.rooms.append(slot.room)
+        self.slots[(slot.room, slot.minutes)] = slot
+        self._granularity = None
+
+    def __len__(self):
+        return len(self.slots)
+
+    def get(self, room, time_str):
+        return self.slots.get((str(room), time_to_minutes(time_str)))
+
+    def granularity(self):
+        """Slot length in minutes, inferred from the smallest gap between start times (30 if unknown)."""
+        if self._granularity is None:
+            times = sorted({minutes for _, minutes in self.slots})
+            gaps = [b - a for a, b in zip(times, times[1:]) if b > a]
+            self._granularity = min(gaps) if gaps else 30
+        return self._granularity
+
+    def covers(self, room, time_str, duration):
+        """True if every slot from time_str for `duration` minutes is available in `room`."""
+        step = self.granularity()
+        start = time_to_minutes(time_str)
+        for minutes in range(start, start + duration, step):
+            slot = self.slots.get((str(room), minutes))
+            if not slot or not slot.available:
+                return False
+        return True
+
+    def diff(self, previous):
+        """Returns (freed, taken): slots that became available / unavailable since `previous`."""
+        freed, taken = [], []
+        for key, slot in self.slots.items():
+            before = previous.slots.get(key) if previous else None
+            if slot.available and (before is None or not before.available):
+                freed.append(slot)
+            elif not slot.available and before is not None and before.available:
+                taken.append(slot)
+        return freed, taken
+
+    def candidate_rooms(self, preferences, fallback="any"):
+        """Preferred rooms in order, then the rest of the grid according to the fallback rule."""
+        ordered = [str(r) for r in preferences]
+        if fallback == "none":
+            return ordered
+        others = [r for r in self.rooms if r not in ordered]
+        if fallback == "same-floor" and ordered:
+            floor = room_floor(ordered[0])
+            others.sort(key=lambda r: room_floor(r) != floor)
+        return ordered + others
+
+    def choose(self, preferences, time_str, duration=None, fallback="any", full_duration=False):
+        """Returns the best available Slot at time_str, or None."""
+        for room in self.candidate_rooms(preferences, fallback):
+            slot = self.get(room, time_str)
+            if not slot or not slot.available:
+                continue
+            if full_duration and duration and not self.covers(room, time_str, duration):
+                continue
+            return slot
+        return None
+
+def take_snapshot(driver):
+    """Reads the whole availability grid in a single WebDriver call and indexes it."""
+    return SlotIndex.from_titles(driver.execute_script(SNAPSHOT_JS) or [])
+
+def click_slot_by_title(driver, title):
+    return bool(driver.execute_script(CLICK_BY_TITLE_JS, title))
+
+def parse_room_list(value):
+    """"464, 468,466" -> ["464", "468", "466"]."""
+    return [r.strip() for r in str(value).split(",") if r.strip()]
@@ -0,0 +1,77 @@
+import json
+import time
+from contextlib import contextmanager
+import telemetry
+
+
+class StageTimer:
+    """Records wall-clock time for each named step of a booking run."""
+
+    def __init__(self):
+        self.stages = []
+        self.started_at = time.time()
+        self._t0 = time.perf_counter()
+        self.counter = None
+        self.meta = {}  # extra sections for the JSON output, e.g. "memory"
+        self.listeners = []  # called with each stage record as the stage ends (e.g. replay.SessionRecorder)
+
+    def track_commands(self, counter):
+        """Also record how many WebDriver commands each stage sends (see dom.count_commands)."""
+        self.counter = counter
+
+    @contextmanager
+    def stage(self, name):
+        """Times the wrapped block and records it under `name`, even if it raises."""
+        start = time.perf_counter()
+        commands_before = self.counter.total if self.counter else None
+        status = "ok"
+        try:
+            yield
+        except BaseException:
+            status = "error"
+            raise
+        finally:
+            end = time.perf_counter()
+            record = {
+                "stage": name,
+                "start_s": round(start - self._t0, 4),
+                "duration_s": round(end - start, 4),
+                "status": status,
+            }
+            if commands_before is not None:
+                record["commands"] = self.counter.total - commands_before
+            for listener in self.listeners:
+                listener(record)
+            self.stages.append(record)
+            telemetry.emit("stage", **record)
+
+    def total(self):
+        return round(time.perf_counter() - self._t0, 4)
+
+    def to_dict(self):
+        return {
+            "started_at": self.started_at,
+            "total_s": self.total(),
+            "stages": list(self.stages),
+            **self.meta,
+        }
+
+    def summary_table(self):
+        """Returns a plain-text table of stage durations."""
+        if not self.stages:
+            return "(no stages recorded)"
+        width = max(len("Stage"), max(len(s["stage"]) for s in self.stages))
+        cmds = any("commands" in s for s in self.stages)
+        lines = [f"{'Stage':<{width}}  {'Seconds':>8}" + (f"  {'Cmds':>5}" if cmds else "") + "  Status",
+                 "-" * (width + (25 if cmds else 18))]
+        for s in self.stages:
+            count = f"  {s.get('commands', ''):>5}" if cmds else ""
+            lines.append(f"{s['stage']:<{width}}  {s['duration_s']:>8.3f}{count}  {s['status']}")
+        lines.append("-" * (width + (25 if cmds else 18)))
+        total_cmds = f"  {sum(s.get('commands', 0) for s in self.stages):>5}" if cmds else ""
+        lines.append(f"{'total':<{width}}  {self.total():>8.3f}{total_cmds}")
+        return "\n".join(lines)
+
+    def write_json(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2)
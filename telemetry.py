@@ -0,0 +1,194 @@
+"""
+Structured run telemetry: every stage, slot choice and outcome as a JSON-lines event, kept in a local
+SQLite history for later analysis:
+
+    python telemetry.py report --days 30
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import sqlite3
+import datetime
+import argparse
+import threading
+
+CACHE_DIR = os.environ.get("LIBRARYBOT_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "librarybot"))
+EVENTS_FILE = os.path.join(CACHE_DIR, "events.jsonl")
+HISTORY_DB = os.path.join(CACHE_DIR, "history.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY, mode TEXT, started_at REAL, ended_at REAL, outcome TEXT, room TEXT,
+    target_rooms TEXT, target_time TEXT, duration INTEGER, dry_run INTEGER
+);
+CREATE TABLE IF NOT EXISTS events (
+    run_id TEXT, ts REAL, event TEXT, stage TEXT, duration_s REAL, data TEXT
+);
+CREATE INDEX IF NOT EXISTS events_by_kind ON events (event, ts);
+"""
+
+_current = None
+
+class RunRecorder:
+    """
+    Collects the events of one run. Each event is appended to the JSON-lines file as it happens;
+    the SQLite history is only written once at the end so the booking path never waits on a commit.
+    """
+
+    def __init__(self, mode, args, events_path=EVENTS_FILE, db_path=HISTORY_DB):
+        self.run_id = uuid.uuid4().hex[:12]
+        self.mode = mode
+        self.args = args
+        self.db_path = db_path
+        self.started_at = time.time()
+        self.events = []
+        self.errors = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(events_path) or ".", exist_ok=True)
+        self._file = open(events_path, "a", encoding="utf-8", buffering=1)
+
+    def emit(self, event, **fields):
+        record = {"ts": round(time.time(), 4), "run_id": self.run_id, "event": event, **fields}
+        with self._lock:
+            self.events.append(record)
+            if event == "error":
+                self.errors += 1
+            self._file.write(json.dumps(record, default=str) + "\n")
+
+    def finish(self, outcome, room=None):
+        self.emit("run_end", outcome=outcome, room=room, total_s=round(time.time() - self.started_at, 4))
+        self._file.close()
+        save_run(self.db_path, self, outcome, room)
+
+def start_run(mode, args, events_path=None, db_path=None):
+    """Starts recording a run; emit() calls go to it until end_run()."""
+    global _current
+    _current = RunRecorder(mode, args, events_path or args.events_jsonl or EVENTS_FILE, db_path or HISTORY_DB)
+    _current.emit("run_start", mode=mode, rooms=args.room, time=f"{args.hour}:{args.minute:02d}{args.ampm}",
+                  duration=args.duration, fallback=args.fallback, dry_run=args.dry_run,
+                  engine=args.engine, headless=args.headless)
+    return _current
+
+def emit(event, **fields):
+    """Records an event on the current run. Does nothing when no run is being recorded."""
+    if _current is not None:
+        _current.emit(event, **fields)
+
+def end_run(result):
+    """Derives the outcome from the entry point's return value and saves the run to the history."""
+    global _current
+    if _current is None:
+        return
+    run, _current = _current, None
+    if isinstance(result, list):
+        # Batch mode returns one result per job
+        result = any(job["booked"] for job in result)
+    if run.errors and not result:
+        outcome = "error"
+    elif result:
+        outcome = "dry-run ok" if run.args.dry_run else "booked"
+    else:
+        outcome = "no booking"
+    run.finish(outcome, result if isinstance(result, str) else None)
+
+def connect(db_path=HISTORY_DB):
+    os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+    conn = sqlite3.connect(db_path)
+    conn.executescript(SCHEMA)
+    return conn
+
+def save_run(db_path, run, outcome, room):
+    args = run.args
+    try:
+        with connect(db_path) as conn:
+            conn.execute(
+                "INSERT INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (run.run_id, run.mode, run.started_at, time.time(), outcome, room, args.room,
+                 f"{args.hour}:{args.minute:02d}{args.ampm}", args.duration, int(bool(args.dry_run))),
+            )
+            conn.executemany(
+                "INSERT INTO events VALUES (?, ?, ?, ?, ?, ?)",
+                [(run.run_id, e["ts"], e["event"], e.get("stage"), e.get("duration_s"),
+                  json.dumps({k: v for k, v in e.items() if k not in ("ts", "run_id", "event")}, default=str))
+                 for e in run.events],
+            )
+        conn.close()
+    except sqlite3.Error as e:
+        print(f"WARNING: Could not save run history: {e}")
+
+def stats(values):
+    from benchmark import percentile
+    return {"p50": percentile(values, 50), "p95": percentile(values, 95), "mean": sum(values) / len(values), "n": len(values)}
+
+def build_report(conn, since):
+    """Success rate per mode, per-stage latency and when target slots were first seen, for runs after `since`."""
+    rows = conn.execute("SELECT mode, outcome FROM runs WHERE started_at >= ?", (since,)).fetchall()
+    modes = {}
+    for mode, outcome in rows:
+        m = modes.setdefault(mode, {"runs": 0, "ok": 0})
+        m["runs"] += 1
+        m["ok"] += outcome in ("booked", "dry-run ok")
+
+    stages = {}
+    for stage, duration in conn.execute(
+            "SELECT stage, duration_s FROM events WHERE event = 'stage' AND ts >= ? AND json_extract(data, '$.status') = 'ok'",
+            (since,)):
+        stages.setdefault(stage, []).append(duration)
+
+    # Seconds between the expected release and the first poll that saw the target slot (armed mode)
+    release_lag = [row[0] for row in conn.execute(
+        "SELECT json_extract(data, '$.after_release_s') FROM events WHERE event = 'slot_available' AND ts >= ?"
+        " AND json_extract(data, '$.after_release_s') IS NOT NULL", (since,))]
+    # Cancellations the watcher saw, by hour of day
+    freed_by_hour = {}
+    for ts, count in conn.execute(
+            "SELECT ts, json_extract(data, '$.count') FROM events WHERE event = 'slots_freed' AND ts >= ?", (since,)):
+        hour = datetime.datetime.fromtimestamp(ts).hour
+        freed_by_hour[hour] = freed_by_hour.get(hour, 0) + count
+
+    return {
+        "modes": modes,
+        "stages": {name: stats(v) for name, v in stages.items()},
+        "release_lag": stats(release_lag) if release_lag else None,
+        "freed_by_hour": dict(sorted(freed_by_hour.items())),
+    }
+
+def format_report(report, days):
+    from benchmark import format_summary
+    lines = [f"--- Booking history, last {days} days ---"]
+    if not report["modes"]:
+        lines.append("No runs recorded.")
+        return "\n".join(lines)
+    lines.append(f"{'Mode':<10}  {'Runs':>5}  {'OK':>5}  {'Success':>7}")
+    for mode, m in sorted(report["modes"].items()):
+        lines.append(f"{mode:<10}  {m['runs']:>5}  {m['ok']:>5}  {m['ok'] / m['runs']:>7.0%}")
+    if report["stages"]:
+        lines.append("\nStage latency:")
+        lines.append(format_summary(report["stages"]))
+    lag = report["release_lag"]
+    if lag:
+        lines.append(f"\nTarget slot first seen after release: p50 {lag['p50']:.1f}s, p95 {lag['p95']:.1f}s "
+                     f"(n={lag['n']}). Polling should start before p50 and keep going past p95.")
+    if report["freed_by_hour"]:
+        lines.append("\nCancellations seen by the watcher, by hour:")
+        for hour, count in report["freed_by_hour"].items():
+            lines.append(f"  {hour:02d}:00  {count:>4}  {'#' * min(count, 50)}")
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reports on the local booking history")
+    sub = parser.add_subparsers(dest="command", required=True)
+    report_parser = sub.add_parser("report", help="Success rate, stage latency and slot release times")
+    report_parser.add_argument("--days", default=30, type=int, help="Only runs from the last N days")
+    report_parser.add_argument("--db", default=HISTORY_DB, help="History database")
+    report_parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        sys.exit(f"No history at {args.db} yet.")
+    conn = connect(args.db)
+    report = build_report(conn, time.time() - args.days * 86400)
+    conn.close()
+    print(json.dumps(report, indent=2) if args.json else format_report(report, args.days))
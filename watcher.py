@@ -0,0 +1,176 @@
+import time
+import random
+import datetime
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.common.exceptions import WebDriverException
+from book_room import (
+    get_credentials, create_driver, is_headless_run, open_libcal, choose_slot, to_24h, format_slot_time,
+)
+from armed import warm_up_session, refresh_grid
+from batch import load_jobs, parse_job_spec
+from checkpoint import BookingState, book_in_session, pick_slot
+from slot_index import SlotIndex, take_snapshot
+from stage_timer import StageTimer
+import telemetry
+
+# Cancellations cluster right after release and in the hours before a booking starts
+RELEASE_WINDOW = (datetime.time(0, 0), datetime.time(0, 30))
+PRE_START_WINDOW = datetime.timedelta(hours=2)
+
+class PollSchedule:
+    """
+    Adaptive poll interval: drops to the minimum in peak windows or right after a change, otherwise
+    backs off geometrically to the maximum. Every interval gets +/- jitter so polls don't line up.
+    """
+
+    def __init__(self, min_interval, max_interval, backoff=1.5, jitter=0.2):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.jitter = jitter
+        self.current = min_interval
+
+    def in_peak(self, now, starts):
+        if RELEASE_WINDOW[0] <= now.time() <= RELEASE_WINDOW[1]:
+            return True
+        return any(datetime.timedelta(0) <= start - now <= PRE_START_WINDOW for start in starts)
+
+    def next_interval(self, now, changed, starts):
+        if changed or self.in_peak(now, starts):
+            self.current = self.min_interval
+        else:
+            self.current = min(self.current * self.backoff, self.max_interval)
+        return self.current * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+def target_start(job):
+    return datetime.datetime.combine(job.date, datetime.time(to_24h(job.hour, job.ampm), job.minute))
+
+def book_now(driver, wait, job, slot, grid_url, username, password):
+    """
+    Books an already-indexed slot on the current grid through the checkpointed stages (see checkpoint.py),
+    so steps are retried in this session and the final submit is never clicked twice. Anything it left in
+    LibCal's cart is taken back out. Returns (booked room or None, outcome as in BookingState.outcome).
+    """
+    timer = StageTimer()
+    timer.track_commands(driver.command_counter)
+    state = BookingState(job, job.date, grid_url, username, password)
+    state.slot = slot
+    with timer.stage("slot_select"):
+        clicked = pick_slot(driver, slot)
+    if clicked:
+        print("Clicked start time slot.")
+    room = book_in_session(driver, wait, state, timer, start_at="end_time" if clicked else "slot_select",
+                           max_attempts=job.stage_attempts)
+    if not state.cart_clean:
+        print("WARNING: The slot may still be in the cart; the next booking form will be checked for it.")
+    print(timer.summary_table())
+    return room, state.outcome
+
+def watch(args):
+    targets = []
+    if args.batch:
+        targets.extend(load_jobs(args.batch, args))
+    for spec in args.job or []:
+        targets.append(parse_job_spec(spec, args))
+    if not targets:
+        print("No watch targets. Give them with --job or --batch.")
+        return
+
+    print(f"--- Carleton Library Room Booker (WATCH: {len(targets)} targets) ---")
+    if args.dry_run:
+        print("BS: *** DRY RUN MODE ENABLED - NO BOOKING WILL BE MAKING ***")
+    username, password = get_credentials()
+    schedule = PollSchedule(args.watch_min_interval, args.watch_max_interval)
+    deadline = datetime.datetime.now() + datetime.timedelta(hours=args.watch_hours)
+
+    driver = None
+    snapshots = {}  # date -> last SlotIndex
+    failed = set()  # (date, room, time) of slots a booking failed on
+    polls = 0
+    booked = 0
+    try:
+        while targets and datetime.datetime.now() < deadline:
+            # One warm session for the whole watch; only relaunch if the browser died
+            if driver is None:
+                driver = create_driver(args)
+                wait = WebDriverWait(driver, 10, poll_frequency=0.1)
+                open_libcal(driver, wait, args)
+                grid_url = driver.current_url
+                warm_up_session(driver, wait, username, password, grid_url)
+
+            now = datetime.datetime.now()
+            for t in [t for t in targets if target_start(t) <= now]:
+                print(f"Target {t.date} {t.hour}:{t.minute:02d}{t.ampm} has started. Dropping it.")
+                targets.remove(t)
+
+            changed = False
+            polls += 1
+            try:
+                for date in sorted({t.date for t in targets}):
+                    refresh_grid(driver, wait, grid_url, date)
+                    index = take_snapshot(driver)
+                    freed, taken = index.diff(snapshots.get(date))
+                    if date in snapshots and (freed or taken):
+                        changed = True
+                        print(f"[{now.strftime('%H:%M:%S')}] {date}: {len(freed)} freed, {len(taken)} taken")
+                        telemetry.emit("slots_freed", date=date.isoformat(), count=len(freed), taken=len(taken),
+                                       slots=[f"{s.room} {s.time_str}" for s in freed])
+                    snapshots[date] = index
+
+                    # Slots a booking already failed on aren't tried again on every poll
+                    if any(key[0] == date for key in failed):
+                        index = SlotIndex(s for s in index.slots.values() if (date, s.room, s.time_str) not in failed)
+                    for job in [t for t in targets if t.date == date]:
+                        slot = choose_slot(index, job, format_slot_time(target_start(job)), verbose=False)
+                        if not slot:
+                            continue
+                        print(f"Match for {date} {job.hour}:{job.minute:02d}{job.ampm}: Room {slot.room}. Booking...")
+                        room, outcome = book_now(driver, wait, job, slot, grid_url, username, password)
+                        if room:
+                            targets.remove(job)
+                            booked += 1
+                        elif outcome == "unknown":
+                            # The submit may have gone through; booking the job again could book it twice
+                            print(f"Booking Room {slot.room} at {slot.time_str} may have gone through. No longer watching for it.")
+                            targets.remove(job)
+                        else:
+                            print(f"Booking Room {slot.room} at {slot.time_str} failed. Skipping that slot from now on.")
+                            failed.add((date, slot.room, slot.time_str))
+                        telemetry.emit("job_result", date=date.isoformat(), start=f"{job.hour}:{job.minute:02d}{job.ampm}",
+                                       booked=room, result=outcome, polls=polls)
+                        # The grid is gone after booking; force a reload on the next refresh
+                        snapshots.pop(date, None)
+                        driver.get(grid_url)
+                        break
+            except WebDriverException as e:
+                print(f"Browser error: {e.msg}. Restarting session...")
+                telemetry.emit("browser_restart", error=type(e).__name__, message=e.msg)
+                try:
+                    driver.quit()
+                except WebDriverException:
+                    pass
+                driver = None
+                continue
+
+            if not targets:
+                break
+            interval = schedule.next_interval(datetime.datetime.now(), changed, [target_start(t) for t in targets])
+            print(f"Poll {polls}: {len(targets)} target(s) left. Next poll in {interval:.0f}s.")
+            time.sleep(interval)
+
+    except KeyboardInterrupt:
+        print("Stopped.")
+
+    except Exception as e:
+        print(f"An error occurred: {e}")
+        telemetry.emit("error", error=type(e).__name__, message=str(e))
+        if driver and is_headless_run(args):
+             driver.save_screenshot("error_screenshot.png")
+             print("Saved error_screenshot.png")
+
+    finally:
+        print(f"Watch finished after {polls} polls. {len(targets)} target(s) not booked.")
+        print("Done.")
+        if driver:
+            driver.quit()
+    return booked